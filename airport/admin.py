@@ -11,7 +11,10 @@ from .models import (
     City,
     Country,
     Order,
+    Job,
+    DeadJob,
 )
+from .jobs import requeue_dead_jobs
 
 
 admin.site.register(Crew)
@@ -26,3 +29,21 @@ admin.site.register(Flight)
 admin.site.register(Ticket)
 
 
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "queue", "run_at", "attempts", "max_attempts")
+    list_filter = ("queue", "name")
+
+
+@admin.register(DeadJob)
+class DeadJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "queue", "attempts", "failed_at")
+    list_filter = ("queue", "name")
+    actions = ("requeue",)
+
+    @admin.action(description="Requeue selected dead jobs")
+    def requeue(self, request, queryset):
+        count = requeue_dead_jobs(queryset)
+        self.message_user(request, f"{count} jobs requeued.")
@@ -0,0 +1,233 @@
+"""
+Async versions of the hot read endpoints, for ASGI deployments.
+
+The ORM is used through its async API (aget, async iteration), so a
+request waiting on a slow client does not hold a worker thread. The
+responses are rendered by the same lean readers, serializers, pagination
+and JSON renderer as the sync viewsets and are byte-for-byte identical
+to them.
+
+The availability stream keeps its connection open and pushes seat
+events as Server-Sent Events; under ASGI each open stream is a coroutine
+waiting on a queue, not a worker thread. Under WSGI it would hold a worker
+thread for as long as the client stays connected, so it answers 501 there.
+Streams are closed after SEAT_EVENTS_STREAM_MAX_SECONDS and the client
+reconnects, which bounds the life of a subscription whose disconnect was
+never noticed.
+"""
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotFound
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+
+from airport.caching import get_cached_data, set_cached_data
+from airport.events import broker, flight_channel
+from airport.models import Flight
+from airport.shaping import ordering_columns, response_shape, shape_queryset
+from airport.views import (
+    AirportViewSet,
+    FlightViewSet,
+    RouteViewSet,
+    filter_flights,
+    seat_map_data,
+)
+
+
+STREAM_KEEPALIVE_SECONDS = getattr(settings, "SEAT_EVENTS_KEEPALIVE_SECONDS", 15)
+STREAM_MAX_SECONDS = getattr(settings, "SEAT_EVENTS_STREAM_MAX_SECONDS", 30 * 60)
+
+
+class StreamingUnavailable(APIException):
+    status_code = 501
+    default_detail = "Event streams are only served by the ASGI application."
+    default_code = "streaming_unavailable"
+
+
+class AsyncReadGate(APIView):
+    """
+    Runs the authentication, permission and throttling checks of the
+    sync viewsets for an async view, and renders API errors like they do.
+    """
+
+    permission_classes = (AllowAny,)
+    renderer_classes = (JSONRenderer,)
+
+    def check(self, request):
+        self.args, self.kwargs = (), {}
+        self.request = self.initialize_request(request)
+        self.headers = self.default_response_headers
+        try:
+            if request.method != "GET":
+                raise MethodNotAllowed(request.method)
+            self.initial(self.request)
+        except APIException as exc:
+            return self.error_response(exc)
+        return None
+
+    def error_response(self, exc):
+        response = self.handle_exception(exc)
+        return self.finalize_response(self.request, response).render()
+
+
+def async_read_view(func):
+    """Wrap an async function returning response data into a GET-only async view."""
+
+    @wraps(func)
+    async def view(request, *args, **kwargs):
+        gate = AsyncReadGate()
+        error = await sync_to_async(gate.check)(request)
+        if error is not None:
+            return error
+        try:
+            data = await func(gate.request, *args, **kwargs)
+        except APIException as exc:
+            return gate.error_response(exc)
+        return HttpResponse(JSONRenderer().render(data), content_type="application/json")
+
+    return view
+
+
+async def _get_object(queryset, pk):
+    try:
+        return await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise NotFound(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def _list_data(viewset, queryset, request):
+    pagination = viewset.pagination_class()
+    shape = response_shape(request.query_params)
+    if shape is None:
+        reader = viewset.lean_reader
+        page = await pagination.apaginate_queryset(reader.get_queryset(queryset), request)
+        data = await sync_to_async(reader.to_representation)(page)
+    else:
+        queryset = shape_queryset(
+            queryset,
+            viewset.serializer_class(**shape),
+            keep=ordering_columns(viewset.pagination_class),
+        )
+        page = await pagination.apaginate_queryset(queryset, request)
+        data = viewset.serializer_class(page, many=True, context={"request": request}, **shape).data
+    return pagination.get_paginated_response(data).data
+
+
+async def _detail_data(viewset, queryset, request, pk):
+    shape = response_shape(request.query_params) or {}
+    if shape:
+        queryset = shape_queryset(queryset, viewset.serializer_class(**shape))
+    instance = await _get_object(queryset, pk)
+    return viewset.serializer_class(instance, context={"request": request}, **shape).data
+
+
+async def _cached(viewset, request, build):
+    key, data = await sync_to_async(get_cached_data)(viewset.cache_namespace, request)
+    if data is None:
+        data = await build()
+        await sync_to_async(set_cached_data)(key, data)
+    return data
+
+
+@async_read_view
+async def flight_list(request):
+    queryset = filter_flights(FlightViewSet.queryset.all(), request.query_params)
+    return await _list_data(FlightViewSet, queryset, request)
+
+
+@async_read_view
+async def flight_detail(request, pk):
+    return await _detail_data(FlightViewSet, FlightViewSet.queryset.all(), request, pk)
+
+
+@async_read_view
+async def flight_seats(request, pk):
+    flight = await _get_object(Flight.objects.select_related("airplane"), pk)
+    return await sync_to_async(seat_map_data)(flight)
+
+
+@async_read_view
+async def airport_list(request):
+    return await _cached(
+        AirportViewSet,
+        request,
+        lambda: _list_data(AirportViewSet, AirportViewSet.queryset.all(), request),
+    )
+
+
+@async_read_view
+async def airport_detail(request, pk):
+    return await _cached(
+        AirportViewSet,
+        request,
+        lambda: _detail_data(AirportViewSet, AirportViewSet.queryset.all(), request, pk),
+    )
+
+
+@async_read_view
+async def route_list(request):
+    return await _cached(
+        RouteViewSet,
+        request,
+        lambda: _list_data(RouteViewSet, RouteViewSet.queryset.all(), request),
+    )
+
+
+@async_read_view
+async def route_detail(request, pk):
+    return await _cached(
+        RouteViewSet,
+        request,
+        lambda: _detail_data(RouteViewSet, RouteViewSet.queryset.all(), request, pk),
+    )
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def _availability_events(flight):
+    # Subscribe before reading the snapshot so no change falls in between
+    subscription = broker.subscribe(flight_channel(flight.pk))
+    try:
+        yield _sse("snapshot", await sync_to_async(seat_map_data)(flight))
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            event = await subscription.get(timeout=min(STREAM_KEEPALIVE_SECONDS, remaining))
+            if event is None:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(event["type"], event)
+    finally:
+        subscription.close()
+
+
+async def flight_availability_stream(request, pk):
+    """
+    Seat map of the flight as a first "snapshot" event, then a
+    "seat-taken" or "seat-released" event for every committed change and a
+    "seats-changed" event when the client should reload the seat map.
+    """
+    gate = AsyncReadGate()
+    error = await sync_to_async(gate.check)(request)
+    if error is not None:
+        return error
+    if not isinstance(request, ASGIRequest):
+        return gate.error_response(StreamingUnavailable())
+    try:
+        flight = await _get_object(Flight.objects.select_related("airplane"), pk)
+    except APIException as exc:
+        return gate.error_response(exc)
+
+    response = StreamingHttpResponse(_availability_events(flight), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,249 @@
+"""
+Type-ahead search over airports, cities and countries.
+
+Names are served from a per-process prefix index: for every kind, a
+sorted array of normalized full names and one of the name suffixes that
+start at a later word ("lviv danylo halytskyi" is also found by "danylo"
+and "halytskyi"). A query is a bisect into each array, and only the
+first `limit` rows of every matching range can make it into the results,
+so the cost does not depend on the number of names.
+
+The index is built on first use, patched in place by model signals and
+rebuilt when another worker changed it (see airport.versioning). Queries
+without a prefix match fall back to the database: a substring or trigram
+similarity search on PostgreSQL (typo tolerant, both served by the indexes
+of migration 0005) and a substring search elsewhere.
+"""
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q
+
+from airport.models import Airport, City, Country
+from airport.versioning import bump_version, get_version
+
+
+AUTOCOMPLETE_LIMIT = getattr(settings, "AUTOCOMPLETE_LIMIT", 10)
+AUTOCOMPLETE_MAX_LIMIT = 50
+TRIGRAM_MIN_QUERY = 3
+VERSION = "autocomplete"
+
+AIRPORT = "airport"
+CITY = "city"
+COUNTRY = "country"
+# Order of the kinds among equally good matches
+KINDS = (AIRPORT, CITY, COUNTRY)
+MODELS = {AIRPORT: Airport, CITY: City, COUNTRY: Country}
+
+Match = namedtuple("Match", ("exact", "word", "kind_order", "key", "kind", "id"))
+
+
+def normalize(value):
+    """Lowercase, strip accents and reduce any punctuation to single spaces."""
+    value = unicodedata.normalize("NFKD", value.casefold())
+    value = "".join(
+        char if char.isalnum() else " " for char in value if not unicodedata.combining(char)
+    )
+    return " ".join(value.split())
+
+
+def _suffixes(key):
+    words = key.split(" ")
+    return [" ".join(words[index:]) for index in range(1, len(words))]
+
+
+class PrefixIndex:
+    """Names of one kind: (key, id) pairs sorted for prefix range lookups."""
+
+    def __init__(self, names=()):
+        self.names = {}
+        self.full = []
+        self.words = []
+        for pk, name in names:
+            self.names[pk] = name
+            key = normalize(name)
+            self.full.append((key, pk))
+            self.words.extend((suffix, pk) for suffix in _suffixes(key))
+        self.full.sort()
+        self.words.sort()
+
+    def add(self, pk, name):
+        self.remove(pk)
+        self.names[pk] = name
+        key = normalize(name)
+        insort(self.full, (key, pk))
+        for suffix in _suffixes(key):
+            insort(self.words, (suffix, pk))
+
+    def remove(self, pk):
+        name = self.names.pop(pk, None)
+        if name is None:
+            return
+        key = normalize(name)
+        for rows, row_key in [(self.full, key)] + [(self.words, suffix) for suffix in _suffixes(key)]:
+            index = bisect_left(rows, (row_key, pk))
+            if index < len(rows) and rows[index] == (row_key, pk):
+                del rows[index]
+
+    @staticmethod
+    def _range(rows, prefix, limit):
+        index = bisect_left(rows, (prefix,))
+        for key, pk in rows[index:index + limit]:
+            if not key.startswith(prefix):
+                break
+            yield key, pk
+
+    def matches(self, prefix, limit, kind, kind_order):
+        seen = set()
+        for key, pk in self._range(self.full, prefix, limit):
+            seen.add(pk)
+            yield Match(key != prefix, False, kind_order, key, kind, pk)
+        for key, pk in self._range(self.words, prefix, limit):
+            if pk not in seen:
+                seen.add(pk)
+                yield Match(key != prefix, True, kind_order, key, kind, pk)
+
+
+class Autocomplete:
+    """Airports, cities and countries by name, plus what is needed to render them."""
+
+    def __init__(self, version, airports=(), cities=(), countries=()):
+        airports, cities = list(airports), list(cities)
+        self.version = version
+        self.indexes = {
+            AIRPORT: PrefixIndex((pk, name) for pk, name, _ in airports),
+            CITY: PrefixIndex((pk, name) for pk, name, _ in cities),
+            COUNTRY: PrefixIndex(countries),
+        }
+        # Airport -> city and city -> country, for rendering
+        self.parents = {
+            AIRPORT: {pk: city_id for pk, _, city_id in airports},
+            CITY: {pk: country_id for pk, _, country_id in cities},
+            COUNTRY: {},
+        }
+
+    def add(self, kind, pk, name, parent_id=None):
+        self.indexes[kind].add(pk, name)
+        if parent_id is not None:
+            self.parents[kind][pk] = parent_id
+
+    def remove(self, kind, pk):
+        self.indexes[kind].remove(pk)
+        self.parents[kind].pop(pk, None)
+
+    def search(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        matches = []
+        for kind_order, kind in enumerate(KINDS):
+            matches.extend(self.indexes[kind].matches(prefix, limit, kind, kind_order))
+        matches.sort()
+        return [self.render(match.kind, match.id) for match in matches[:limit]]
+
+    def render(self, kind, pk):
+        item = {"type": kind, "id": pk, "name": self.indexes[kind].names[pk]}
+        city_id = pk
+        if kind == AIRPORT:
+            city_id = self.parents[AIRPORT][pk]
+            item["city"] = self.indexes[CITY].names.get(city_id)
+        if kind in (AIRPORT, CITY):
+            country_id = self.parents[CITY].get(city_id)
+            item["country"] = self.indexes[COUNTRY].names.get(country_id)
+        return item
+
+
+def database_search(query, limit):
+    """
+    Search the name columns directly. On PostgreSQL trigram similarity
+    finds misspelt names too. A short substring of a long name shares too
+    few trigrams with it to pass the similarity threshold, so substrings
+    match as well.
+    """
+    query = query.strip()
+    postgres = connection.vendor == "postgresql" and len(query) >= TRIGRAM_MIN_QUERY
+    matches = []
+    for kind_order, kind in enumerate(KINDS):
+        queryset = MODELS[kind].objects.all()
+        if postgres:
+            queryset = queryset.filter(
+                Q(name__icontains=query) | Q(TrigramSimilar(F("name"), query))
+            ).annotate(
+                similarity=TrigramSimilarity("name", query)
+            ).order_by("-similarity", "name")
+            rows = queryset.values_list("similarity", "id", "name")[:limit]
+            matches.extend((-similarity, kind_order, name, kind, pk) for similarity, pk, name in rows)
+        else:
+            rows = queryset.filter(name__icontains=query).order_by("name").values_list("id", "name")[:limit]
+            matches.extend((0, kind_order, name, kind, pk) for pk, name in rows)
+    matches.sort()
+    return [(kind, pk) for *_, kind, pk in matches[:limit]]
+
+
+class AutocompleteIndex:
+    """Per-process autocomplete index, shared by all requests of the worker."""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load(self, version):
+        return Autocomplete(
+            version,
+            airports=Airport.objects.values_list("id", "name", "city_id"),
+            cities=City.objects.values_list("id", "name", "country_id"),
+            countries=Country.objects.values_list("id", "name"),
+        )
+
+    def index(self):
+        version = get_version(VERSION)
+        with self._lock:
+            if self._index is not None and self._index.version == version:
+                return self._index
+        index = self._load(version)
+        with self._lock:
+            self._index = index
+        return index
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT):
+        index = self.index()
+        results = index.search(query, limit)
+        if results:
+            return results
+        return [index.render(kind, pk) for kind, pk in database_search(query, limit)
+                if pk in index.indexes[kind].names]
+
+    def _patch(self, change):
+        """Apply a local change to the loaded index and publish a new version."""
+        new_version = bump_version(VERSION)
+        with self._lock:
+            if self._index is None:
+                return
+            if self._index.version == new_version - 1:
+                change(self._index)
+                self._index.version = new_version
+            else:
+                # Another worker changed the names in between, reload on next read
+                self._index = None
+
+    def saved(self, kind, instance):
+        parent_id = {AIRPORT: "city_id", CITY: "country_id"}.get(kind)
+        parent = getattr(instance, parent_id) if parent_id else None
+        self._patch(lambda index: index.add(kind, instance.pk, instance.name, parent))
+
+    def deleted(self, kind, pk):
+        self._patch(lambda index: index.remove(kind, pk))
+
+    def invalidate(self):
+        bump_version(VERSION)
+        with self._lock:
+            self._index = None
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,124 @@
+"""
+Departure and arrival boards of an airport.
+
+A board is a single query: the flights of the routes leaving (or
+reaching) the airport within a time window, through the
+(route, departure_time) and (route, arrival_time) indexes.
+
+Boards are cached for the minute they were built in. When a board goes
+stale, only the request that wins the refresh lock rebuilds it. The
+others keep serving the previous minute's board, or wait briefly for the
+first build, so a busy airport's board expiring never sends a burst of
+identical queries to the database.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import serializers
+
+from airport.models import Airport, Flight, Route
+from airport.readers import LeanReader
+
+
+DEPARTURES, ARRIVALS = "departures", "arrivals"
+BOARD_HOURS = getattr(settings, "BOARD_HOURS", 12)
+BOARD_MAX_HOURS = getattr(settings, "BOARD_MAX_HOURS", 48)
+# How long a stale board may still be served while another request rebuilds it
+BOARD_STALE_SECONDS = 300
+REFRESH_LOCK_SECONDS = 10
+REFRESH_WAIT_SECONDS = 2
+_POLL_SECONDS = 0.05
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+class BoardReader(LeanReader):
+    """Board rows, showing the airport at the other end of each flight."""
+
+    def __init__(self, kind):
+        self.other = "destination" if kind == DEPARTURES else "source"
+        self.fields = (
+            "id",
+            "route_id",
+            f"route__{self.other}__name",
+            f"route__{self.other}__city__name",
+            "airplane__name",
+            "departure_time",
+            "arrival_time",
+        )
+
+    def to_representation(self, rows):
+        return [
+            {
+                "id": row["id"],
+                "route": row["route_id"],
+                self.other: row[f"route__{self.other}__name"],
+                "city": row[f"route__{self.other}__city__name"],
+                "airplane": row["airplane__name"],
+                "departure_time": _datetime(row["departure_time"]),
+                "arrival_time": _datetime(row["arrival_time"]),
+            }
+            for row in rows
+        ]
+
+
+def board_queryset(airport_id, kind, start, end):
+    end_of_route, time_field = (
+        ("source", "departure_time") if kind == DEPARTURES else ("destination", "arrival_time")
+    )
+    routes = Route.objects.filter(**{f"{end_of_route}_id": airport_id}).values("id")
+    return Flight.objects.filter(
+        route__in=routes, **{f"{time_field}__gte": start, f"{time_field}__lt": end}
+    ).order_by(time_field, "id")
+
+
+def _build(airport_id, kind, start, end):
+    reader = BoardReader(kind)
+    rows = list(reader.get_queryset(board_queryset(airport_id, kind, start, end)))
+    if not rows and not Airport.objects.filter(pk=airport_id).exists():
+        return None
+    return reader.to_representation(rows)
+
+
+def _cache_key(airport_id, kind, start, end):
+    window = ":".join("now" if value is None else value.isoformat() for value in (start, end))
+    return f"board:{kind}:{airport_id}:{window}"
+
+
+def get_board(airport_id, kind, start=None, end=None):
+    """
+    Flights of the board ordered by time, None if the airport does not
+    exist. The window defaults to the next BOARD_HOURS from the current
+    minute.
+    """
+    minute = timezone.now().replace(second=0, microsecond=0)
+    key = _cache_key(airport_id, kind, start, end)
+    start = minute if start is None else start
+    end = start + timedelta(hours=BOARD_HOURS) if end is None else end
+
+    entry = cache.get(key)
+    if entry is not None and entry["minute"] == minute:
+        return entry["flights"]
+
+    lock = f"{key}:refresh"
+    if cache.add(lock, 1, REFRESH_LOCK_SECONDS):
+        try:
+            flights = _build(airport_id, kind, start, end)
+            cache.set(key, {"minute": minute, "flights": flights}, BOARD_STALE_SECONDS)
+            return flights
+        finally:
+            cache.delete(lock)
+
+    # Another request is rebuilding this board
+    if entry is not None:
+        return entry["flights"]
+    deadline = time.monotonic() + REFRESH_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["flights"]
+    return _build(airport_id, kind, start, end)
@@ -0,0 +1,210 @@
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from airport.events import publish_seats
+from airport.holds import (
+    create_hold,
+    get_hold,
+    held_seats,
+    hold_seats_of,
+    live_holds,
+    purge_expired_holds,
+)
+from airport.jobs import enqueue
+from airport.models import Flight, Order, Ticket
+from airport.seat_map import update_seat_map
+from airport.tasks import send_order_confirmation
+
+
+class SeatConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Some of the requested seats are already booked."
+    default_code = "seat_conflict"
+
+    def __init__(self, seats, detail=None):
+        super().__init__()
+        self.seats = sorted(seats)
+        self.detail = {
+            "detail": detail or self.default_detail,
+            "seats": [
+                {"flight": flight_id, "row_number": row, "seat_number": seat}
+                for flight_id, row, seat in self.seats
+            ],
+        }
+
+
+def collect_seats(tickets_data):
+    """Turn ticket payloads into (flight_id, row, seat) triples, rejecting duplicates."""
+    seats = []
+    seen = set()
+    for ticket in tickets_data:
+        key = (ticket["flight_id"], ticket["row_number"], ticket["seat_number"])
+        if key in seen:
+            flight_id, row, seat = key
+            raise serializers.ValidationError(
+                f"Duplicate seat {row}-{seat} for flight {flight_id} in request."
+            )
+        seen.add(key)
+        seats.append(key)
+    return seats
+
+
+def find_taken_seats(seats):
+    """Return the subset of (flight_id, row, seat) triples that already have tickets, in one query."""
+    condition = reduce(or_, (
+        Q(flight_id=flight_id, row_number=row, seat_number=seat)
+        for flight_id, row, seat in seats
+    ))
+    return set(
+        Ticket.objects.filter(condition).values_list("flight_id", "row_number", "seat_number")
+    )
+
+
+def lock_flights(flight_ids):
+    """
+    Lock the rows of the booked flights, always in id order so that
+    two orders touching the same flights cannot deadlock.
+    """
+    flights = (
+        Flight.objects.select_for_update(of=("self",))
+        .select_related("airplane")
+        .filter(pk__in=flight_ids)
+        .order_by("pk")
+    )
+    flights = {flight.pk: flight for flight in flights}
+
+    missing = set(flight_ids) - set(flights)
+    if missing:
+        raise serializers.ValidationError(f"Flight {min(missing)} does not exist.")
+    return flights
+
+
+def validate_seat_ranges(seats, flights):
+    for flight_id, row, seat in seats:
+        airplane = flights[flight_id].airplane
+        if row < 1 or row > airplane.rows:
+            raise serializers.ValidationError(f"Row number must be between 1 and {airplane.rows}.")
+        if seat < 1 or seat > airplane.seats_in_rows:
+            raise serializers.ValidationError(
+                f"Seat number must be between 1 and {airplane.seats_in_rows}."
+            )
+
+
+def add_seats_sold(seats, sign=1):
+    """Move the denormalized Flight.seats_sold counters by the number of seats per flight."""
+    per_flight = {}
+    for flight_id, _, _ in seats:
+        per_flight[flight_id] = per_flight.get(flight_id, 0) + 1
+    for flight_id, count in per_flight.items():
+        flights = Flight.objects.filter(pk=flight_id)
+        if sign < 0:
+            # Never underflow a drifted counter, reconcile_seat_counters repairs it
+            flights = flights.filter(seats_sold__gte=count)
+        flights.update(seats_sold=F("seats_sold") + sign * count)
+
+
+def _mark_booked(seats):
+    by_flight = {}
+    for flight_id, row, seat in seats:
+        by_flight.setdefault(flight_id, []).append((row, seat))
+    for flight_id, flight_seats in by_flight.items():
+        update_seat_map(flight_id, flight_seats, taken=True)
+        publish_seats(flight_id, flight_seats, taken=True)
+
+
+def find_held_seats(seats, exclude_hold=None):
+    """Return the requested (flight_id, row, seat) triples held by someone else."""
+    held = {}
+    conflicts = set()
+    for flight_id, row, seat in seats:
+        if flight_id not in held:
+            held[flight_id] = held_seats(flight_id, exclude_hold=exclude_hold)
+        if (row, seat) in held[flight_id]:
+            conflicts.add((flight_id, row, seat))
+    return conflicts
+
+
+def hold_seats(user, flight, seats, minutes):
+    """
+    Temporarily reserve (row, seat) pairs of a flight for the user.
+    Seats that are sold or held by someone else raise SeatConflict
+    right away, without touching the ticket table for writes.
+    """
+    if len(set(seats)) != len(seats):
+        raise serializers.ValidationError("Duplicate seats in request.")
+    triples = [(flight.pk, row, seat) for row, seat in seats]
+    validate_seat_ranges(triples, {flight.pk: flight})
+
+    with transaction.atomic():
+        lock_flights([flight.pk])
+        purge_expired_holds(flight.pk)
+        conflicts = {(flight.pk, row, seat) for row, seat in held_seats(flight.pk) & set(seats)}
+        conflicts |= find_taken_seats(triples)
+        if conflicts:
+            raise SeatConflict(conflicts, "Some of the requested seats are held or already booked.")
+        return create_hold(user, flight.pk, seats, minutes)
+
+
+def book_seats(user, tickets_data, hold=None):
+    """
+    Create an order with one ticket per requested seat.
+
+    Only the rows of the affected flights are locked, every requested
+    seat is checked in a single query and all tickets are written with
+    one bulk insert. A seat taken by a concurrent writer that bypassed
+    the lock still ends up as a SeatConflict through the unique constraint.
+    Seats held by other customers count as taken, they are checked under
+    the flight locks that holds are created under; passing the hold that
+    covers the requested seats converts it into the order.
+    """
+    seats = collect_seats(tickets_data)
+    flight_ids = sorted({flight_id for flight_id, _, _ in seats})
+    hold_id = hold.pk if hold else None
+
+    try:
+        with transaction.atomic():
+            flights = lock_flights(flight_ids)
+            validate_seat_ranges(seats, flights)
+            if hold and not live_holds().filter(pk=hold_id).exists():
+                raise serializers.ValidationError("Seat hold does not exist or has expired.")
+
+            held = find_held_seats(seats, exclude_hold=hold_id)
+            if held:
+                raise SeatConflict(held, "Some of the requested seats are held by another customer.")
+
+            taken = find_taken_seats(seats)
+            if taken:
+                raise SeatConflict(taken)
+
+            order = Order.objects.create(user=user)
+            Ticket.objects.bulk_create([
+                Ticket(order=order, flight_id=flight_id, row_number=row, seat_number=seat)
+                for flight_id, row, seat in seats
+            ])
+            add_seats_sold(seats)
+            # Committed with the order, run by the worker off the request path
+            enqueue(send_order_confirmation, order_id=order.pk)
+            transaction.on_commit(lambda: _mark_booked(seats))
+            if hold:
+                hold.delete()
+    except IntegrityError:
+        raise SeatConflict(find_taken_seats(seats))
+
+    return order
+
+
+def book_hold(user, hold_id):
+    """Convert a live hold of the user into an order."""
+    hold = get_hold(hold_id)
+    if hold is None or hold.user_id != user.pk:
+        raise serializers.ValidationError("Seat hold does not exist or has expired.")
+    tickets_data = [
+        {"flight_id": hold.flight_id, "row_number": row, "seat_number": seat}
+        for row, seat in hold_seats_of(hold)
+    ]
+    return book_seats(user, tickets_data, hold=hold)
@@ -0,0 +1,138 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from airport.models import (
+    Airplane,
+    AirplaneType,
+    Airport,
+    City,
+    Country,
+    Crew,
+    Route,
+)
+from airport.versioning import bump_version, get_version
+
+
+API_CACHE_TIMEOUT = getattr(settings, "API_CACHE_TIMEOUT", 300)
+
+# Cache namespace -> models whose data appears in its responses.
+# Kept here rather than on the viewsets so that invalidation also works
+# in processes that never import the views (management commands, workers).
+CACHE_NAMESPACES = {
+    "country": (Country,),
+    "city": (City, Country),
+    "airport": (Airport, City, Country),
+    "airplane-type": (AirplaneType,),
+    "airplane": (Airplane, AirplaneType),
+    "crew": (Crew,),
+    "route": (Route, Airport, City, Country),
+}
+
+_dependents = {}
+for _namespace, _models in CACHE_NAMESPACES.items():
+    for _model in _models:
+        _dependents.setdefault(_model, set()).add(_namespace)
+
+
+def dependent_namespaces(model):
+    return _dependents.get(model, set())
+
+
+def _version_name(namespace):
+    return f"api_cache:{namespace}"
+
+
+def _stats_key(namespace, outcome):
+    return f"api_cache_stats:{namespace}:{outcome}"
+
+
+def _count(namespace, outcome):
+    key = _stats_key(namespace, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def invalidate_namespace(namespace):
+    bump_version(_version_name(namespace))
+
+
+def invalidate_model(model):
+    for namespace in dependent_namespaces(model):
+        invalidate_namespace(namespace)
+
+
+def cache_stats():
+    namespaces = sorted(CACHE_NAMESPACES)
+    keys = [
+        _stats_key(namespace, outcome)
+        for namespace in namespaces
+        for outcome in ("hits", "misses")
+    ]
+    values = cache.get_many(keys)
+    stats = {}
+    for namespace in namespaces:
+        hits = values.get(_stats_key(namespace, "hits"), 0)
+        misses = values.get(_stats_key(namespace, "misses"), 0)
+        total = hits + misses
+        stats[namespace] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def response_cache_key(namespace, request):
+    version = get_version(_version_name(namespace))
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    # Responses hold absolute links, which differ per scheme and host
+    url = f"{request.scheme}://{request.get_host()}{request.path}?{query}"
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f"api_cache:{namespace}:{version}:{digest}"
+
+
+def get_cached_data(namespace, request):
+    """Return (key, data) of a cached response, data is None on a miss."""
+    key = response_cache_key(namespace, request)
+    data = cache.get(key)
+    _count(namespace, "misses" if data is None else "hits")
+    return key, data
+
+
+def set_cached_data(key, data):
+    cache.set(key, data, API_CACHE_TIMEOUT)
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for list and retrieve responses.
+
+    Responses are cached per namespace (see CACHE_NAMESPACES) and per
+    absolute URL. A change to any model of the namespace bumps its shared
+    version, so stale entries are never read again and simply expire.
+    """
+
+    cache_namespace = None
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        key, data = get_cached_data(self.cache_namespace, request)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_cached_data(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
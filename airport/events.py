@@ -0,0 +1,170 @@
+"""
+Publish/subscribe of seat availability events.
+
+Writers publish from sync code once their transaction commits; the
+subscribers are async streams (see async_views.flight_availability_stream)
+waiting on an asyncio queue each, so one ASGI worker can hold many open
+streams without a thread per client.
+
+The broker class is taken from the SEAT_EVENTS_BROKER setting. The default
+LocalBroker only reaches the subscribers of the process that published,
+which is enough when one process both sells seats and serves the streams.
+RedisBroker relays events through Redis pub/sub, so streams served by the
+ASGI workers see the orders taken by the WSGI ones. Any other shared
+broker only needs the same publish() and subscribe().
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = getattr(settings, "SEAT_EVENTS_QUEUE_SIZE", 100)
+
+SEAT_TAKEN = "seat-taken"
+SEAT_RELEASED = "seat-released"
+# Seats changed in a way that is not described by the event, refetch the seat map
+SEATS_CHANGED = "seats-changed"
+
+
+def flight_channel(flight_id):
+    return f"flight:{flight_id}"
+
+
+class Subscription:
+    """Events of one channel for one subscriber, read with async iteration or get()."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def _deliver(self, event):
+        # Runs in the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A subscriber too slow to keep up drops its backlog
+            # and is told to reload the whole seat map instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": SEATS_CHANGED})
+
+    async def get(self, timeout=None):
+        """Next event, None if none arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """In-process fan-out, safe to publish to from any thread."""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Must be called from a running event loop."""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.channel, None)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # The subscriber's event loop is closed
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes to Redis; one listener thread per process subscribes to all
+    seat channels and hands the events to the local subscribers.
+    """
+
+    prefix = "seat_events:"
+
+    def __init__(self, url=None):
+        import redis
+
+        super().__init__()
+        self._redis = redis.Redis.from_url(url or settings.SEAT_EVENTS_REDIS_URL)
+        self._listener = None
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="seat-events", daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{self.prefix}*")
+                for message in pubsub.listen():
+                    channel = message["channel"].decode()[len(self.prefix):]
+                    super().publish(channel, json.loads(message["data"]))
+            except Exception:
+                # Events published while reconnecting are lost; a new stream
+                # starts from a fresh snapshot anyway
+                logger.exception("Seat events listener failed, reconnecting")
+                time.sleep(1)
+
+    def publish(self, channel, event):
+        # Runs after the commit, a lost event must not fail the request
+        try:
+            self._redis.publish(f"{self.prefix}{channel}", json.dumps(event))
+        except Exception:
+            logger.exception("Could not publish seat event to %s", channel)
+
+
+broker = import_string(getattr(settings, "SEAT_EVENTS_BROKER", "airport.events.LocalBroker"))()
+
+
+def publish_seats(flight_id, seats, taken):
+    """Announce (row, seat) pairs of a flight that were just sold or released."""
+    broker.publish(flight_channel(flight_id), {
+        "type": SEAT_TAKEN if taken else SEAT_RELEASED,
+        "flight": flight_id,
+        "seats": [{"row_number": row, "seat_number": seat} for row, seat in sorted(seats)],
+    })
+
+
+def publish_seats_changed(flight_id):
+    broker.publish(flight_channel(flight_id), {"type": SEATS_CHANGED, "flight": flight_id})
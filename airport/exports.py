@@ -0,0 +1,140 @@
+import csv
+import json
+import logging
+import time
+from datetime import date, datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from airport.metrics import EXPORT_DURATION, EXPORT_ROWS
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+FLIGHT_EXPORT_FIELDS = {
+    "id": "id",
+    "route": "route_id",
+    "source": "route__source__name",
+    "destination": "route__destination__name",
+    "airplane": "airplane__name",
+    "departure_time": "departure_time",
+    "arrival_time": "arrival_time",
+    "capacity": "capacity",
+    "seats_sold": "seats_sold",
+}
+
+TICKET_EXPORT_FIELDS = {
+    "id": "id",
+    "order": "order_id",
+    "user": "order__user_id",
+    "flight": "flight_id",
+    "row_number": "row_number",
+    "seat_number": "seat_number",
+}
+
+ORDER_EXPORT_FIELDS = {
+    "id": "id",
+    "user": "user_id",
+    "email": "user__email",
+    "created_at": "created_at",
+}
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error responses, exports are streamed
+        return json.dumps(data, cls=DjangoJSONEncoder).encode() + b"\n"
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and "detail" in data:
+            data = data["detail"]
+        return f"{data}\n".encode()
+
+
+class JSONClientRenderer(NDJSONRenderer):
+    """Lets clients asking for plain JSON get the NDJSON export instead of a 406."""
+
+    media_type = "application/json"
+
+
+EXPORT_RENDERERS = (NDJSONRenderer, CSVRenderer, JSONClientRenderer)
+
+
+class _Line:
+    """File-like object that hands back whatever csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def _timed(name, rows):
+    started = time.perf_counter()
+    count = 0
+    try:
+        for row in rows:
+            count += 1
+            yield row
+    finally:
+        elapsed = time.perf_counter() - started
+        EXPORT_ROWS.labels(name).inc(count)
+        EXPORT_DURATION.labels(name).observe(elapsed)
+        logger.info(
+            "Export %s: %d rows in %.2fs (%.0f rows/s)",
+            name, count, elapsed, count / elapsed if elapsed else 0,
+        )
+
+
+def stream_export(queryset, fields, export_format, name):
+    """
+    Stream `fields` of every row of the queryset as NDJSON or CSV.
+    Rows are fetched with a chunked iterator over values_list(), so
+    neither model instances nor the full result set are ever held.
+    `fields` maps output column names to queryset lookups.
+    """
+    columns = list(fields)
+    rows = _timed(
+        name,
+        queryset.values_list(*fields.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+    )
+    if export_format == "csv":
+        lines, content_type = _csv_lines(columns, rows), CSVRenderer.media_type
+    else:
+        lines, content_type = _ndjson_lines(columns, rows), NDJSONRenderer.media_type
+        export_format = NDJSONRenderer.format
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{name}.{export_format}"'
+    return response
@@ -0,0 +1,76 @@
+"""
+Great-circle distances between airports, in Python and as a database
+expression for recomputing many routes in one UPDATE statement.
+"""
+import math
+
+from django.db.models import FloatField, IntegerField, OuterRef, Subquery
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Round, Sin, Sqrt
+
+
+EARTH_RADIUS_KM = 6371.0088
+# Length of one degree of latitude
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def has_coordinates(airport):
+    return airport.latitude is not None and airport.longitude is not None
+
+
+def whole_km(lat1, lon1, lat2, lon2):
+    """haversine_km() rounded half up, like ROUND() in the database."""
+    return math.floor(haversine_km(lat1, lon1, lat2, lon2) + 0.5)
+
+
+def route_distance(source, destination):
+    """Whole kilometres between two airports, None if either has no coordinates."""
+    if not (has_coordinates(source) and has_coordinates(destination)):
+        return None
+    return whole_km(source.latitude, source.longitude, destination.latitude, destination.longitude)
+
+
+def haversine_expression(lat1, lon1, lat2, lon2):
+    """haversine_km() as a database expression over four coordinate expressions."""
+    phi1, phi2 = Radians(lat1), Radians(lat2)
+    a = (
+        Power(Sin((phi2 - phi1) / 2), 2)
+        + Cos(phi1) * Cos(phi2) * Power(Sin(Radians(lon2 - lon1) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def recompute_route_distances(routes):
+    """
+    Set the distance of every route of the queryset whose airports both
+    have coordinates, in a single UPDATE statement. Returns the number of
+    updated routes.
+    """
+    airports = routes.model._meta.get_field("source").related_model.objects
+
+    def coordinate(airport, column):
+        return Subquery(
+            airports.filter(pk=OuterRef(f"{airport}_id")).values(column)[:1],
+            output_field=FloatField(),
+        )
+
+    distance = haversine_expression(
+        coordinate("source", "latitude"),
+        coordinate("source", "longitude"),
+        coordinate("destination", "latitude"),
+        coordinate("destination", "longitude"),
+    )
+    return routes.filter(
+        source__latitude__isnull=False,
+        source__longitude__isnull=False,
+        destination__latitude__isnull=False,
+        destination__longitude__isnull=False,
+    ).update(distance=Cast(Round(distance), IntegerField()))
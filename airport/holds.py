@@ -0,0 +1,81 @@
+"""
+Temporary seat holds, kept in the database so that every worker sees them.
+
+Holds are created and converted into orders while holding the row lock of
+their flight, the same lock booking takes, so a seat cannot be held and
+sold at the same time. Expired holds stop counting right away and are
+deleted the next time their flight gets a hold, or by purge_seat_holds.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from airport.models import HeldSeat, SeatHold
+
+
+SEAT_HOLD_MINUTES = getattr(settings, "SEAT_HOLD_MINUTES", 10)
+SEAT_HOLD_MAX_MINUTES = getattr(settings, "SEAT_HOLD_MAX_MINUTES", 30)
+# Limits per user and flight, so that one customer cannot hold a whole flight
+SEAT_HOLDS_PER_USER = getattr(settings, "SEAT_HOLDS_PER_USER", 2)
+SEAT_HOLD_MAX_SEATS = getattr(settings, "SEAT_HOLD_MAX_SEATS", 9)
+
+
+class HoldLimitReached(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        f"At most {SEAT_HOLDS_PER_USER} seat holds per flight can be live at once, "
+        "book or wait out one of them first."
+    )
+    default_code = "hold_limit_reached"
+
+
+def live_holds():
+    return SeatHold.objects.filter(expires_at__gt=timezone.now())
+
+
+def held_seats(flight_id, exclude_hold=None):
+    """Return the (row, seat) pairs of a flight under a live hold."""
+    seats = HeldSeat.objects.filter(flight_id=flight_id, hold__expires_at__gt=timezone.now())
+    if exclude_hold is not None:
+        seats = seats.exclude(hold_id=exclude_hold)
+    return set(seats.values_list("row_number", "seat_number"))
+
+
+def create_hold(user, flight_id, seats, minutes):
+    """Store a hold of (row, seat) pairs; the caller holds the flight lock."""
+    if live_holds().filter(flight_id=flight_id, user=user).count() >= SEAT_HOLDS_PER_USER:
+        raise HoldLimitReached()
+    hold = SeatHold.objects.create(
+        flight_id=flight_id,
+        user=user,
+        expires_at=timezone.now() + timedelta(minutes=minutes),
+    )
+    HeldSeat.objects.bulk_create(
+        HeldSeat(hold=hold, flight_id=flight_id, row_number=row, seat_number=seat)
+        for row, seat in seats
+    )
+    return hold
+
+
+def hold_seats_of(hold):
+    return [(seat.row_number, seat.seat_number) for seat in hold.seats.all()]
+
+
+def get_hold(hold_id):
+    try:
+        return live_holds().get(pk=hold_id)
+    except (SeatHold.DoesNotExist, ValidationError):
+        # Unknown, expired or not a hold id at all
+        return None
+
+
+def purge_expired_holds(flight_id=None):
+    """Delete the expired holds of a flight, or of all flights; return how many."""
+    holds = SeatHold.objects.filter(expires_at__lte=timezone.now())
+    if flight_id is not None:
+        holds = holds.filter(flight_id=flight_id)
+    return holds.delete()[1].get(SeatHold._meta.label, 0)
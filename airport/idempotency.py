@@ -0,0 +1,103 @@
+"""
+Idempotency-Key support for create endpoints.
+
+The key is claimed by inserting an IdempotencyKey row in the same
+transaction that creates the object, and the response is stored on the
+row before the commit. A retry after the commit finds the row and gets
+the stored response back. A concurrent duplicate blocks on the unique
+(user, key) index until the first request commits, then replays its
+response. If the first request rolls back, the duplicate does the work
+itself. Failed requests are not stored, so a client may retry them with
+the same key.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from airport.models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_TTL = timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24))
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, separators=(",", ":"), cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Return (record, created). Must run inside the transaction doing the
+    work, so that the claim is released if it rolls back.
+    """
+    now = timezone.now()
+    IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=fingerprint, expires_at=now + IDEMPOTENCY_KEY_TTL
+            )
+        return record, True
+    except IntegrityError:
+        # Committed by an earlier request, or by a concurrent one
+        # this insert waited for
+        return IdempotencyKey.objects.get(user=user, key=key), False
+
+
+def purge_expired_keys(chunk_size=1000):
+    """Delete expired keys in chunks of chunk_size rows, return how many were deleted."""
+    deleted = 0
+    while True:
+        pks = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+
+class IdempotentCreateMixin:
+    """Replays the stored response of a create request retried with its Idempotency-Key."""
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError(
+                {IDEMPOTENCY_KEY_HEADER: f"Must be 1 to {MAX_KEY_LENGTH} characters long."}
+            )
+
+        fingerprint = request_fingerprint(request)
+        with transaction.atomic():
+            record, created = claim_key(request.user, key, fingerprint)
+            if not created:
+                if record.fingerprint != fingerprint:
+                    raise IdempotencyKeyReused()
+                response = Response(record.response_body, status=record.response_status)
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            response = super().create(request, *args, **kwargs)
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=["response_status", "response_body"])
+        return response
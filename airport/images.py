@@ -0,0 +1,168 @@
+"""
+Airplane image pipeline.
+
+Uploads are stored once per content: the original is named after the
+SHA-256 of its bytes, so the same picture uploaded for several airplanes
+(or twice) takes one file and is encoded once. The upload request only
+hashes, validates and stores the original. The resized WebP and JPEG
+variants are encoded by a background job (see airport.jobs) in a process
+pool, so encoding never blocks a request worker and uses every core of
+the worker machine. Files are only read and written through the default
+storage, so the pipeline works with remote storages too.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+from airport.jobs import enqueue
+from airport.models import AIRPLANE_IMAGE_DIR, Airplane
+
+
+# Variant name -> bounding box in pixels, the aspect ratio is kept
+IMAGE_VARIANTS = getattr(settings, "AIRPLANE_IMAGE_VARIANTS", {"thumb": 160, "medium": 640})
+IMAGE_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+IMAGE_QUALITY = getattr(settings, "AIRPLANE_IMAGE_QUALITY", 82)
+IMAGE_PROCESSES = getattr(settings, "AIRPLANE_IMAGE_PROCESSES", None)
+
+_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+_pool = None
+
+
+def original_path(content_hash, extension):
+    return f"{AIRPLANE_IMAGE_DIR}originals/{content_hash[:2]}/{content_hash}{extension}"
+
+
+def variant_path(content_hash, variant, image_format):
+    extension = "jpg" if image_format == "jpeg" else image_format
+    return f"{AIRPLANE_IMAGE_DIR}variants/{content_hash[:2]}/{content_hash}-{variant}.{extension}"
+
+
+def store_original(upload):
+    """
+    Hash and validate an uploaded file chunk by chunk and store it under
+    its content hash unless that file exists already. Returns (hash, name).
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise serializers.ValidationError({"image": "Upload a valid image."})
+    if image_format not in _EXTENSIONS:
+        raise serializers.ValidationError(
+            {"image": f"Unsupported image format, use one of {', '.join(sorted(_EXTENSIONS))}."}
+        )
+
+    name = original_path(content_hash, _EXTENSIONS[image_format])
+    if not default_storage.exists(name):
+        upload.seek(0)
+        saved = default_storage.save(name, upload)
+        if saved != name:
+            # The same file was stored concurrently under the wanted name
+            default_storage.delete(saved)
+    return content_hash, name
+
+
+def _encode(source, size, image_format, quality):
+    # Runs in a pool process, takes and returns the file contents
+    with Image.open(BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        encoded = BytesIO()
+        image.save(encoded, image_format, quality=quality)
+    return encoded.getvalue()
+
+
+def _save_once(name, content):
+    saved = default_storage.save(name, ContentFile(content))
+    if saved != name:
+        # The same variant was stored concurrently under the wanted name
+        default_storage.delete(saved)
+
+
+def _process_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(IMAGE_PROCESSES)
+    return _pool
+
+
+def generate_variants(content_hash, original):
+    """
+    Encode the missing variants of an original in parallel and store them
+    through the default storage. Returns {variant: {format: name}}.
+    """
+    variants, pending = {}, []
+    for variant, size in IMAGE_VARIANTS.items():
+        for image_format, pil_format in IMAGE_FORMATS.items():
+            name = variant_path(content_hash, variant, image_format)
+            variants.setdefault(variant, {})[image_format] = name
+            if not default_storage.exists(name):
+                pending.append((name, size, pil_format))
+    if pending:
+        with default_storage.open(original, "rb") as file:
+            source = file.read()
+        futures = [
+            (name, _process_pool().submit(_encode, source, size, pil_format, IMAGE_QUALITY))
+            for name, size, pil_format in pending
+        ]
+        for name, future in futures:
+            _save_once(name, future.result())
+    return variants
+
+
+def generate_airplane_image_variants(airplane_id, content_hash):
+    """Background job queued by an image upload."""
+    airplane = Airplane.objects.filter(pk=airplane_id, image_hash=content_hash).first()
+    if airplane is None:
+        # Deleted, or another image was uploaded since
+        return
+    airplane.image_variants = generate_variants(content_hash, airplane.image.name)
+    airplane.save(update_fields=["image_variants"])
+
+
+def set_airplane_image(airplane, upload):
+    """
+    Store an uploaded image for the airplane. Variants already encoded for
+    the same content are reused, otherwise a job is queued to encode them.
+    """
+    content_hash, name = store_original(upload)
+    existing = (
+        Airplane.objects.filter(image_hash=content_hash)
+        .exclude(image_variants={})
+        .values_list("image_variants", flat=True)
+        .first()
+    )
+    with transaction.atomic():
+        airplane.image.name = name
+        airplane.image_hash = content_hash
+        airplane.image_variants = existing or {}
+        airplane.save(update_fields=["image", "image_hash", "image_variants"])
+        if not existing:
+            enqueue(generate_airplane_image_variants, airplane_id=airplane.pk, content_hash=content_hash)
+
+
+def variant_urls(variants, request=None):
+    def url(name):
+        location = default_storage.url(name)
+        return request.build_absolute_uri(location) if request is not None else location
+
+    return {
+        variant: {image_format: url(name) for image_format, name in formats.items()}
+        for variant, formats in (variants or {}).items()
+    }
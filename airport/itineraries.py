@@ -0,0 +1,252 @@
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from heapq import heappop, heappush
+from itertools import count
+
+from django.conf import settings
+
+from airport.models import Flight
+from airport.versioning import bump_version, get_version, get_versions
+
+
+MIN_CONNECTION = timedelta(minutes=getattr(settings, "ITINERARY_MIN_CONNECTION_MINUTES", 45))
+MAX_LAYOVER = timedelta(hours=getattr(settings, "ITINERARY_MAX_LAYOVER_HOURS", 12))
+MAX_CACHED_DAYS = getattr(settings, "ITINERARY_MAX_CACHED_DAYS", 60)
+GLOBAL_VERSION = "itineraries"
+
+
+Connection = namedtuple(
+    "Connection",
+    ("departure_time", "arrival_time", "flight_id", "route_id", "source_id", "destination_id"),
+)
+
+
+def _departure(connection):
+    return connection.departure_time
+
+
+def _day_version(day):
+    return f"itineraries:{day.isoformat()}"
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def departure_day(value):
+    return value.astimezone(dt_timezone.utc).date()
+
+
+class DayIndex:
+    """
+    Connections departing on one UTC day, sorted by departure time and
+    bucketed by source airport and by (source, destination) pair.
+    """
+
+    def __init__(self, version, connections=()):
+        self.version = version
+        self.flights = {}
+        self.by_source = {}
+        self.by_pair = {}
+        for connection in sorted(connections, key=_departure):
+            self.flights[connection.flight_id] = connection
+            self.by_source.setdefault(connection.source_id, []).append(connection)
+            self.by_pair.setdefault(
+                (connection.source_id, connection.destination_id), []
+            ).append(connection)
+
+    def add(self, connection):
+        self.flights[connection.flight_id] = connection
+        insort(self.by_source.setdefault(connection.source_id, []), connection, key=_departure)
+        insort(
+            self.by_pair.setdefault((connection.source_id, connection.destination_id), []),
+            connection,
+            key=_departure,
+        )
+
+    def remove(self, flight_id):
+        connection = self.flights.pop(flight_id, None)
+        if connection is None:
+            return
+        for buckets, key in (
+            (self.by_source, connection.source_id),
+            (self.by_pair, (connection.source_id, connection.destination_id)),
+        ):
+            bucket = buckets[key]
+            bucket.remove(connection)
+            if not bucket:
+                del buckets[key]
+
+    @staticmethod
+    def _window(connections, earliest, latest):
+        start = bisect_left(connections, earliest, key=_departure)
+        for connection in connections[start:]:
+            if connection.departure_time > latest:
+                break
+            yield connection
+
+    def departures(self, source_id, earliest, latest, destination_id=None):
+        if destination_id is None:
+            connections = self.by_source.get(source_id, ())
+        else:
+            connections = self.by_pair.get((source_id, destination_id), ())
+        return self._window(connections, earliest, latest)
+
+
+class ConnectionIndex:
+    """
+    Per-process, time-sorted connection index over the Route/Flight graph.
+
+    Days are loaded lazily with one query each and patched in place when
+    flights change in this process. Changes made by other workers are
+    picked up through the shared day versions.
+    """
+
+    def __init__(self):
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, day, version):
+        start, end = _day_bounds(day)
+        rows = Flight.objects.filter(
+            departure_time__gte=start, departure_time__lt=end
+        ).values_list(
+            "departure_time",
+            "arrival_time",
+            "id",
+            "route_id",
+            "route__source_id",
+            "route__destination_id",
+        )
+        return DayIndex(version, (Connection(*row) for row in rows))
+
+    def day(self, day):
+        versions = get_versions(GLOBAL_VERSION, _day_version(day))
+        version = (versions[GLOBAL_VERSION], versions[_day_version(day)])
+        with self._lock:
+            index = self._days.get(day)
+            if index is not None and index.version == version:
+                self._days.move_to_end(day)
+                return index
+
+        index = self._load(day, version)
+        with self._lock:
+            self._days[day] = index
+            self._days.move_to_end(day)
+            while len(self._days) > MAX_CACHED_DAYS:
+                self._days.popitem(last=False)
+        return index
+
+    def _patch(self, day, change):
+        """Apply a local change to a loaded day and publish a new version."""
+        global_version = get_version(GLOBAL_VERSION)
+        new_version = bump_version(_day_version(day))
+        with self._lock:
+            index = self._days.get(day)
+            if index is None:
+                return
+            if index.version == (global_version, new_version - 1):
+                change(index)
+                index.version = (global_version, new_version)
+            else:
+                # Another worker changed this day in between, reload on next read
+                del self._days[day]
+
+    def flight_saved(self, flight, previous_day=None):
+        day = departure_day(flight.departure_time)
+        connection = Connection(
+            flight.departure_time,
+            flight.arrival_time,
+            flight.pk,
+            flight.route_id,
+            flight.route.source_id,
+            flight.route.destination_id,
+        )
+        if previous_day is not None and previous_day != day:
+            self._patch(previous_day, lambda index: index.remove(flight.pk))
+
+        def change(index):
+            index.remove(flight.pk)
+            index.add(connection)
+
+        self._patch(day, change)
+
+    def flight_deleted(self, flight_id, departure_time):
+        self._patch(departure_day(departure_time), lambda index: index.remove(flight_id))
+
+    def invalidate(self):
+        bump_version(GLOBAL_VERSION)
+        with self._lock:
+            self._days.clear()
+
+    def search(self, origin_ids, destination_ids, day, max_legs=3, limit=20,
+               min_connection=MIN_CONNECTION, max_layover=MAX_LAYOVER):
+        """
+        Return up to `limit` itineraries, each a list of connections,
+        leaving one of the origin airports on `day` and reaching one of the
+        destination airports in at most `max_legs` flights, ranked by total
+        travel time. Layovers are between min_connection and max_layover
+        and no airport is visited twice.
+
+        Partial itineraries are extended best-first by the time travelled
+        so far. Extending one never makes it shorter, so complete ones come
+        off the queue in ranking order and the search stops at the
+        `limit`-th: itineraries slower than the results are never built.
+        """
+        origin_ids = set(origin_ids)
+        destination_ids = set(destination_ids)
+        days = {}
+        results = []
+        queue = []
+        sequence = count()
+
+        def get_day(value):
+            if value not in days:
+                days[value] = self.day(value)
+            return days[value]
+
+        def next_legs(source_id, earliest, latest, final):
+            current = departure_day(earliest)
+            while current <= departure_day(latest):
+                index = get_day(current)
+                if final:
+                    for destination_id in destination_ids:
+                        yield from index.departures(source_id, earliest, latest, destination_id)
+                else:
+                    yield from index.departures(source_id, earliest, latest)
+                current += timedelta(days=1)
+
+        def push(path):
+            travelled = path[-1].arrival_time - path[0].departure_time
+            heappush(queue, (travelled, path[0].departure_time, next(sequence), path))
+
+        start, end = _day_bounds(day)
+        for origin_id in origin_ids:
+            for connection in get_day(day).departures(origin_id, start, end):
+                if connection.destination_id not in origin_ids:
+                    push((connection,))
+
+        while queue and len(results) < limit:
+            path = heappop(queue)[-1]
+            last = path[-1]
+            if last.destination_id in destination_ids:
+                results.append(list(path))
+                continue
+            if len(path) == max_legs:
+                continue
+            visited = origin_ids.union(leg.destination_id for leg in path)
+            for connection in next_legs(
+                last.destination_id,
+                last.arrival_time + min_connection,
+                last.arrival_time + max_layover,
+                final=len(path) + 1 == max_legs,
+            ):
+                if connection.destination_id not in visited:
+                    push(path + (connection,))
+        return results
+
+
+connection_index = ConnectionIndex()
@@ -0,0 +1,124 @@
+"""
+Background jobs stored in the database.
+
+enqueue() inserts a Job row in the caller's transaction, so a job for an
+order only exists if the order was committed. Workers (manage.py
+run_worker) claim due jobs in batches with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of them can share a queue without waiting on each
+other. Claiming pushes run_at forward by JOB_LEASE_SECONDS, which makes
+the job due again if its worker dies. Jobs therefore run at least once,
+and handlers should be safe to repeat.
+
+A failing job is retried with exponential backoff and moved to the
+DeadJob table after max_attempts.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from airport.models import DeadJob, Job
+
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE = timedelta(seconds=getattr(settings, "JOB_LEASE_SECONDS", 300))
+JOB_BATCH_SIZE = getattr(settings, "JOB_BATCH_SIZE", 100)
+RETRY_BASE_SECONDS = getattr(settings, "JOB_RETRY_BASE_SECONDS", 10)
+RETRY_MAX_SECONDS = getattr(settings, "JOB_RETRY_MAX_SECONDS", 60 * 60)
+
+
+def job_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def enqueue(func, queue="default", delay=None, max_attempts=5, **payload):
+    """Queue func(**payload); the payload must be JSON serializable."""
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        queue=queue, name=job_name(func), payload=payload, run_at=run_at, max_attempts=max_attempts
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff with full jitter, capped at RETRY_MAX_SECONDS."""
+    ceiling = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+def claim_jobs(queue="default", batch_size=JOB_BATCH_SIZE):
+    """Lease up to batch_size due jobs of the queue to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(queue=queue, run_at__lte=now)
+            .order_by("run_at")[:batch_size]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                run_at=now + JOB_LEASE, attempts=F("attempts") + 1
+            )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def _failed(job, error):
+    if job.attempts >= job.max_attempts:
+        logger.error("Job %s failed %d times, moved to dead jobs", job, job.attempts)
+        with transaction.atomic():
+            DeadJob.objects.create(
+                queue=job.queue,
+                name=job.name,
+                payload=job.payload,
+                attempts=job.attempts,
+                last_error=error,
+                created_at=job.created_at,
+            )
+            job.delete()
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            run_at=timezone.now() + retry_delay(job.attempts), last_error=error
+        )
+
+
+def run_jobs(jobs):
+    """Run claimed jobs, each in its own transaction. Returns the number that succeeded."""
+    done = []
+    for job in jobs:
+        try:
+            with transaction.atomic():
+                import_string(job.name)(**job.payload)
+        except Exception:
+            logger.warning("Job %s failed (attempt %d)", job, job.attempts, exc_info=True)
+            _failed(job, traceback.format_exc())
+        else:
+            done.append(job.pk)
+    Job.objects.filter(pk__in=done).delete()
+    return len(done)
+
+
+def run_batch(queue="default", batch_size=JOB_BATCH_SIZE):
+    """Claim and run one batch, returns (claimed, succeeded)."""
+    jobs = claim_jobs(queue, batch_size)
+    return len(jobs), run_jobs(jobs)
+
+
+def requeue_dead_jobs(queryset=None):
+    """Move dead jobs back to their queue with a fresh attempt budget."""
+    queryset = DeadJob.objects.all() if queryset is None else queryset
+    with transaction.atomic():
+        dead = list(queryset.select_for_update())
+        Job.objects.bulk_create(
+            Job(queue=job.queue, name=job.name, payload=job.payload, run_at=timezone.now())
+            for job in dead
+        )
+        DeadJob.objects.filter(pk__in=[job.pk for job in dead]).delete()
+    return len(dead)
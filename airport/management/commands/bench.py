@@ -0,0 +1,404 @@
+import json
+import logging
+import math
+import platform
+import random
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from airport.models import (
+    Airplane,
+    AirplaneType,
+    Airport,
+    City,
+    Country,
+    Crew,
+    Flight,
+    Order,
+    Route,
+    Ticket,
+    TURNAROUND,
+)
+from airport.scheduling import sync_crew_assignments
+from airport.urls import router
+from user.urls import urlpatterns as user_urlpatterns
+
+
+BENCH_PASSWORD = "bench-password"
+READ_METHODS = ("get",)
+
+Case = namedtuple("Case", ("name", "method", "path", "params", "data", "anonymous"))
+
+
+def percentile(values, quantile):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[min(len(values) - 1, int(len(values) * quantile))]
+
+
+@contextmanager
+def quiet_request_log():
+    """Mute the per-request performance log, its lines would swamp the report."""
+    logger = logging.getLogger("airport.performance")
+
+    def mute(record):
+        return False
+
+    logger.addFilter(mute)
+    try:
+        yield
+    finally:
+        logger.removeFilter(mute)
+
+
+def seed(rng, countries, airports, routes, flights, orders, seats_in_row=6):
+    """
+    Bulk-create a synthetic schedule and return the objects the
+    benchmark cases point at. Two extra empty flights take the seats
+    booked and held by the write cases.
+    """
+    country_objs = Country.objects.bulk_create(
+        Country(name=f"Country {i}") for i in range(countries)
+    )
+    city_objs = City.objects.bulk_create(
+        City(name=f"City {i}", country=country_objs[i % countries]) for i in range(airports)
+    )
+    airport_objs = Airport.objects.bulk_create(
+        Airport(
+            name=f"Airport {i}",
+            city=city_objs[i],
+            latitude=rng.uniform(35, 60),
+            longitude=rng.uniform(-10, 40),
+        )
+        for i in range(airports)
+    )
+    airplane_types = AirplaneType.objects.bulk_create(
+        AirplaneType(name=name) for name in ("Narrow-body", "Wide-body", "Regional")
+    )
+    airplanes = Airplane.objects.bulk_create(
+        Airplane(
+            name=f"Airplane {i}",
+            rows=30,
+            seats_in_rows=seats_in_row,
+            airplane_type=airplane_types[i % len(airplane_types)],
+        )
+        for i in range(10)
+    )
+    crews = Crew.objects.bulk_create(
+        Crew(first_name=f"Crew{i}", last_name="Bench") for i in range(20)
+    )
+
+    pairs = set()
+    max_routes = min(routes, airports * (airports - 1))
+    while len(pairs) < max_routes:
+        source, destination = rng.sample(airport_objs, 2)
+        pairs.add((source, destination))
+    route_objs = Route.objects.bulk_create(
+        Route(source=source, destination=destination, distance=rng.randint(200, 9000))
+        for source, destination in pairs
+    )
+
+    # Every airplane flies its flights one after the other with its own
+    # two crew members, so that no airplane or crew member is double-booked
+    start = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+    free_at = {airplane.pk: start for airplane in airplanes}
+    flight_objs = []
+    for _ in range(flights):
+        airplane = rng.choice(airplanes)
+        departure = free_at[airplane.pk] + TURNAROUND + timedelta(minutes=rng.randrange(12 * 60))
+        arrival = departure + timedelta(minutes=rng.randint(60, 600))
+        free_at[airplane.pk] = arrival
+        flight_objs.append(Flight(
+            route=rng.choice(route_objs),
+            airplane=airplane,
+            departure_time=departure,
+            arrival_time=arrival,
+            capacity=airplane.rows * airplane.seats_in_rows,
+            available_at=arrival + TURNAROUND,
+        ))
+    flight_objs = Flight.objects.bulk_create(flight_objs)
+    airplane_crews = {
+        airplane.pk: crews[2 * i:2 * i + 2] for i, airplane in enumerate(airplanes)
+    }
+    Flight.crew.through.objects.bulk_create(
+        Flight.crew.through(flight_id=flight.pk, crew_id=crew.pk)
+        for flight in flight_objs
+        for crew in airplane_crews[flight.airplane_id]
+    )
+    sync_crew_assignments([flight.pk for flight in flight_objs])
+
+    user = get_user_model().objects.create_user(
+        email="bench@example.com", password=BENCH_PASSWORD, is_staff=True
+    )
+    order_objs = Order.objects.bulk_create(Order(user=user) for _ in range(orders))
+    sold = {}
+    tickets = []
+    for order in order_objs:
+        flight = rng.choice(flight_objs)
+        for _ in range(rng.randint(1, 3)):
+            seat = sold.get(flight.pk, 0)
+            if seat >= flight.capacity:
+                break
+            sold[flight.pk] = seat + 1
+            tickets.append(Ticket(
+                order=order,
+                flight=flight,
+                row_number=seat // seats_in_row + 1,
+                seat_number=seat % seats_in_row + 1,
+            ))
+    Ticket.objects.bulk_create(tickets)
+    call_command("reconcile_seat_counters", stdout=StringIO())
+
+    airplane = Airplane.objects.create(
+        name="Airplane bench writes",
+        rows=200,
+        seats_in_rows=seats_in_row,
+        airplane_type=airplane_types[0],
+    )
+    write_flights = [
+        Flight.objects.create(
+            route=route_objs[0],
+            airplane=airplane,
+            departure_time=start + timedelta(days=day),
+            arrival_time=start + timedelta(days=day, hours=2),
+        )
+        for day in range(2)
+    ]
+    return {"user": user, "flights": flight_objs, "write_flights": write_flights}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset and benchmarks every airport and user API endpoint, "
+        "reporting latency percentiles, SQL queries, DB time and response size"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--countries", type=int, default=10)
+        parser.add_argument("--airports", type=int, default=50)
+        parser.add_argument("--routes", type=int, default=200)
+        parser.add_argument("--flights", type=int, default=2000)
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--requests", type=int, default=30, help="Measured requests per endpoint")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per endpoint")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="bench-results.json", help="Where to save the JSON results")
+        parser.add_argument("--compare", help="Previous JSON results to print p50 changes against")
+        parser.add_argument(
+            "--current-db",
+            action="store_true",
+            help="Seed into the configured database instead of a throwaway test database. "
+                 "Seeded data is left in place.",
+        )
+
+    def handle(self, *args, **options):
+        if options["airports"] < 2 or options["countries"] < 1:
+            raise CommandError("At least one country and two airports are required.")
+        previous = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                previous = json.load(file)
+
+        old_name = None
+        if not options["current_db"]:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Measure production behaviour (no debug toolbar) against a private cache, so that
+        # results neither depend on nor pollute the shared one. Throttling is off so that
+        # it does not turn measured requests into 429s
+        cache_settings = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                      "LOCATION": "bench"}}
+        try:
+            with override_settings(DEBUG=False, CACHES=cache_settings), \
+                    mock.patch.object(APIView, "get_throttles", return_value=[]), \
+                    quiet_request_log():
+                results = self._run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(results, previous)
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def _run(self, options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+        data = seed(
+            rng,
+            options["countries"],
+            options["airports"],
+            options["routes"],
+            options["flights"],
+            options["orders"],
+        )
+        self.stdout.write(f"Seeded dataset in {time.perf_counter() - started:.1f}s")
+
+        endpoints = {}
+        skipped = []
+        for case in self._cases(data, skipped):
+            endpoints[case.name] = self._measure(case, data["user"], options["requests"], options["warmup"])
+
+        return {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "dataset": {
+                    key: options[key] for key in ("countries", "airports", "routes", "flights", "orders")
+                },
+                "requests": options["requests"],
+                "seed": options["seed"],
+                "not_benchmarked": skipped,
+            },
+            "endpoints": endpoints,
+        }
+
+    def _cases(self, data, skipped):
+        """
+        Yield one case per router endpoint and HTTP method. Reads run as the
+        staff bench user; writes only where a repeatable scenario exists.
+        """
+        flight = data["flights"][0]
+        booking_flight, hold_flight = data["write_flights"]
+        params = {
+            "airport:itinerary-list": {
+                "from": str(flight.route.source_id),
+                "to": str(flight.route.destination_id),
+                "date": flight.departure_time.date().isoformat(),
+            },
+            "airport:search-list": {"q": "airport 1"},
+            "airport:airport-nearby": {"lat": 50.0, "lon": 30.0, "radius_km": 500},
+        }
+        seats_in_row = booking_flight.airplane.seats_in_rows
+        writes = {
+            ("airport:order-list", "post"): lambda i: {"tickets": [{
+                "flight": booking_flight.pk,
+                "row_number": i // seats_in_row + 1,
+                "seat_number": i % seats_in_row + 1,
+            }]},
+            ("airport:flight-holds", "post"): lambda i: {"seats": [{
+                "row_number": i // seats_in_row + 1,
+                "seat_number": i % seats_in_row + 1,
+            }]},
+        }
+        detail_kwargs = {"airport:flight-holds": {"pk": hold_flight.pk}}
+
+        for prefix, viewset, basename in router.registry:
+            sample = None
+            queryset = getattr(viewset, "queryset", None)
+            if queryset is not None:
+                sample = queryset.model.objects.order_by("pk").values_list("pk", flat=True).first()
+            for route in router.get_routes(viewset):
+                mapping = router.get_method_map(viewset, route.mapping)
+                if not mapping:
+                    continue
+                name = f"airport:{route.name.format(basename=basename)}"
+                kwargs = None
+                if route.detail:
+                    kwargs = detail_kwargs.get(name, {"pk": sample})
+                path = reverse(name, kwargs=kwargs)
+                for method in mapping:
+                    if method in READ_METHODS:
+                        yield Case(f"{name} {method.upper()}", method, path, params.get(name), None, False)
+                    elif (name, method) in writes:
+                        yield Case(f"{name} {method.upper()}", method, path, None, writes[name, method], False)
+                    else:
+                        skipped.append(f"{name} {method.upper()}")
+
+        refresh = RefreshToken.for_user(data["user"])
+        user_cases = {
+            "user:create": ("post", lambda i: {"email": f"bench-{i}@example.com", "password": "bench-pass"}, True),
+            "user:token_obtain_pair": (
+                "post", lambda i: {"email": data["user"].email, "password": BENCH_PASSWORD}, True
+            ),
+            "user:token_refresh": ("post", lambda i: {"refresh": str(refresh)}, True),
+            "user:token_verify": ("post", lambda i: {"token": str(refresh.access_token)}, True),
+            "user:manage": ("get", None, False),
+        }
+        for pattern in user_urlpatterns:
+            name = f"user:{pattern.name}"
+            if name not in user_cases:
+                skipped.append(name)
+                continue
+            method, body, anonymous = user_cases[name]
+            yield Case(f"{name} {method.upper()}", method, reverse(name), None, body, anonymous)
+
+    def _measure(self, case, user, requests, warmup):
+        client = APIClient()
+        if not case.anonymous:
+            client.force_authenticate(user=user)
+
+        latencies, queries, db_times, sizes, statuses = [], [], [], [], {}
+        for i in range(warmup + requests):
+            request_kwargs = {}
+            if case.params:
+                request_kwargs["data"] = case.params
+            if case.data:
+                request_kwargs = {"data": case.data(i), "format": "json"}
+
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, case.method)(case.path, **request_kwargs)
+                if response.streaming:
+                    size = len(b"".join(response.streaming_content))
+                else:
+                    size = len(response.content)
+                elapsed = time.perf_counter() - started
+
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            queries.append(len(captured.captured_queries))
+            db_times.append(sum(float(query["time"]) for query in captured.captured_queries))
+            sizes.append(size)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        latencies.sort()
+        return {
+            "method": case.method.upper(),
+            "path": case.path,
+            "requests": requests,
+            "status": statuses,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "queries": max(queries),
+            "db_ms": round(sum(db_times) / len(db_times) * 1000, 2),
+            "bytes": math.ceil(sum(sizes) / len(sizes)),
+        }
+
+    def _report(self, results, previous):
+        previous_endpoints = previous["endpoints"] if previous else {}
+        header = f"{'endpoint':<40}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'db ms':>9}{'bytes':>10}  status"
+        if previous:
+            header += "  p50 change"
+        self.stdout.write(header)
+        for name, stats in results["endpoints"].items():
+            statuses = ",".join(f"{code}x{count}" for code, count in sorted(stats["status"].items()))
+            line = (
+                f"{name:<40}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                f"{stats['queries']:>9}{stats['db_ms']:>9.1f}{stats['bytes']:>10}  {statuses}"
+            )
+            before = previous_endpoints.get(name)
+            if before and before["p50_ms"]:
+                line += f"  {(stats['p50_ms'] - before['p50_ms']) / before['p50_ms']:+.0%}"
+            self.stdout.write(line)
+        if results["meta"]["not_benchmarked"]:
+            self.stdout.write("Not benchmarked: " + ", ".join(results["meta"]["not_benchmarked"]))
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from airport.booking import SeatConflict, book_seats
+from airport.models import (
+    Airplane,
+    AirplaneType,
+    Airport,
+    City,
+    Country,
+    Flight,
+    Route,
+)
+
+
+class Command(BaseCommand):
+    help = "Measures booking throughput of concurrent orders competing for one flight"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=50, help="Orders per thread")
+        parser.add_argument("--seats", type=int, default=3, help="Adjacent seats per order")
+        parser.add_argument("--rows", type=int, default=60)
+        parser.add_argument("--seats-in-row", type=int, default=6)
+        parser.add_argument(
+            "--current-db",
+            action="store_true",
+            help="Book into the configured database instead of a throwaway test database. "
+                 "The benchmark flight and its orders are deleted afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        old_name = None
+        if not options["current_db"]:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # A private cache keeps the seat maps of the benchmark flight out of the shared one
+        cache_settings = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                      "LOCATION": "bench-booking"}}
+        try:
+            with override_settings(CACHES=cache_settings):
+                results, elapsed = self._run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        self._report(results, elapsed)
+
+    def _run(self, options):
+        flight, user = self._create_fixture(options["rows"], options["seats_in_row"])
+        try:
+            return self._book_concurrently(flight, user, options)
+        finally:
+            if options["current_db"]:
+                flight.route.source.city.country.delete()
+                flight.airplane.airplane_type.delete()
+                user.delete()
+                self.stdout.write(self.style.SUCCESS("Benchmark data removed."))
+
+    def _book_concurrently(self, flight, user, options):
+        results = {"booked": 0, "conflicts": 0, "errors": 0, "latencies": []}
+        lock = threading.Lock()
+
+        def worker():
+            rng = random.Random()
+            try:
+                for _ in range(options["orders"]):
+                    row = rng.randint(1, options["rows"])
+                    first_seat = rng.randint(1, options["seats_in_row"] - options["seats"] + 1)
+                    tickets = [
+                        {"flight_id": flight.pk, "row_number": row, "seat_number": seat}
+                        for seat in range(first_seat, first_seat + options["seats"])
+                    ]
+                    started = time.perf_counter()
+                    try:
+                        book_seats(user, tickets)
+                        outcome = "booked"
+                    except SeatConflict:
+                        outcome = "conflicts"
+                    except serializers.ValidationError:
+                        outcome = "errors"
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results[outcome] += 1
+                        results["latencies"].append(elapsed)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+    def _report(self, results, elapsed):
+        latencies = sorted(results["latencies"])
+        total = len(latencies)
+        self.stdout.write(f"Orders attempted: {total} in {elapsed:.2f}s ({total / elapsed:.1f} orders/s)")
+        self.stdout.write(f"Booked: {results['booked']}, seat conflicts: {results['conflicts']}, "
+                          f"rejected: {results['errors']}")
+        if latencies:
+            for label, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                value = latencies[min(total - 1, int(total * quantile))]
+                self.stdout.write(f"{label}: {value * 1000:.1f} ms")
+
+    def _create_fixture(self, rows, seats_in_row):
+        suffix = timezone.now().strftime("%Y%m%d%H%M%S%f")
+        country = Country.objects.create(name=f"Bench {suffix}")
+        city = City.objects.create(name="Bench City", country=country)
+        source = Airport.objects.create(name="Bench Source", city=city)
+        destination = Airport.objects.create(name="Bench Destination", city=city)
+        route = Route.objects.create(source=source, destination=destination, distance=1000)
+        airplane_type = AirplaneType.objects.create(name=f"Bench {suffix}")
+        airplane = Airplane.objects.create(
+            name=f"Bench {suffix}", rows=rows, seats_in_rows=seats_in_row, airplane_type=airplane_type
+        )
+        departure = timezone.now() + timedelta(days=1)
+        flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=departure,
+            arrival_time=departure + timedelta(hours=2),
+        )
+        user = get_user_model().objects.create_user(email=f"bench-{suffix}@example.com")
+        return flight, user
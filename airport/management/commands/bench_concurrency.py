@@ -0,0 +1,229 @@
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import WSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.testcases import QuietWSGIRequestHandler
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.views import APIView
+
+from airport.management.commands.bench import percentile, quiet_request_log, seed
+
+
+ENDPOINTS = ("flights", "seats", "airports")
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server with a fixed pool of worker threads, like a threaded gunicorn worker."""
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class WSGIServerThread:
+    def __init__(self, threads):
+        self.server = PooledWSGIServer(("127.0.0.1", 0), QuietWSGIRequestHandler, threads=threads)
+        self.server.set_app(get_wsgi_application())
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class ASGIServerThread:
+    def __init__(self):
+        import uvicorn
+
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        config = uvicorn.Config(
+            get_asgi_application(), lifespan="off", access_log=False, log_config=None
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(
+            target=self.server.run, kwargs={"sockets": [self.socket]}, daemon=True
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+        self.socket.close()
+
+
+async def fetch(port, path, delay):
+    """
+    GET a path over a new connection. A slow client sends the request
+    line, waits `delay` seconds and only then sends the headers.
+    """
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request_line = f"GET {path} HTTP/1.1\r\n".encode()
+    headers = b"Host: localhost\r\nConnection: close\r\n\r\n"
+    try:
+        if delay:
+            writer.write(request_line)
+            await writer.drain()
+            await asyncio.sleep(delay)
+            writer.write(headers)
+        else:
+            writer.write(request_line + headers)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status = int(response.split(b" ", 2)[1]) if response else 0
+    return time.perf_counter() - started, status
+
+
+async def run_load(port, paths, requests, concurrency, delay):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            try:
+                return await fetch(port, paths[index % len(paths)], delay)
+            except OSError:
+                return None, 0
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, status in results if status == 200)
+    errors = sum(1 for _, status in results if status != 200)
+    stats = {"requests": requests, "errors": errors, "rps": round(requests / elapsed, 1)}
+    if latencies:
+        for label, quantile in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            stats[label] = round(percentile(latencies, quantile) * 1000, 1)
+    return stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares concurrent throughput and latency of the sync read endpoints under a "
+        "threaded WSGI server with their async versions under a single uvicorn worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", default="1,10,50,100", help="Comma separated client counts")
+        parser.add_argument("--requests", type=int, default=300, help="Requests per concurrency level")
+        parser.add_argument("--client-delay", type=float, default=50, help="Slow client delay in ms")
+        parser.add_argument("--wsgi-threads", type=int, default=8)
+        parser.add_argument("--endpoint", choices=ENDPOINTS, default="flights")
+        parser.add_argument("--flights", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="bench-concurrency.json")
+        parser.add_argument(
+            "--current-db",
+            action="store_true",
+            help="Seed into the configured database instead of a throwaway test database. "
+                 "Seeded data is left in place.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(value) for value in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency must be a comma separated list of integers.")
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError("uvicorn is required to run the ASGI side of the benchmark.")
+
+        old_name = None
+        if not options["current_db"]:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cache_settings = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                      "LOCATION": "bench-concurrency"}}
+        try:
+            with override_settings(DEBUG=False, CACHES=cache_settings), \
+                    mock.patch.object(APIView, "get_throttles", return_value=[]), \
+                    quiet_request_log():
+                results = self._run(options, levels)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def _paths(self, endpoint, data):
+        flight_ids = [flight.pk for flight in data["flights"][:50]]
+        if endpoint == "flights":
+            return [reverse("airport:flight-list")], [reverse("airport:async-flight-list")]
+        if endpoint == "seats":
+            return (
+                [reverse("airport:flight-seats", kwargs={"pk": pk}) for pk in flight_ids],
+                [reverse("airport:async-flight-seats", kwargs={"pk": pk}) for pk in flight_ids],
+            )
+        return [reverse("airport:airport-list")], [reverse("airport:async-airport-list")]
+
+    def _run(self, options, levels):
+        data = seed(random.Random(options["seed"]), 10, 50, 200, options["flights"], 200)
+        wsgi_paths, asgi_paths = self._paths(options["endpoint"], data)
+        delay = options["client_delay"] / 1000
+        results = {
+            "endpoint": options["endpoint"],
+            "client_delay_ms": options["client_delay"],
+            "wsgi_threads": options["wsgi_threads"],
+            "levels": {},
+        }
+
+        self.stdout.write(
+            f"{'clients':>8}  {'server':<6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}"
+        )
+        for level in levels:
+            results["levels"][level] = {}
+            for name, server, paths in (
+                ("wsgi", WSGIServerThread(options["wsgi_threads"]), wsgi_paths),
+                ("asgi", ASGIServerThread(), asgi_paths),
+            ):
+                with server:
+                    stats = asyncio.run(run_load(server.port, paths, options["requests"], level, delay))
+                results["levels"][level][name] = stats
+                self.stdout.write(
+                    f"{level:>8}  {name:<6}{stats['rps']:>9.1f}{stats.get('p50_ms', 0):>9.1f}"
+                    f"{stats.get('p95_ms', 0):>9.1f}{stats.get('p99_ms', 0):>9.1f}{stats['errors']:>8}"
+                )
+        return results
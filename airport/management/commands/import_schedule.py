@@ -0,0 +1,382 @@
+import csv
+import json
+import time
+from datetime import timezone as dt_timezone
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from airport.autocomplete import autocomplete_index
+from airport.caching import CACHE_NAMESPACES, invalidate_namespace
+from airport.geo import recompute_route_distances
+from airport.itineraries import connection_index
+from airport.models import (
+    Airplane,
+    AirplaneType,
+    Airport,
+    City,
+    Country,
+    Flight,
+    Route,
+    TURNAROUND,
+)
+from airport.nearby import nearby_index
+from airport.scheduling import OVERLAP_CONSTRAINTS, sync_crew_assignments
+
+
+KINDS = ("countries", "cities", "airports", "airplane_types", "airplanes", "routes", "flights")
+
+
+def _optional_float(value):
+    return None if value in (None, "") else float(value)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class ScheduleImporter:
+    """
+    Loads schedule records in dependency order with bulk writes.
+
+    Every natural key already in the database is read once into an
+    in-memory map, so resolving a city, airport or airplane name never
+    costs a query. New rows are written with bulk_create per batch;
+    with upsert=True the mutable fields of existing rows are updated
+    with bulk_update instead of being left alone.
+    """
+
+    def __init__(self, batch_size=5000, upsert=False):
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.stats = {}
+        self.countries = dict(Country.objects.values_list("name", "id"))
+        self.cities = {
+            (country_id, name): city_id
+            for city_id, country_id, name in City.objects.values_list("id", "country_id", "name")
+        }
+        self.airports = dict(Airport.objects.values_list("name", "id"))
+        self.airplane_types = dict(AirplaneType.objects.values_list("name", "id"))
+        self.airplanes = {
+            name: (airplane_id, rows * seats_in_rows)
+            for airplane_id, name, rows, seats_in_rows
+            in Airplane.objects.values_list("id", "name", "rows", "seats_in_rows")
+        }
+        self.routes = {
+            (source_id, destination_id): route_id
+            for route_id, source_id, destination_id
+            in Route.objects.values_list("id", "source_id", "destination_id")
+        }
+        self._flights = None
+
+    def _count(self, kind, created=0, updated=0, skipped=0):
+        stats = self.stats.setdefault(kind, {"created": 0, "updated": 0, "skipped": 0})
+        stats["created"] += created
+        stats["updated"] += updated
+        stats["skipped"] += skipped
+
+    @staticmethod
+    def _lookup(cache, key, label):
+        try:
+            return cache[key]
+        except KeyError:
+            raise CommandError(f"Unknown {label}: {key!r}")
+
+    @staticmethod
+    def _datetime(value):
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+        if parsed is None:
+            raise CommandError(f"Invalid datetime: {value!r}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+
+    def _ensure_country(self, name):
+        if name not in self.countries:
+            self.countries[name] = Country.objects.create(name=name).pk
+            self._count("countries", created=1)
+        return self.countries[name]
+
+    def _ensure_city(self, name, country):
+        key = (self._ensure_country(country), name)
+        if key not in self.cities:
+            self.cities[key] = City.objects.create(name=name, country_id=key[0]).pk
+            self._count("cities", created=1)
+        return self.cities[key]
+
+    def import_countries(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            names = list(dict.fromkeys(row["name"] for row in batch))
+            new = [Country(name=name) for name in names if name not in self.countries]
+            Country.objects.bulk_create(new)
+            self.countries.update((country.name, country.pk) for country in new)
+            self._count("countries", created=len(new), skipped=len(batch) - len(new))
+
+    def import_cities(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            new = {}
+            for row in batch:
+                key = (self._ensure_country(row["country"]), row["name"])
+                if key not in self.cities and key not in new:
+                    new[key] = City(name=row["name"], country_id=key[0])
+            City.objects.bulk_create(new.values())
+            self.cities.update((key, city.pk) for key, city in new.items())
+            self._count("cities", created=len(new), skipped=len(batch) - len(new))
+
+    def import_airports(self, rows):
+        """
+        Airport rows carry their city and country, which are created on
+        demand, and optionally their latitude and longitude.
+        """
+        for batch in _batches(rows, self.batch_size):
+            new = {}
+            for row in batch:
+                if row["name"] in self.airports or row["name"] in new:
+                    continue
+                city_id = self._ensure_city(row["city"], row["country"])
+                new[row["name"]] = Airport(
+                    name=row["name"],
+                    city_id=city_id,
+                    latitude=_optional_float(row.get("latitude")),
+                    longitude=_optional_float(row.get("longitude")),
+                )
+            Airport.objects.bulk_create(new.values())
+            self.airports.update((name, airport.pk) for name, airport in new.items())
+            self._count("airports", created=len(new), skipped=len(batch) - len(new))
+
+    def import_airplane_types(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            names = list(dict.fromkeys(row["name"] for row in batch))
+            new = [AirplaneType(name=name) for name in names if name not in self.airplane_types]
+            AirplaneType.objects.bulk_create(new)
+            self.airplane_types.update((item.name, item.pk) for item in new)
+            self._count("airplane_types", created=len(new), skipped=len(batch) - len(new))
+
+    def import_airplanes(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            new, changed = {}, {}
+            for row in batch:
+                airplane = Airplane(
+                    name=row["name"],
+                    rows=int(row["rows"]),
+                    seats_in_rows=int(row["seats_in_rows"]),
+                    airplane_type_id=self._lookup(
+                        self.airplane_types, row["airplane_type"], "airplane type"
+                    ),
+                )
+                if row["name"] in self.airplanes:
+                    if self.upsert:
+                        airplane.pk = self.airplanes[row["name"]][0]
+                        changed[row["name"]] = airplane
+                elif row["name"] not in new:
+                    new[row["name"]] = airplane
+            resized = [
+                airplane.pk for name, airplane in changed.items()
+                if airplane.rows * airplane.seats_in_rows != self.airplanes[name][1]
+            ]
+            with transaction.atomic():
+                Airplane.objects.bulk_create(new.values())
+                Airplane.objects.bulk_update(
+                    changed.values(), ["rows", "seats_in_rows", "airplane_type"]
+                )
+                # bulk_update skips the signal that keeps Flight.capacity in sync
+                Flight.objects.filter(airplane_id__in=resized).update(
+                    capacity=Subquery(
+                        Airplane.objects.filter(pk=OuterRef("airplane_id"))
+                        .annotate(capacity=F("rows") * F("seats_in_rows"))
+                        .values("capacity")[:1]
+                    )
+                )
+            for name, airplane in {**new, **changed}.items():
+                self.airplanes[name] = (airplane.pk, airplane.rows * airplane.seats_in_rows)
+            self._count(
+                "airplanes",
+                created=len(new),
+                updated=len(changed),
+                skipped=len(batch) - len(new) - len(changed),
+            )
+
+    def import_routes(self, rows):
+        """
+        The distance of a route between airports with coordinates is
+        computed, the one in the row is only used for the other routes.
+        """
+        for batch in _batches(rows, self.batch_size):
+            new, changed = {}, {}
+            for row in batch:
+                key = (
+                    self._lookup(self.airports, row["source"], "airport"),
+                    self._lookup(self.airports, row["destination"], "airport"),
+                )
+                distance = row.get("distance")
+                route = Route(
+                    source_id=key[0],
+                    destination_id=key[1],
+                    distance=0 if distance in (None, "") else int(distance),
+                )
+                if key in self.routes:
+                    if self.upsert:
+                        route.pk = self.routes[key]
+                        changed[key] = route
+                elif key not in new:
+                    new[key] = route
+            with transaction.atomic():
+                Route.objects.bulk_create(new.values())
+                Route.objects.bulk_update(changed.values(), ["distance"])
+                imported = [route.pk for route in (*new.values(), *changed.values())]
+                recompute_route_distances(Route.objects.filter(pk__in=imported))
+            self.routes.update((key, route.pk) for key, route in new.items())
+            self._count(
+                "routes",
+                created=len(new),
+                updated=len(changed),
+                skipped=len(batch) - len(new) - len(changed),
+            )
+
+    def _existing_flights(self):
+        if self._flights is None:
+            self._flights = {
+                (route_id, airplane_id, departure_time): flight_id
+                for flight_id, route_id, airplane_id, departure_time in Flight.objects.values_list(
+                    "id", "route_id", "airplane_id", "departure_time"
+                ).iterator(chunk_size=self.batch_size)
+            }
+        return self._flights
+
+    def import_flights(self, rows):
+        """
+        Flights are always inserted, unless upsert is on: then a flight with
+        the same route, airplane and departure time gets its arrival updated.
+        A batch with a flight overlapping another one of its airplane or crew
+        is rejected by the database and stops the import.
+        """
+        existing = self._existing_flights() if self.upsert else {}
+        for batch in _batches(rows, self.batch_size):
+            new, changed = [], []
+            for row in batch:
+                route_id = self._lookup(
+                    self.routes,
+                    (
+                        self._lookup(self.airports, row["source"], "airport"),
+                        self._lookup(self.airports, row["destination"], "airport"),
+                    ),
+                    "route",
+                )
+                airplane_id, capacity = self._lookup(self.airplanes, row["airplane"], "airplane")
+                flight = Flight(
+                    route_id=route_id,
+                    airplane_id=airplane_id,
+                    departure_time=self._datetime(row["departure_time"]),
+                    arrival_time=self._datetime(row["arrival_time"]),
+                    capacity=capacity,
+                )
+                # Set by Flight.save(), which bulk writes skip
+                flight.available_at = flight.arrival_time + TURNAROUND
+                key = (route_id, airplane_id, flight.departure_time)
+                if key in existing:
+                    flight.pk = existing[key]
+                    changed.append(flight)
+                else:
+                    new.append(flight)
+            try:
+                with transaction.atomic():
+                    Flight.objects.bulk_create(new)
+                    Flight.objects.bulk_update(changed, ["arrival_time", "available_at"])
+                    sync_crew_assignments([flight.pk for flight in changed])
+            except IntegrityError as exc:
+                if not any(name in str(exc) for name in OVERLAP_CONSTRAINTS):
+                    raise
+                raise CommandError(f"A flight overlaps another flight of its airplane or crew: {exc}")
+            if self.upsert:
+                existing.update(
+                    ((flight.route_id, flight.airplane_id, flight.departure_time), flight.pk)
+                    for flight in new
+                )
+            self._count("flights", created=len(new), updated=len(changed))
+
+    def finish(self):
+        """Bulk writes skip model signals, so drop the derived caches and indexes explicitly."""
+        for namespace in CACHE_NAMESPACES:
+            invalidate_namespace(namespace)
+        connection_index.invalidate()
+        autocomplete_index.invalidate()
+        nearby_index.invalidate()
+
+
+class Command(BaseCommand):
+    help = "Imports countries, cities, airports, routes, airplanes and flights from CSV or JSON files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files",
+            nargs="+",
+            help="JSON files with a list per entity kind ("
+                 + ", ".join(KINDS)
+                 + "), or CSV files named after the kind they contain (e.g. airports.csv)",
+        )
+        parser.add_argument("--kind", choices=KINDS, help="Entity kind of CSV files with other names")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update airplanes, route distances and flight arrivals that already exist",
+        )
+
+    def _sources(self, paths, kind):
+        """Yield (kind, rows) in dependency order across all files."""
+        sources = []
+        for path in map(Path, paths):
+            if not path.exists():
+                raise CommandError(f"File not found: {path}")
+            if path.suffix.lower() == ".json":
+                with path.open(encoding="utf-8") as file:
+                    data = json.load(file)
+                unknown = set(data) - set(KINDS)
+                if unknown:
+                    raise CommandError(f"Unknown entity kinds in {path}: {', '.join(sorted(unknown))}")
+                sources.extend((name, data[name]) for name in KINDS if name in data)
+            else:
+                csv_kind = kind or path.stem
+                if csv_kind not in KINDS:
+                    raise CommandError(f"Cannot tell the entity kind of {path}, use --kind")
+                sources.append((csv_kind, path))
+
+        for name, rows in sorted(sources, key=lambda source: KINDS.index(source[0])):
+            if isinstance(rows, Path):
+                with rows.open(newline="", encoding="utf-8") as file:
+                    yield name, csv.DictReader(file)
+            else:
+                yield name, rows
+
+    def handle(self, *args, **options):
+        importer = ScheduleImporter(batch_size=options["batch_size"], upsert=options["upsert"])
+        started = time.perf_counter()
+        timings = {}
+
+        for kind, rows in self._sources(options["files"], options["kind"]):
+            kind_started = time.perf_counter()
+            getattr(importer, f"import_{kind}")(rows)
+            timings[kind] = timings.get(kind, 0) + time.perf_counter() - kind_started
+
+        importer.finish()
+        total = time.perf_counter() - started
+
+        self.stdout.write(f"{'kind':<16}{'created':>10}{'updated':>10}{'skipped':>10}{'rows/s':>12}")
+        for kind in KINDS:
+            if kind not in importer.stats:
+                continue
+            stats = importer.stats[kind]
+            rows = stats["created"] + stats["updated"] + stats["skipped"]
+            elapsed = timings.get(kind, 0)
+            rate = f"{rows / elapsed:.0f}" if elapsed else "-"
+            self.stdout.write(
+                f"{kind:<16}{stats['created']:>10}{stats['updated']:>10}{stats['skipped']:>10}{rate:>12}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Import finished in {total:.2f}s"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from airport.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Deletes expired order idempotency keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Done: {deleted} expired idempotency keys deleted."))
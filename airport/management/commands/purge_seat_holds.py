@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from airport.holds import purge_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Deletes expired seat holds of all flights"
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Done: {deleted} expired seat holds deleted."))
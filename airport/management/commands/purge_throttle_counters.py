@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from airport.throttling import purge_expired_counters
+
+
+class Command(BaseCommand):
+    help = "Deletes expired request throttle counters kept in the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_counters(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Done: {deleted} expired throttle counters deleted."))
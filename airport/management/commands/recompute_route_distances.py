@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from airport.geo import recompute_route_distances
+from airport.models import Route
+
+
+class Command(BaseCommand):
+    help = "Recomputes Route.distance from airport coordinates where both airports have them"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = recompute_route_distances(Route.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Done: {updated} route distances recomputed."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from airport.models import Flight, Ticket
+
+
+class Command(BaseCommand):
+    help = "Recomputes Flight.capacity and Flight.seats_sold from airplanes and tickets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        checked = fixed = 0
+
+        while True:
+            with transaction.atomic():
+                flights = list(
+                    Flight.objects.select_for_update(of=("self",))
+                    .select_related("airplane")
+                    .filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .only("id", "capacity", "seats_sold", "airplane__rows", "airplane__seats_in_rows")
+                    [:chunk_size]
+                )
+                if not flights:
+                    break
+
+                sold = dict(
+                    Ticket.objects.filter(flight_id__in=[flight.pk for flight in flights])
+                    .order_by()
+                    .values_list("flight_id")
+                    .annotate(count=Count("id"))
+                )
+                changed = []
+                for flight in flights:
+                    capacity = flight.airplane.rows * flight.airplane.seats_in_rows
+                    seats_sold = sold.get(flight.pk, 0)
+                    if (flight.capacity, flight.seats_sold) != (capacity, seats_sold):
+                        flight.capacity, flight.seats_sold = capacity, seats_sold
+                        changed.append(flight)
+                Flight.objects.bulk_update(changed, ["capacity", "seats_sold"])
+
+            checked += len(flights)
+            fixed += len(changed)
+            last_id = flights[-1].pk
+            self.stdout.write(f"Checked {checked} flights, fixed {fixed}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {fixed} of {checked} flights reconciled."))
@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from airport.jobs import JOB_BATCH_SIZE, run_batch
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs until stopped; start several for more throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", default="default")
+        parser.add_argument("--batch-size", type=int, default=JOB_BATCH_SIZE)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling again when the queue is empty",
+        )
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        if not options["once"]:
+            signal.signal(signal.SIGTERM, self._stop)
+            signal.signal(signal.SIGINT, self._stop)
+
+        claimed_total = succeeded_total = 0
+        while not self.stopping:
+            if not connection.in_atomic_block:
+                # Not when called inside a transaction, e.g. from a test
+                close_old_connections()
+            claimed, succeeded = run_batch(options["queue"], options["batch_size"])
+            claimed_total += claimed
+            succeeded_total += succeeded
+            if claimed and options["verbosity"] > 1:
+                self.stdout.write(f"Ran {claimed} jobs, {claimed - succeeded} failed")
+            if claimed < options["batch_size"]:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {succeeded_total} of {claimed_total} jobs succeeded."
+        ))
+
+    def _stop(self, signum, frame):
+        # Finish the current batch, then exit
+        self.stopping = True
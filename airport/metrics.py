@@ -0,0 +1,161 @@
+"""
+Prometheus metrics of the API.
+
+With several app workers, set PROMETHEUS_MULTIPROC_DIR to a directory
+shared by the workers and emptied on deploy. Every process then writes
+its samples there and /metrics aggregates them across all workers.
+Cache and database gauges are read from the shared cache and from the
+database at scrape time, so they are global already.
+"""
+import os
+
+from django.db import DatabaseError, connection
+from django.db.models import Count
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from airport.caching import cache_stats
+from airport.models import DeadJob, Job
+
+
+REQUEST_LATENCY = Histogram(
+    "airport_http_request_duration_seconds",
+    "Request latency by route name, method and status",
+    ["route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "airport_http_requests_in_flight",
+    "Requests being handled",
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Counter(
+    "airport_db_queries_total",
+    "SQL queries run while handling requests",
+    ["route"],
+)
+BOOKINGS = Counter(
+    "airport_bookings_total",
+    "Order creation attempts by outcome",
+    ["outcome"],
+)
+
+EXPORT_ROWS = Counter(
+    "airport_export_rows_total",
+    "Rows streamed by the export endpoints",
+    ["export"],
+)
+EXPORT_DURATION = Histogram(
+    "airport_export_duration_seconds",
+    "Time to stream a whole export, rows/s is the rate of the rows over this sum",
+    ["export"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+BOOKING_SUCCESS = "success"
+BOOKING_SEAT_CONFLICT = "seat_conflict"
+BOOKING_VALIDATION_ERROR = "validation_error"
+
+
+class CacheCollector:
+    """API response cache hits, misses and hit ratio per namespace."""
+
+    def collect(self):
+        requests = CounterMetricFamily(
+            "airport_api_cache_requests",
+            "API response cache lookups by namespace and outcome",
+            labels=["namespace", "outcome"],
+        )
+        ratio = GaugeMetricFamily(
+            "airport_api_cache_hit_ratio",
+            "Share of API response cache lookups that were hits",
+            labels=["namespace"],
+        )
+        for namespace, stats in cache_stats().items():
+            requests.add_metric([namespace, "hit"], stats["hits"])
+            requests.add_metric([namespace, "miss"], stats["misses"])
+            if stats["hit_ratio"] is not None:
+                ratio.add_metric([namespace], stats["hit_ratio"])
+        yield requests
+        yield ratio
+
+
+class DatabaseCollector:
+    """Server-side connections of the application database by state (PostgreSQL only)."""
+
+    def collect(self):
+        if connection.vendor != "postgresql":
+            return
+        connections = GaugeMetricFamily(
+            "airport_db_connections",
+            "Connections to the application database by state",
+            labels=["state"],
+        )
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT coalesce(state, 'unknown'), count(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() GROUP BY 1"
+                )
+                for state, count in cursor.fetchall():
+                    connections.add_metric([state], count)
+        except DatabaseError:
+            return
+        yield connections
+
+
+class JobQueueCollector:
+    """Queued and dead background jobs per queue."""
+
+    def collect(self):
+        queued = GaugeMetricFamily(
+            "airport_jobs_queued",
+            "Background jobs waiting or running, by queue",
+            labels=["queue"],
+        )
+        dead = GaugeMetricFamily(
+            "airport_jobs_dead",
+            "Background jobs that exhausted their attempts, by queue",
+            labels=["queue"],
+        )
+        try:
+            for family, model in ((queued, Job), (dead, DeadJob)):
+                for queue, count in model.objects.values_list("queue").annotate(Count("id")).order_by():
+                    family.add_metric([queue], count)
+        except DatabaseError:
+            return
+        yield queued
+        yield dead
+
+
+class DefaultRegistryCollector:
+    """Samples of this process' default registry."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def _registry():
+    registry = CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(DefaultRegistryCollector())
+    registry.register(CacheCollector())
+    registry.register(DatabaseCollector())
+    registry.register(JobQueueCollector())
+    return registry
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
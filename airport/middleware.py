@@ -0,0 +1,168 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from airport.metrics import DB_QUERIES, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+
+
+logger = logging.getLogger("airport.performance")
+
+SLOW_REQUEST_MS = getattr(settings, "PERFORMANCE_SLOW_REQUEST_MS", 500)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Time and query counters of the request being handled."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.serializer_depth = 0
+
+    def server_timing(self, total):
+        return ", ".join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f"serialize;dur={self.serializer_time * 1000:.1f}",
+            f"render;dur={self.render_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ))
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every database connection. The request
+    metrics are found through a context variable, so queries are counted
+    even when the async ORM runs them in another thread.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def timed_serializer(func, *args, **kwargs):
+    """
+    Call a serializer method, adding its duration to the current request.
+    Nested serializers run inside their parent's call and are not counted twice.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics.serializer_depth:
+        return func(*args, **kwargs)
+    metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        metrics.serializer_depth -= 1
+        metrics.serializer_time += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """Count representation and validation time in the request's Server-Timing metrics."""
+
+    def to_representation(self, instance):
+        return timed_serializer(super().to_representation, instance)
+
+    def run_validation(self, *args, **kwargs):
+        return timed_serializer(super().run_validation, *args, **kwargs)
+
+
+class PerformanceMiddleware:
+    """
+    Measure SQL queries, DB time, serializer time and rendering time of
+    each request. Results go out as one JSON log line on the
+    airport.performance logger and as Prometheus latency, in-flight and
+    query metrics. The Server-Timing header, which tells clients how the
+    request was served, is only added with DEBUG on or for staff users.
+
+    Queries run while a streaming response is consumed happen after the
+    middleware returns and are not included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with REQUESTS_IN_FLIGHT.track_inprogress():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with REQUESTS_IN_FLIGHT.track_inprogress():
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    def _finish(self, request, response, metrics, started):
+        total = time.perf_counter() - started
+        if settings.DEBUG or getattr(getattr(request, "user", None), "is_staff", False):
+            response["Server-Timing"] = metrics.server_timing(total)
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match else "unmatched"
+        REQUEST_LATENCY.labels(route, request.method, response.status_code).observe(total)
+        DB_QUERIES.labels(route).inc(metrics.queries)
+        level = logging.WARNING if total * 1000 >= SLOW_REQUEST_MS else logging.INFO
+        logger.log(level, json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_time * 1000, 2),
+            "serializer_ms": round(metrics.serializer_time * 1000, 2),
+            "render_ms": round(metrics.render_time * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered by the handler right after this hook
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:54
+
+import airport.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airplane",
+            name="image",
+            field=models.ImageField(null=True, upload_to=airport.models.movie_image_file_path),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0002_airplane_image"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(fields=["departure_time", "id"], name="flight_departure_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["user", "created_at", "id"], name="order_user_created_idx"),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:31
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_seat_counters(apps, schema_editor):
+    Airplane = apps.get_model("airport", "Airplane")
+    Flight = apps.get_model("airport", "Flight")
+    Ticket = apps.get_model("airport", "Ticket")
+
+    capacity = Airplane.objects.filter(pk=OuterRef("airplane_id")).annotate(
+        seats=F("rows") * F("seats_in_rows")
+    ).values("seats")
+    sold = Ticket.objects.filter(flight_id=OuterRef("pk")).order_by().values(
+        "flight_id"
+    ).annotate(count=Count("pk")).values("count")
+    Flight.objects.update(
+        capacity=Subquery(capacity),
+        seats_sold=Coalesce(Subquery(sold), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0003_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="capacity",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="flight",
+            name="seats_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_seat_counters, migrations.RunPython.noop),
+    ]
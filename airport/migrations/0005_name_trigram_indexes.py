@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:12
+
+from django.db import migrations
+
+
+TABLES = ("airport_airport", "airport_city", "airport_country")
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Trigram indexes back the fuzzy fallback of the autocomplete search,
+    # they only exist on PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in TABLES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_name_trgm ON {table} USING gin (name gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0004_flight_seat_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0005_name_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airport",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name="airport",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0006_airport_coordinates"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(fields=["airplane", "departure_time"], name="flight_airplane_departure_idx"),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0007_flight_airplane_departure_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(fields=["route", "departure_time"], name="flight_route_departure_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(fields=["route", "arrival_time"], name="flight_route_arrival_idx"),
+        ),
+    ]
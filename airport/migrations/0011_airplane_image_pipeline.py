@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:30
+
+import airport.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0010_job_deadjob"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="airplane",
+            name="image",
+            field=models.ImageField(null=True, upload_to=airport.models.airplane_image_file_path),
+        ),
+        migrations.AddField(
+            model_name="airplane",
+            name="image_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="airplane",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
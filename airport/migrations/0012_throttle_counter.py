@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0011_airplane_image_pipeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThrottleCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("window", models.BigIntegerField()),
+                ("previous", models.PositiveIntegerField(default=0)),
+                ("current", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:20
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_available_at(apps, schema_editor):
+    # Later turnaround changes only apply to flights saved after them
+    turnaround = timedelta(minutes=getattr(settings, "FLIGHT_TURNAROUND_MINUTES", 30))
+    Flight = apps.get_model("airport", "Flight")
+    Flight.objects.update(available_at=F("arrival_time") + turnaround)
+
+
+def fill_crew_assignments(apps, schema_editor):
+    Flight = apps.get_model("airport", "Flight")
+    CrewAssignment = apps.get_model("airport", "CrewAssignment")
+    CrewAssignment.objects.bulk_create(
+        CrewAssignment(
+            crew_id=crew_id,
+            flight_id=flight_id,
+            departure_time=departure_time,
+            available_at=available_at,
+        )
+        for flight_id, crew_id, departure_time, available_at in Flight.crew.through.objects.values_list(
+            "flight_id", "crew_id", "flight__departure_time", "flight__available_at"
+        ).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0012_throttle_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="available_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_available_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="flight",
+            name="available_at",
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.CreateModel(
+            name="CrewAssignment",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("departure_time", models.DateTimeField()),
+                ("available_at", models.DateTimeField()),
+                ("crew", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="assignments", to="airport.crew")),
+                ("flight", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="crew_assignments", to="airport.flight")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["crew", "departure_time"], name="crew_assignment_departure_idx")],
+                "unique_together": {("crew", "flight")},
+            },
+        ),
+        migrations.RunPython(fill_crew_assignments, migrations.RunPython.noop),
+    ]
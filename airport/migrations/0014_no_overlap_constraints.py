@@ -0,0 +1,75 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:25
+
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+import airport.models
+
+
+def _overlapping(model, resource):
+    return model.objects.filter(
+        Exists(
+            model.objects.filter(
+                **{resource: OuterRef(resource)},
+                departure_time__lt=OuterRef("available_at"),
+                available_at__gt=OuterRef("departure_time"),
+            ).exclude(pk=OuterRef("pk"))
+        )
+    ).order_by(resource, "departure_time")
+
+
+def check_overlaps(apps, schema_editor):
+    """Name the double-booked flights the constraints below would be refused for."""
+    Flight = apps.get_model("airport", "Flight")
+    CrewAssignment = apps.get_model("airport", "CrewAssignment")
+    problems = [
+        f"airplane {airplane_id}: flight {flight_id} departing {departure_time:%Y-%m-%d %H:%M}"
+        for flight_id, airplane_id, departure_time in _overlapping(Flight, "airplane").values_list(
+            "id", "airplane_id", "departure_time"
+        )
+    ] + [
+        f"crew member {crew_id}: flight {flight_id} departing {departure_time:%Y-%m-%d %H:%M}"
+        for flight_id, crew_id, departure_time in _overlapping(CrewAssignment, "crew").values_list(
+            "flight_id", "crew_id", "departure_time"
+        )
+    ]
+    if problems:
+        raise RuntimeError(
+            "These flights overlap another flight of the same airplane or crew member, "
+            "including the turnaround. Reschedule or reassign them and migrate again:\n"
+            + "\n".join(problems)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0013_crew_assignment"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(check_overlaps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="flight",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=[
+                    ("airplane", "="),
+                    (airport.models.TsTzRange("departure_time", "available_at"), "&&"),
+                ],
+                name="flight_airplane_no_overlap",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="crewassignment",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=[
+                    ("crew", "="),
+                    (airport.models.TsTzRange("departure_time", "available_at"), "&&"),
+                ],
+                name="crew_assignment_no_overlap",
+            ),
+        ),
+    ]
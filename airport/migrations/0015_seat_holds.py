@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:30
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0014_no_overlap_constraints"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SeatHold",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                ("flight", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="seat_holds", to="airport.flight")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="HeldSeat",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("row_number", models.IntegerField()),
+                ("seat_number", models.PositiveSmallIntegerField()),
+                ("flight", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="airport.flight")),
+                ("hold", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="seats", to="airport.seathold")),
+            ],
+            options={
+                "unique_together": {("flight", "row_number", "seat_number")},
+            },
+        ),
+    ]
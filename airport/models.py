@@ -1,9 +1,15 @@
 import os
 import uuid
+from datetime import timedelta
 
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils.text import slugify
 
+from airport.geo import route_distance, whole_km
+
 from config import settings
 
 
@@ -22,11 +28,18 @@ class AirplaneType(models.Model):
         return f"{self.name}"
 
 
-def movie_image_file_path(instance, filename):
+AIRPLANE_IMAGE_DIR = "uploads/airplanes/"
+
+
+def airplane_image_file_path(instance, filename):
     _, extension = os.path.splitext(filename)
-    filename = f"{slugify(instance.title)}-{uuid.uuid4()}{extension}"
+    filename = f"{slugify(instance.name)}-{uuid.uuid4()}{extension}"
+
+    return os.path.join(AIRPLANE_IMAGE_DIR, filename)
 
-    return os.path.join("uploads/movies/", filename)
+
+# Referenced by migration 0002
+movie_image_file_path = airplane_image_file_path
 
 
 class Airplane(models.Model):
@@ -34,7 +47,10 @@ class Airplane(models.Model):
     rows = models.IntegerField()
     seats_in_rows = models.IntegerField()
     airplane_type = models.ForeignKey(AirplaneType, on_delete=models.CASCADE)
-    image = models.ImageField(null=True, upload_to=movie_image_file_path)
+    image = models.ImageField(null=True, upload_to=airplane_image_file_path)
+    # Set by the upload pipeline (see airport.images)
+    image_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    image_variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"{self.name}"
@@ -44,10 +60,90 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="orders")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="order_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.created_at}"
 
 
+class IdempotencyKey(models.Model):
+    """A committed order request, replayed when retried with the same key."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+    def __str__(self):
+        return self.key
+
+
+class Job(models.Model):
+    """
+    A queued call of a function by dotted path with JSON keyword arguments,
+    due at run_at. Claiming a job moves run_at forward by the lease, so an
+    abandoned job becomes due again by itself.
+    """
+
+    queue = models.CharField(max_length=63, default="default")
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["queue", "run_at"], name="job_queue_run_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+
+class DeadJob(models.Model):
+    """A job that failed max_attempts times, kept for inspection and requeueing."""
+
+    queue = models.CharField(max_length=63)
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveSmallIntegerField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+
+class ThrottleCounter(models.Model):
+    """
+    Sliding window request counter of one throttle key, used when the
+    throttle store is the database. Holds the counts of the current window
+    and of the one before it.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    window = models.BigIntegerField()
+    previous = models.PositiveIntegerField(default=0)
+    current = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
 class Country(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
@@ -69,6 +165,12 @@ class City(models.Model):
 class Airport(models.Model):
     name = models.CharField(max_length=255)
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="airports")
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
 
     class Meta:
         unique_together = ("city", "name")
@@ -85,6 +187,49 @@ class Route(models.Model):
     def __str__(self):
         return f"{self.source} -> {self.destination}"
 
+    def save(self, *args, **kwargs):
+        distance = self._distance_from_coordinates()
+        if distance is not None:
+            self.distance = distance
+        super().save(*args, **kwargs)
+
+    def _distance_from_coordinates(self):
+        field = self._meta.get_field
+        if field("source").is_cached(self) and field("destination").is_cached(self):
+            return route_distance(self.source, self.destination)
+        # Only the ids are set, read both airports' coordinates in one query
+        coordinates = {
+            pk: (latitude, longitude)
+            for pk, latitude, longitude in Airport.objects.filter(
+                pk__in=(self.source_id, self.destination_id),
+                latitude__isnull=False,
+                longitude__isnull=False,
+            ).values_list("id", "latitude", "longitude")
+        }
+        if self.source_id not in coordinates or self.destination_id not in coordinates:
+            return None
+        return whole_km(*coordinates[self.source_id], *coordinates[self.destination_id])
+
+
+# Time an airplane and its crew need between two flights
+TURNAROUND = timedelta(minutes=getattr(settings, "FLIGHT_TURNAROUND_MINUTES", 30))
+
+
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+def busy_exclusion(name, resource):
+    """No two rows of one resource may be busy at the same time (PostgreSQL only)."""
+    return ExclusionConstraint(
+        name=name,
+        expressions=[
+            (resource, RangeOperators.EQUAL),
+            (TsTzRange("departure_time", "available_at"), RangeOperators.OVERLAPS),
+        ],
+    )
+
 
 class Flight(models.Model):
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="flights")
@@ -92,6 +237,80 @@ class Flight(models.Model):
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
     crew = models.ManyToManyField(Crew)
+    capacity = models.PositiveIntegerField(default=0, editable=False)
+    seats_sold = models.PositiveIntegerField(default=0, editable=False)
+    # Arrival plus the turnaround, when the airplane and crew are free again
+    available_at = models.DateTimeField(editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["departure_time", "id"], name="flight_departure_idx"),
+            models.Index(fields=["airplane", "departure_time"], name="flight_airplane_departure_idx"),
+            models.Index(fields=["route", "departure_time"], name="flight_route_departure_idx"),
+            models.Index(fields=["route", "arrival_time"], name="flight_route_arrival_idx"),
+        ]
+        constraints = [busy_exclusion("flight_airplane_no_overlap", "airplane")]
+
+    @property
+    def tickets_available(self):
+        return max(self.capacity - self.seats_sold, 0)
+
+    def save(self, *args, **kwargs):
+        self.capacity = self.airplane.rows * self.airplane.seats_in_rows
+        self.available_at = self.arrival_time + TURNAROUND
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "arrival_time" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "available_at"}
+        super().save(*args, **kwargs)
+
+
+class CrewAssignment(models.Model):
+    """
+    A crew member's flight, with the flight's busy period copied so that the
+    crew schedule can be indexed and constrained like the airplanes' (see
+    airport.scheduling). Kept in step with Flight.crew by signals.
+    """
+
+    crew = models.ForeignKey(Crew, on_delete=models.CASCADE, related_name="assignments")
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name="crew_assignments")
+    departure_time = models.DateTimeField()
+    available_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("crew", "flight")
+        indexes = [
+            models.Index(fields=["crew", "departure_time"], name="crew_assignment_departure_idx"),
+        ]
+        constraints = [busy_exclusion("crew_assignment_no_overlap", "crew")]
+
+    def __str__(self):
+        return f"{self.crew_id} on flight {self.flight_id}"
+
+
+class SeatHold(models.Model):
+    """Seats of a flight reserved for a user until expires_at, see airport.holds."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name="seat_holds")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class HeldSeat(models.Model):
+    hold = models.ForeignKey(SeatHold, on_delete=models.CASCADE, related_name="seats")
+    # Copied from the hold, so that a seat can only be held once per flight
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name="+")
+    row_number = models.IntegerField()
+    seat_number = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ("flight", "row_number", "seat_number")
+
+    def __str__(self):
+        return f"Seat {self.row_number}-{self.seat_number} held by {self.hold_id}"
 
 
 class Ticket(models.Model):
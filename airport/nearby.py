@@ -0,0 +1,144 @@
+"""
+Nearest-airport lookups.
+
+Airports with coordinates are bucketed in a per-process grid of
+CELL_DEGREES x CELL_DEGREES cells. A query only measures the airports of
+the cells overlapping the bounding box of its radius, so its cost depends
+on how many airports are near the point, not on how many there are.
+
+The grid is built on first use, patched in place by model signals and
+rebuilt when another worker changed it (see airport.versioning).
+"""
+import math
+import threading
+
+from django.conf import settings
+
+from airport.geo import KM_PER_DEGREE, haversine_km
+from airport.models import Airport
+from airport.versioning import bump_version, get_version
+
+
+CELL_DEGREES = getattr(settings, "NEARBY_CELL_DEGREES", 1.0)
+NEARBY_RADIUS_KM = getattr(settings, "NEARBY_RADIUS_KM", 100)
+NEARBY_MAX_RADIUS_KM = 2000
+VERSION = "nearby-airports"
+
+_LON_CELLS = math.ceil(360 / CELL_DEGREES)
+
+
+def _cell(lat, lon):
+    return math.floor(lat / CELL_DEGREES), math.floor((lon + 180) / CELL_DEGREES) % _LON_CELLS
+
+
+class AirportGrid:
+    def __init__(self, version, airports=()):
+        self.version = version
+        self.cells = {}
+        self.positions = {}
+        for pk, lat, lon in airports:
+            self.add(pk, lat, lon)
+
+    def add(self, pk, lat, lon):
+        self.remove(pk)
+        if lat is None or lon is None:
+            return
+        self.positions[pk] = (lat, lon)
+        self.cells.setdefault(_cell(lat, lon), []).append(pk)
+
+    def remove(self, pk):
+        position = self.positions.pop(pk, None)
+        if position is None:
+            return
+        cell = _cell(*position)
+        self.cells[cell].remove(pk)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def _candidate_cells(self, lat, lon, radius_km):
+        lat_delta = radius_km / KM_PER_DEGREE
+        low_row, _ = _cell(max(lat - lat_delta, -90), lon)
+        high_row, _ = _cell(min(lat + lat_delta, 90), lon)
+
+        # Meridians converge towards the poles: widen the longitude span
+        # for the row of the box furthest from the equator
+        widest = min(abs(lat) + lat_delta, 90)
+        if widest >= 89.9:
+            columns = range(_LON_CELLS)
+        else:
+            lon_delta = lat_delta / math.cos(math.radians(widest))
+            if lon_delta >= 180:
+                columns = range(_LON_CELLS)
+            else:
+                _, first = _cell(lat, lon - lon_delta)
+                count = math.ceil(2 * lon_delta / CELL_DEGREES) + 1
+                columns = [(first + offset) % _LON_CELLS for offset in range(min(count, _LON_CELLS))]
+
+        for row in range(low_row, high_row + 1):
+            for column in columns:
+                yield row, column
+
+    def nearby(self, lat, lon, radius_km, limit):
+        """(airport id, distance in km) pairs within the radius, nearest first."""
+        found = []
+        for cell in self._candidate_cells(lat, lon, radius_km):
+            for pk in self.cells.get(cell, ()):
+                distance = haversine_km(lat, lon, *self.positions[pk])
+                if distance <= radius_km:
+                    found.append((distance, pk))
+        found.sort()
+        return [(pk, distance) for distance, pk in found[:limit]]
+
+
+class NearbyIndex:
+    """Per-process airport grid, shared by all requests of the worker."""
+
+    def __init__(self):
+        self._grid = None
+        self._lock = threading.Lock()
+
+    def _load(self, version):
+        airports = Airport.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).values_list("id", "latitude", "longitude")
+        return AirportGrid(version, airports)
+
+    def grid(self):
+        version = get_version(VERSION)
+        with self._lock:
+            if self._grid is not None and self._grid.version == version:
+                return self._grid
+        grid = self._load(version)
+        with self._lock:
+            self._grid = grid
+        return grid
+
+    def nearby(self, lat, lon, radius_km, limit):
+        return self.grid().nearby(lat, lon, radius_km, limit)
+
+    def _patch(self, change):
+        """Apply a local change to the loaded grid and publish a new version."""
+        new_version = bump_version(VERSION)
+        with self._lock:
+            if self._grid is None:
+                return
+            if self._grid.version == new_version - 1:
+                change(self._grid)
+                self._grid.version = new_version
+            else:
+                # Another worker moved airports in between, reload on next read
+                self._grid = None
+
+    def saved(self, airport):
+        self._patch(lambda grid: grid.add(airport.pk, airport.latitude, airport.longitude))
+
+    def deleted(self, pk):
+        self._patch(lambda grid: grid.remove(pk))
+
+    def invalidate(self):
+        bump_version(VERSION)
+        with self._lock:
+            self._grid = None
+
+
+nearby_index = NearbyIndex()
@@ -0,0 +1,214 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(position, reverse=False):
+    payload = {"p": [_encode_value(value) for value in position]}
+    if reverse:
+        payload["r"] = 1
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(encoded, model, ordering):
+    """
+    Decode a cursor into (position, reverse), converting every value with
+    the model field it was taken from. Raises ValueError on a bad cursor.
+    """
+    try:
+        padded = encoded + "=" * (-len(encoded) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["p"]
+        reverse = bool(payload.get("r", False))
+    except (TypeError, KeyError, ValueError, binascii.Error):
+        raise ValueError("Malformed cursor.")
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError("Cursor does not match the ordering.")
+
+    position = []
+    for name, value in zip(ordering, values):
+        field = model._meta.get_field(name.lstrip("-"))
+        try:
+            position.append(field.to_python(value))
+        except ValidationError:
+            raise ValueError("Malformed cursor value.")
+    return position, reverse
+
+
+def keyset_filter(ordering, position, reverse=False):
+    """
+    Build the lexicographic "after position" condition for the ordering,
+    e.g. for ("departure_time", "id"):
+    departure_time > t OR (departure_time = t AND id > i).
+    The redundant bound on the leading key lets the database start an
+    index range scan right at the cursor instead of skipping rows.
+    """
+    lookups = []
+    for name in ordering:
+        descending = name.startswith("-")
+        lookups.append((name.lstrip("-"), "lt" if descending != reverse else "gt"))
+
+    conditions = []
+    for index, (name, lookup) in enumerate(lookups):
+        equal = {prefix: value for (prefix, _), value in zip(lookups[:index], position)}
+        conditions.append(Q(**equal, **{f"{name}__{lookup}": position[index]}))
+
+    leading_name, leading_lookup = lookups[0]
+    leading = Q(**{f"{leading_name}__{leading_lookup}e": position[0]})
+    return leading & reduce(or_, conditions)
+
+
+def get_position(item, ordering):
+    names = [name.lstrip("-") for name in ordering]
+    if isinstance(item, dict):
+        return [item[name] for name in names]
+    return [getattr(item, name) for name in names]
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a stable, unique ordering. Every page is a
+    single index range query bounded by the last seen key, so deep pages
+    cost the same as the first one and no OFFSET is ever used.
+    """
+
+    ordering = ("id",)
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def _page_queryset(self, queryset, request):
+        """Return the queryset of the requested page plus one row, and the cursor it is at."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.current_page_size = self.get_page_size(request)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, reverse = None, False
+        if encoded:
+            try:
+                position, reverse = decode_cursor(encoded, queryset.model, self.ordering)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position, reverse))
+        return queryset[:self.current_page_size + 1], position, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, position, reverse = self._page_queryset(queryset, request)
+        return self._set_page(list(queryset), position, reverse)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views, the page is fetched with the async ORM."""
+        queryset, position, reverse = self._page_queryset(queryset, request)
+        return self._set_page([item async for item in queryset], position, reverse)
+
+    def _set_page(self, results, position, reverse):
+        has_more = len(results) > self.current_page_size
+        results = results[:self.current_page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def _get_link(self, position, reverse):
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encode_cursor(position, reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._get_link(get_position(self.page[-1], self.ordering), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._get_link(get_position(self.page[0], self.ordering), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Number of results per page (max {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class FlightPagination(KeysetPagination):
+    ordering = ("departure_time", "id")
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,179 @@
+"""
+Lean readers for list actions.
+
+A reader fetches exactly the columns a list response needs with
+values()/values_list() and builds the response dicts directly, without
+model instances or serializer field machinery. Each reader's output is
+identical to the serializer it stands in for; the parity tests compare
+both on the same rows.
+"""
+from abc import ABC, abstractmethod
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from airport.models import Flight, Ticket
+from airport.shaping import response_shape
+
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+def flight_label(flight_id):
+    # Flight defines no __str__, so StringRelatedField renders Django's default
+    return f"Flight object ({flight_id})"
+
+
+class LeanReader(ABC):
+    fields = ()
+
+    def get_queryset(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).values(*self.fields)
+
+    @abstractmethod
+    def to_representation(self, rows):
+        """Build the response dicts of the rows returned by get_queryset()."""
+
+
+class FlightReader(LeanReader):
+    """Same output as FlightSerializer."""
+
+    fields = (
+        "id",
+        "route_id",
+        "airplane__name",
+        "departure_time",
+        "arrival_time",
+        "capacity",
+        "seats_sold",
+    )
+
+    def to_representation(self, rows):
+        crew = {row["id"]: [] for row in rows}
+        names = (
+            Flight.crew.through.objects.filter(flight_id__in=crew)
+            .order_by("crew_id")
+            .values_list("flight_id", "crew__first_name", "crew__last_name")
+        )
+        for flight_id, first_name, last_name in names:
+            crew[flight_id].append(f"{first_name} {last_name}")
+
+        return [
+            {
+                "id": row["id"],
+                "route": row["route_id"],
+                "airplane": row["airplane__name"],
+                "departure_time": _datetime(row["departure_time"]),
+                "arrival_time": _datetime(row["arrival_time"]),
+                "crew": crew[row["id"]],
+                "tickets_available": max(row["capacity"] - row["seats_sold"], 0),
+            }
+            for row in rows
+        ]
+
+
+class AirportReader(LeanReader):
+    """Same output as AirportSerializer."""
+
+    fields = ("id", "name", "city__name", "latitude", "longitude")
+
+    def to_representation(self, rows):
+        return [
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "city": row["city__name"],
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+            }
+            for row in rows
+        ]
+
+
+class RouteReader(LeanReader):
+    """Same output as RouteSerializer."""
+
+    fields = (
+        "id",
+        "source_id",
+        "source__name",
+        "source__city__name",
+        "source__latitude",
+        "source__longitude",
+        "destination_id",
+        "destination__name",
+        "destination__city__name",
+        "destination__latitude",
+        "destination__longitude",
+        "distance",
+    )
+
+    def to_representation(self, rows):
+        return [
+            {
+                "id": row["id"],
+                "source": {
+                    "id": row["source_id"],
+                    "name": row["source__name"],
+                    "city": row["source__city__name"],
+                    "latitude": row["source__latitude"],
+                    "longitude": row["source__longitude"],
+                },
+                "destination": {
+                    "id": row["destination_id"],
+                    "name": row["destination__name"],
+                    "city": row["destination__city__name"],
+                    "latitude": row["destination__latitude"],
+                    "longitude": row["destination__longitude"],
+                },
+                "distance": row["distance"],
+            }
+            for row in rows
+        ]
+
+
+class OrderReader(LeanReader):
+    """Same output as OrderListSerializer."""
+
+    fields = ("id", "created_at")
+
+    def to_representation(self, rows):
+        tickets = {row["id"]: [] for row in rows}
+        ticket_rows = (
+            Ticket.objects.filter(order_id__in=tickets)
+            .order_by("id")
+            .values_list("order_id", "row_number", "seat_number", "flight_id")
+        )
+        for order_id, row_number, seat_number, flight_id in ticket_rows:
+            tickets[order_id].append({
+                "row_number": row_number,
+                "seat_number": seat_number,
+                "flight": flight_label(flight_id),
+            })
+
+        return [
+            {
+                "id": row["id"],
+                "created_at": _datetime(row["created_at"]),
+                "tickets": tickets[row["id"]],
+            }
+            for row in rows
+        ]
+
+
+class LeanListMixin:
+    """
+    Serve list() through the viewset's lean_reader instead of its serializer.
+    Requests with ?fields= or ?expand= go through the serializer.
+    """
+
+    lean_reader = None
+
+    def list(self, request, *args, **kwargs):
+        if response_shape(request.query_params) is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.lean_reader.get_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.lean_reader.to_representation(list(queryset)))
+        return self.get_paginated_response(self.lean_reader.to_representation(page))
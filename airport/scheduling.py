@@ -0,0 +1,126 @@
+"""
+Double-booking checks for airplanes and crew members.
+
+A flight keeps its airplane and crew busy from departure until
+available_at, its arrival plus the turnaround (FLIGHT_TURNAROUND_MINUTES)
+stored when the flight is saved. Exclusion constraints on the flight table
+and on the crew assignments (CrewAssignment, a copy of Flight.crew with
+the busy period) reject overlapping busy periods of one resource, whoever
+writes them. Changing the turnaround setting applies to flights saved
+afterwards, the stored periods of the others stay as they are.
+
+Since flights of a resource never overlap, a new flight can only collide
+with two of them: the last flight of the resource departing before it,
+and the first one departing before it ends. Both are top-1 range lookups
+on the (airplane, departure_time) index of flights and the
+(crew, departure_time) index of crew assignments. Checking before saving
+turns a violation into a ScheduleConflict naming the colliding flights.
+
+The airplane and crew rows are locked before the lookups, so concurrent
+edits assigning the same resource run one after the other and the later
+one sees the flight of the earlier one.
+"""
+from contextlib import contextmanager
+
+from django.db import IntegrityError
+from django.db.models import OuterRef, Subquery
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from airport.models import TURNAROUND, Airplane, Crew, CrewAssignment, Flight
+
+
+OVERLAP_CONSTRAINTS = ("flight_airplane_no_overlap", "crew_assignment_no_overlap")
+
+
+class ScheduleConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The airplane or crew is already assigned to another flight at that time."
+    default_code = "schedule_conflict"
+
+    def __init__(self, conflicts):
+        super().__init__()
+        self.conflicts = conflicts
+        self.detail = {
+            "detail": self.default_detail,
+            "conflicts": [
+                {"resource": resource, "id": pk, "flight": flight_id}
+                for resource, pk, flight_id in conflicts
+            ],
+        }
+
+
+@contextmanager
+def overlap_constraints():
+    """Raise ScheduleConflict for a write rejected by the overlap constraints."""
+    try:
+        yield
+    except IntegrityError as exc:
+        if any(name in str(exc) for name in OVERLAP_CONSTRAINTS):
+            raise ScheduleConflict([]) from exc
+        raise
+
+
+def sync_crew_assignments(flight_ids):
+    """Rewrite the crew assignments of the flights from Flight.crew and their busy periods."""
+    CrewAssignment.objects.filter(flight_id__in=flight_ids).delete()
+    CrewAssignment.objects.bulk_create(
+        CrewAssignment(
+            crew_id=crew_id,
+            flight_id=flight_id,
+            departure_time=departure_time,
+            available_at=available_at,
+        )
+        for flight_id, crew_id, departure_time, available_at in Flight.crew.through.objects.filter(
+            flight_id__in=flight_ids
+        ).values_list("flight_id", "crew_id", "flight__departure_time", "flight__available_at")
+    )
+
+
+def _with_colliding_flights(resources, schedule, flight_field, departure, arrival):
+    """
+    Annotate each locked airplane or crew member with its neighbouring
+    flights in schedule, rows with departure_time and available_at and the
+    flight in flight_field.
+    """
+    previous = schedule.filter(departure_time__lt=departure).order_by("-departure_time")
+    following = schedule.filter(
+        departure_time__gte=departure, departure_time__lt=arrival + TURNAROUND
+    ).order_by("departure_time")
+    return resources.select_for_update().order_by("pk").annotate(
+        previous_id=Subquery(previous.values(flight_field)[:1]),
+        previous_available_at=Subquery(previous.values("available_at")[:1]),
+        following_id=Subquery(following.values(flight_field)[:1]),
+    ).values_list("pk", "previous_id", "previous_available_at", "following_id")
+
+
+def check_assignments(airplane_id, crew_ids, departure, arrival, exclude=None):
+    """
+    Raise ScheduleConflict if the airplane or any crew member flies another
+    flight (other than exclude) within the turnaround buffer of
+    departure-arrival. Must run inside the transaction that saves the flight.
+    """
+    conflicts = []
+    checks = [
+        (
+            "airplane",
+            Airplane.objects.filter(pk=airplane_id),
+            Flight.objects.filter(airplane=OuterRef("pk")).exclude(pk=exclude),
+            "id",
+        ),
+        (
+            "crew",
+            Crew.objects.filter(pk__in=crew_ids),
+            CrewAssignment.objects.filter(crew=OuterRef("pk")).exclude(flight_id=exclude),
+            "flight_id",
+        ),
+    ]
+    for resource, resources, schedule, flight_field in checks:
+        rows = _with_colliding_flights(resources, schedule, flight_field, departure, arrival)
+        for pk, previous_id, previous_available_at, following_id in rows:
+            if previous_id is not None and previous_available_at > departure:
+                conflicts.append((resource, pk, previous_id))
+            elif following_id is not None:
+                conflicts.append((resource, pk, following_id))
+    if conflicts:
+        raise ScheduleConflict(conflicts)
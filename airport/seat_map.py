@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from airport.models import Ticket
+
+
+SEAT_MAP_CACHE_TIMEOUT = getattr(settings, "SEAT_MAP_CACHE_TIMEOUT", 60 * 60)
+
+
+def seat_map_cache_key(flight_id):
+    return f"seat_map:{flight_id}"
+
+
+def seat_map_version_key(flight_id):
+    return f"seat_map:{flight_id}:version"
+
+
+class SeatMap:
+    """
+    Seat occupancy of a single flight packed into a bitmap,
+    one bit per seat in row-major order (1 = taken).
+    """
+
+    __slots__ = ("rows", "seats_in_rows", "bits")
+
+    def __init__(self, rows, seats_in_rows, bits=None):
+        self.rows = rows
+        self.seats_in_rows = seats_in_rows
+        size = (rows * seats_in_rows + 7) // 8
+        self.bits = bytearray(bits) if bits is not None else bytearray(size)
+
+    def _index(self, row, seat):
+        if not (1 <= row <= self.rows and 1 <= seat <= self.seats_in_rows):
+            raise ValueError(f"Seat {row}-{seat} is outside of the seat map.")
+        return (row - 1) * self.seats_in_rows + (seat - 1)
+
+    def is_taken(self, row, seat):
+        index = self._index(row, seat)
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def set_taken(self, row, seat, taken=True):
+        index = self._index(row, seat)
+        if taken:
+            self.bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(1 << (index & 7))
+
+    @property
+    def capacity(self):
+        return self.rows * self.seats_in_rows
+
+    @property
+    def taken_count(self):
+        return int.from_bytes(self.bits, "little").bit_count()
+
+    def grid(self):
+        return [
+            [self.is_taken(row, seat) for seat in range(1, self.seats_in_rows + 1)]
+            for row in range(1, self.rows + 1)
+        ]
+
+    def to_cache(self):
+        return self.rows, self.seats_in_rows, bytes(self.bits)
+
+    @classmethod
+    def from_cache(cls, value):
+        rows, seats_in_rows, bits = value
+        return cls(rows, seats_in_rows, bits)
+
+
+def build_seat_map(flight):
+    """Build the seat map of a flight from its tickets in one query."""
+    airplane = flight.airplane
+    seat_map = SeatMap(airplane.rows, airplane.seats_in_rows)
+    taken = Ticket.objects.filter(flight_id=flight.pk).values_list("row_number", "seat_number")
+    for row, seat in taken:
+        try:
+            seat_map.set_taken(row, seat)
+        except ValueError:
+            # Tickets sold before the airplane of the flight was changed
+            continue
+    return seat_map
+
+
+def _bump_version(flight_id):
+    version_key = seat_map_version_key(flight_id)
+    cache.add(version_key, 0, None)
+    return cache.incr(version_key)
+
+
+def _cached_map(cached, version, airplane):
+    if cached is None:
+        return None
+    map_version, *value = cached
+    seat_map = SeatMap.from_cache(value)
+    if map_version != version or (seat_map.rows, seat_map.seats_in_rows) != (airplane.rows, airplane.seats_in_rows):
+        return None
+    return seat_map
+
+
+def get_seat_map(flight):
+    """
+    Return the cached seat map of a flight, building it on a cache miss.
+
+    A rebuilt map is stored under the version read before the tickets
+    were, so when a booking commits in between, its update bumps the
+    version past it and the map is rebuilt on the next read.
+    """
+    key, version_key = seat_map_cache_key(flight.pk), seat_map_version_key(flight.pk)
+    cached = cache.get_many([key, version_key])
+    version = cached.get(version_key, 0)
+    seat_map = _cached_map(cached.get(key), version, flight.airplane)
+    if seat_map is None:
+        seat_map = build_seat_map(flight)
+        cache.set(key, (version, *seat_map.to_cache()), SEAT_MAP_CACHE_TIMEOUT)
+    return seat_map
+
+
+def update_seat_map(flight_id, seats, taken=True):
+    """
+    Flip the given (row, seat) pairs in the cached seat map of a flight.
+    Must run after the change is committed.
+
+    Every update bumps the version of the map and only applies to the map
+    of the version just before its own. When another update got in
+    between, the map is dropped instead and the next read rebuilds it.
+    """
+    key = seat_map_cache_key(flight_id)
+    version = _bump_version(flight_id)
+    cached = cache.get(key)
+    if cached is None:
+        return
+    map_version, *value = cached
+    if map_version != version - 1:
+        cache.delete(key)
+        return
+    seat_map = SeatMap.from_cache(value)
+    try:
+        for row, seat in seats:
+            seat_map.set_taken(row, seat, taken)
+    except ValueError:
+        cache.delete(key)
+        return
+    cache.set(key, (version, *seat_map.to_cache()), SEAT_MAP_CACHE_TIMEOUT)
+
+
+def invalidate_seat_map(flight_id):
+    # Bumping the version also discards a rebuild that is still in flight
+    _bump_version(flight_id)
+    cache.delete(seat_map_cache_key(flight_id))
@@ -3,6 +3,17 @@ from django.utils import timezone
 
 from rest_framework import serializers
 
+from .booking import SeatConflict, book_hold, book_seats
+from .geo import route_distance
+from .holds import SEAT_HOLD_MAX_MINUTES, SEAT_HOLD_MAX_SEATS, SEAT_HOLD_MINUTES, held_seats
+from .images import variant_urls
+from .metrics import (
+    BOOKING_SEAT_CONFLICT,
+    BOOKING_SUCCESS,
+    BOOKING_VALIDATION_ERROR,
+    BOOKINGS,
+)
+from .middleware import TimedSerializerMixin
 from .models import (
     Country,
     City,
@@ -15,63 +26,82 @@ from .models import (
     Ticket,
     Order,
 )
+from .scheduling import check_assignments, overlap_constraints
+from .shaping import ShapedSerializerMixin
 
 
-class CountrySerializer(serializers.ModelSerializer):
+class CountrySerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Country
         fields = ("id", "name")
 
 
-class CitySerializer(serializers.ModelSerializer):
+class CitySerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
     country = serializers.SlugRelatedField(
         slug_field="name",
         read_only=True,
     )
 
+    expandable_fields = {"country": CountrySerializer}
+
     class Meta:
         model = City
         fields = ("id", "name", "country")
 
 
-class AirportSerializer(serializers.ModelSerializer):
+class AirportSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
     city = serializers.SlugRelatedField(
         slug_field="name",
         queryset=City.objects.all(),
     )
 
+    expandable_fields = {"city": CitySerializer}
+
     class Meta:
         model = Airport
-        fields = ("id", "name", "city")
+        fields = ("id", "name", "city", "latitude", "longitude")
 
 
-class AirplaneTypeSerializer(serializers.ModelSerializer):
+class AirplaneTypeSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AirplaneType
         fields = ("id", "name")
 
 
-class AirplaneSerializer(serializers.ModelSerializer):
+class AirplaneSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
     airplane_type = serializers.SlugRelatedField(
         slug_field="name",
         queryset=AirplaneType.objects.all(),
     )
 
+    image = serializers.ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
+
+    expandable_fields = {"airplane_type": AirplaneTypeSerializer}
+    field_dependencies = {"image_variants": ("image_variants",)}
+
     class Meta:
         model = Airplane
-        fields = ("id", "name","rows", "seats_in_rows", "airplane_type")
+        fields = ("id", "name","rows", "seats_in_rows", "airplane_type", "image", "image_variants")
+
+    def get_image_variants(self, airplane) -> dict:
+        return variant_urls(airplane.image_variants, self.context.get("request"))
+
+
+class AirplaneImageSerializer(serializers.Serializer):
+    image = serializers.FileField()
 
 
-class CrewSerializer(serializers.ModelSerializer):
+class CrewSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Crew
         fields = ("id", "first_name", "last_name")
 
 
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
     source = AirportSerializer(read_only=True)
     destination = AirportSerializer(read_only=True)
 
@@ -85,15 +115,25 @@ class RouteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Route
         fields = ("id", "source", "destination", "source_id", "destination_id", "distance")
+        # Computed from the airport coordinates when both are known
+        extra_kwargs = {"distance": {"required": False}}
 
     def validate(self, data):
         if data["source"] == data["destination"]:
             raise serializers.ValidationError("Source and destination airports must be different.")
+        if (
+            self.instance is None
+            and "distance" not in data
+            and route_distance(data["source"], data["destination"]) is None
+        ):
+            raise serializers.ValidationError(
+                {"distance": "This field is required unless both airports have coordinates."}
+            )
         return data
 
 
 
-class FlightSerializer(serializers.ModelSerializer):
+class FlightSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
     route = serializers.SlugRelatedField(
         slug_field="id",
         queryset=Route.objects.all()
@@ -109,10 +149,27 @@ class FlightSerializer(serializers.ModelSerializer):
         write_only=True,
         source="crew"
     )
+    tickets_available = serializers.IntegerField(read_only=True)
+
+    expandable_fields = {
+        "route": RouteSerializer,
+        "airplane": AirplaneSerializer,
+        "crew": CrewSerializer,
+    }
+    field_dependencies = {"tickets_available": ("capacity", "seats_sold")}
 
     class Meta:
         model = Flight
-        fields = ("id", "route", "airplane", "departure_time", "arrival_time", "crew", "crew_ids")
+        fields = (
+            "id",
+            "route",
+            "airplane",
+            "departure_time",
+            "arrival_time",
+            "crew",
+            "crew_ids",
+            "tickets_available",
+        )
 
     def validate_departure_time(self, value):
         if value < timezone.now():
@@ -127,9 +184,38 @@ class FlightSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Час прильоту має бути пізніше часу вильоту.")
         return data
 
+    def _check_assignments(self, validated_data):
+        instance = self.instance
+        if instance is not None and not {
+            "airplane", "crew", "departure_time", "arrival_time"
+        } & validated_data.keys():
+            return
+        airplane = validated_data.get("airplane", getattr(instance, "airplane", None))
+        if "crew" in validated_data:
+            crew_ids = [member.pk for member in validated_data["crew"]]
+        else:
+            crew_ids = list(instance.crew.values_list("pk", flat=True))
+        check_assignments(
+            airplane.pk,
+            crew_ids,
+            validated_data.get("departure_time", getattr(instance, "departure_time", None)),
+            validated_data.get("arrival_time", getattr(instance, "arrival_time", None)),
+            exclude=getattr(instance, "pk", None),
+        )
+
+    def create(self, validated_data):
+        with overlap_constraints(), transaction.atomic():
+            self._check_assignments(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with overlap_constraints(), transaction.atomic():
+            self._check_assignments(validated_data)
+            return super().update(instance, validated_data)
+
 
 class TicketSerializer(serializers.ModelSerializer):
-    flight = serializers.PrimaryKeyRelatedField(queryset=Flight.objects.all())
+    flight = serializers.PrimaryKeyRelatedField(queryset=Flight.objects.select_related("airplane"))
 
     class Meta:
         model = Ticket
@@ -142,6 +228,8 @@ class TicketSerializer(serializers.ModelSerializer):
 
         if Ticket.objects.filter(flight=flight, row_number=row, seat_number=seat).exists():
             raise serializers.ValidationError("This seat is already booked on this flight.")
+        if (row, seat) in held_seats(flight.pk):
+            raise serializers.ValidationError("This seat is temporarily held on this flight.")
 
         airplane = flight.airplane
         if row < 1 or row > airplane.rows:
@@ -151,51 +239,79 @@ class TicketSerializer(serializers.ModelSerializer):
 
         return data
 
-class TicketListSerializer(serializers.ModelSerializer):
+class TicketListSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     flight = serializers.StringRelatedField()
 
+    expandable_fields = {"flight": FlightSerializer}
+
     class Meta:
         model = Ticket
         fields = ("row_number", "seat_number", "flight")
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    tickets = TicketSerializer(many=True, allow_empty=False)
+class OrderTicketSerializer(serializers.ModelSerializer):
+    """
+    Ticket payload of an order. Flight existence, seat ranges and
+    availability are checked for all tickets at once by the booking engine.
+    """
+
+    flight = serializers.IntegerField(source="flight_id", min_value=1)
 
     class Meta:
-        model = Order
-        fields = ("id", "created_at", "tickets")
+        model = Ticket
+        fields = ("row_number", "seat_number", "flight")
+        validators = []
 
-    def create(self, validated_data):
-        tickets_data = validated_data.pop("tickets")
-        user = self.context["request"].user
 
-        flight_ticket_pairs = set()
+class SeatSerializer(serializers.Serializer):
+    row_number = serializers.IntegerField()
+    seat_number = serializers.IntegerField()
 
-        for ticket in tickets_data:
-            flight = ticket["flight"]
-            row = ticket["row_number"]
-            seat = ticket["seat_number"]
 
-            if (flight, row, seat) in flight_ticket_pairs:
-                raise serializers.ValidationError(f"Duplicate seat {row}-{seat} for flight {flight} in request.")
-            flight_ticket_pairs.add((flight, row, seat))
+class SeatHoldSerializer(TimedSerializerMixin, serializers.Serializer):
+    id = serializers.CharField(read_only=True)
+    flight = serializers.IntegerField(source="flight_id", read_only=True)
+    seats = SeatSerializer(many=True, allow_empty=False, max_length=SEAT_HOLD_MAX_SEATS)
+    minutes = serializers.IntegerField(
+        min_value=1,
+        max_value=SEAT_HOLD_MAX_MINUTES,
+        default=SEAT_HOLD_MINUTES,
+        write_only=True,
+    )
+    expires_at = serializers.DateTimeField(read_only=True)
 
-        for flight, row, seat in flight_ticket_pairs:
-            if Ticket.objects.filter(flight=flight, row_number=row, seat_number=seat).exists():
-                raise serializers.ValidationError(f"Seat {row}-{seat} is already booked on flight {flight}.")
 
-        with transaction.atomic():
-            order = Order.objects.create(user=user, **validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    tickets = OrderTicketSerializer(many=True, allow_empty=False, required=False)
+    hold = serializers.CharField(write_only=True, required=False)
 
-        return order
+    class Meta:
+        model = Order
+        fields = ("id", "created_at", "tickets", "hold")
 
+    def validate(self, data):
+        if ("tickets" in data) == ("hold" in data):
+            raise serializers.ValidationError("Provide either tickets or a seat hold.")
+        return data
 
+    def create(self, validated_data):
+        user = self.context["request"].user
+        try:
+            if "hold" in validated_data:
+                order = book_hold(user, validated_data["hold"])
+            else:
+                order = book_seats(user, validated_data["tickets"])
+        except SeatConflict:
+            BOOKINGS.labels(BOOKING_SEAT_CONFLICT).inc()
+            raise
+        except serializers.ValidationError:
+            BOOKINGS.labels(BOOKING_VALIDATION_ERROR).inc()
+            raise
+        BOOKINGS.labels(BOOKING_SUCCESS).inc()
+        return order
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(TimedSerializerMixin, ShapedSerializerMixin, serializers.ModelSerializer):
     tickets = TicketListSerializer(many=True, read_only=True)
 
     class Meta:
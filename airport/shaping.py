@@ -0,0 +1,227 @@
+"""
+Sparse fieldsets and expansions for read responses.
+
+    ?fields=id,departure_time,route      only these fields
+    ?expand=route.source.city,airplane   nested objects instead of ids/names
+    ?fields=id,route.distance            fields of an expanded object
+
+The shaped serializer is also the source of the queryset: joins,
+prefetches and selected columns are derived from the fields that will
+actually be rendered, so a narrow request costs fewer queries and less
+I/O than the full representation.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+from rest_framework.relations import (
+    ManyRelatedField,
+    PrimaryKeyRelatedField,
+    RelatedField,
+    SlugRelatedField,
+)
+
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+MAX_PATH_DEPTH = 4
+
+SHAPE_PARAMETERS = [
+    OpenApiParameter(
+        FIELDS_PARAM,
+        OpenApiTypes.STR,
+        description="Comma separated fields to return, dotted for fields of "
+                    "nested objects (ex. ?fields=id,departure_time,route)",
+        required=False,
+    ),
+    OpenApiParameter(
+        EXPAND_PARAM,
+        OpenApiTypes.STR,
+        description="Comma separated related fields to render as nested objects "
+                    "(ex. ?expand=route.source.city,airplane)",
+        required=False,
+    ),
+]
+
+
+def _shape_error(param, message):
+    return serializers.ValidationError({param: [message]})
+
+
+def parse_paths(value, param):
+    """Parse "a.b,c" into the tree {"a": {"b": {}}, "c": {}}."""
+    tree = {}
+    for path in value.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        names = path.split(".")
+        if len(names) > MAX_PATH_DEPTH or not all(names):
+            raise _shape_error(param, f"Invalid path '{path}'.")
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+    return tree
+
+
+def response_shape(params):
+    """Serializer shape arguments requested by the query params, or None for the full shape."""
+    if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+        return None
+    fields = params.get(FIELDS_PARAM)
+    return {
+        "fields": parse_paths(fields, FIELDS_PARAM) if fields is not None else None,
+        "expand": parse_paths(params.get(EXPAND_PARAM, ""), EXPAND_PARAM),
+    }
+
+
+class ShapedSerializerMixin:
+    """
+    Accept `fields` and `expand` trees (see parse_paths) and narrow or
+    expand the representation accordingly.
+
+    `expandable_fields` maps a related field to the serializer rendering
+    it when expanded. Fields nested with a serializer already can be
+    narrowed and expanded further. `field_dependencies` lists the model
+    columns of fields that are not model fields (e.g. properties), so
+    the queryset can still be limited to the needed columns.
+    """
+
+    expandable_fields = {}
+    field_dependencies = {}
+
+    def __init__(self, *args, fields=None, expand=None, shape_path="", **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None or expand:
+            self._apply_shape(fields, expand or {}, shape_path)
+
+    def _apply_shape(self, fields, expand, path):
+        readable = [name for name, field in self.fields.items() if not field.write_only]
+        for param, tree in ((FIELDS_PARAM, fields or {}), (EXPAND_PARAM, expand)):
+            for name in tree:
+                if name not in readable:
+                    raise _shape_error(param, f"Unknown field '{path}{name}'.")
+
+        if fields is not None:
+            for name in list(self.fields):
+                if name not in fields:
+                    self.fields.pop(name)
+
+        for name in readable:
+            sub_fields = (fields or {}).get(name) or None
+            if name not in self.fields or (name not in expand and sub_fields is None):
+                continue
+            self.fields[name] = self._shaped_field(
+                name, sub_fields, expand.get(name, {}), f"{path}{name}."
+            )
+
+    def _shaped_field(self, name, fields, expand, path):
+        field = self.fields[name]
+        if isinstance(field, serializers.ListSerializer):
+            serializer_class, many = type(field.child), True
+        elif isinstance(field, serializers.BaseSerializer):
+            serializer_class, many = type(field), False
+        elif name in self.expandable_fields:
+            serializer_class = self.expandable_fields[name]
+            many = isinstance(field, ManyRelatedField)
+        else:
+            param = FIELDS_PARAM if fields else EXPAND_PARAM
+            raise _shape_error(param, f"Field '{path[:-1]}' cannot be expanded.")
+
+        kwargs = {"many": many, "read_only": True, "fields": fields, "expand": expand}
+        if field.source != name:
+            kwargs["source"] = field.source
+        return serializer_class(shape_path=path, **kwargs)
+
+
+def _collect(serializer, model, prefix, select, prefetch, only):
+    """
+    Gather the select_related and prefetch_related lookups and only()
+    columns the serializer needs. Returns False when a rendered field
+    depends on columns that cannot be determined.
+    """
+    complete = True
+    dependencies = getattr(serializer, "field_dependencies", {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            if name in dependencies:
+                only.extend(prefix + column for column in dependencies[name])
+            else:
+                complete = False
+            continue
+
+        lookup = prefix + source
+        if model_field.many_to_many or model_field.one_to_many:
+            queryset = model_field.related_model._default_manager.order_by("pk")
+            if isinstance(field, serializers.ListSerializer):
+                # Prefetched rows keep all their columns: the relation is
+                # matched on columns the child serializer does not render.
+                queryset = shape_queryset(queryset, field.child, use_only=False)
+            prefetch.append(Prefetch(lookup, queryset=queryset))
+        elif isinstance(field, serializers.BaseSerializer):
+            select.append(lookup)
+            complete &= _collect(
+                field, model_field.related_model, f"{lookup}__", select, prefetch, only
+            )
+        elif isinstance(field, PrimaryKeyRelatedField):
+            only.append(lookup)
+        elif isinstance(field, SlugRelatedField):
+            select.append(lookup)
+            only.append(f"{lookup}__{field.slug_field}")
+        elif isinstance(field, RelatedField):
+            select.append(lookup)
+            complete = False
+        else:
+            only.append(lookup)
+    return complete
+
+
+def shape_queryset(queryset, serializer, keep=(), use_only=True):
+    """
+    Replace the queryset's joins and prefetches with the ones the
+    serializer needs. Columns in `keep` (e.g. the pagination ordering)
+    are selected even when they are not rendered.
+    """
+    select, prefetch, only = [], [], list(keep)
+    complete = _collect(serializer, queryset.model, "", select, prefetch, only)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if use_only and complete:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+def ordering_columns(pagination_class):
+    return [name.lstrip("-") for name in getattr(pagination_class, "ordering", ())]
+
+
+class ShapedResponseMixin:
+    """?fields= and ?expand= for the list and retrieve actions of a viewset."""
+
+    def get_response_shape(self):
+        if self.action not in ("list", "retrieve"):
+            return None
+        return response_shape(self.request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        shape = self.get_response_shape()
+        if shape is not None:
+            kwargs.update(shape)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        shape = self.get_response_shape()
+        if shape is None:
+            return queryset
+        serializer = self.get_serializer_class()(**shape)
+        return shape_queryset(queryset, serializer, keep=ordering_columns(self.pagination_class))
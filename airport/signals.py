@@ -0,0 +1,167 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from airport.autocomplete import AIRPORT, CITY, COUNTRY, autocomplete_index
+from airport.booking import add_seats_sold
+from airport.caching import dependent_namespaces, invalidate_model
+from airport.events import publish_seats, publish_seats_changed
+from airport.geo import recompute_route_distances
+from airport.itineraries import connection_index, departure_day
+from airport.middleware import install_query_recorder
+from airport.nearby import nearby_index
+from airport.models import Airplane, Airport, City, Country, CrewAssignment, Flight, Route, Ticket
+from airport.scheduling import sync_crew_assignments
+from airport.seat_map import invalidate_seat_map, update_seat_map
+
+
+@receiver(post_save, sender=Ticket)
+def mark_seat_taken(sender, instance, created, **kwargs):
+    if created:
+        add_seats_sold([(instance.flight_id, instance.row_number, instance.seat_number)])
+        seats = [(instance.row_number, instance.seat_number)]
+        transaction.on_commit(lambda: update_seat_map(instance.flight_id, seats, taken=True))
+        transaction.on_commit(lambda: publish_seats(instance.flight_id, seats, taken=True))
+    else:
+        # The previous seat of an edited ticket is unknown here
+        transaction.on_commit(lambda: invalidate_seat_map(instance.flight_id))
+        transaction.on_commit(lambda: publish_seats_changed(instance.flight_id))
+
+
+@receiver(post_delete, sender=Ticket)
+def mark_seat_released(sender, instance, **kwargs):
+    add_seats_sold([(instance.flight_id, instance.row_number, instance.seat_number)], sign=-1)
+    seats = [(instance.row_number, instance.seat_number)]
+    transaction.on_commit(lambda: update_seat_map(instance.flight_id, seats, taken=False))
+    transaction.on_commit(lambda: publish_seats(instance.flight_id, seats, taken=False))
+
+
+@receiver(post_save, sender=Flight)
+def reset_flight_seat_map(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: invalidate_seat_map(instance.pk))
+        transaction.on_commit(lambda: publish_seats_changed(instance.pk))
+
+
+@receiver(post_save, sender=Airplane)
+def update_flight_capacity(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or {"rows", "seats_in_rows"} & update_fields):
+        Flight.objects.filter(airplane=instance).update(
+            capacity=instance.rows * instance.seats_in_rows
+        )
+
+
+@receiver(pre_save, sender=Flight)
+def remember_departure_day(sender, instance, **kwargs):
+    instance._previous_departure_day = None
+    if instance.pk:
+        previous = Flight.objects.filter(pk=instance.pk).values_list("departure_time", flat=True).first()
+        if previous is not None:
+            instance._previous_departure_day = departure_day(previous)
+
+
+@receiver(post_save, sender=Flight)
+def index_flight(sender, instance, **kwargs):
+    previous_day = getattr(instance, "_previous_departure_day", None)
+    transaction.on_commit(lambda: connection_index.flight_saved(instance, previous_day))
+
+
+@receiver(post_delete, sender=Flight)
+def unindex_flight(sender, instance, **kwargs):
+    # The instance loses its pk once the delete finishes
+    flight_id, departure_time = instance.pk, instance.departure_time
+    transaction.on_commit(lambda: connection_index.flight_deleted(flight_id, departure_time))
+
+
+@receiver(post_save, sender=Flight)
+def move_crew_assignments(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (
+        update_fields is None or {"departure_time", "available_at"} & set(update_fields)
+    ):
+        CrewAssignment.objects.filter(flight=instance).update(
+            departure_time=instance.departure_time, available_at=instance.available_at
+        )
+
+
+@receiver(m2m_changed, sender=Flight.crew.through)
+def assign_crew(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_clear":
+        CrewAssignment.objects.filter(**{"crew" if reverse else "flight": instance}).delete()
+    elif action in ("post_add", "post_remove"):
+        # From the crew side, pk_set holds the flights
+        sync_crew_assignments(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Route)
+def reindex_route(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(connection_index.invalidate)
+
+
+@receiver(pre_save, sender=Airport)
+def remember_airport_position(sender, instance, update_fields=None, **kwargs):
+    instance._position_changed = False
+    if instance.pk and (update_fields is None or {"latitude", "longitude"} & set(update_fields)):
+        previous = (
+            Airport.objects.filter(pk=instance.pk).values_list("latitude", "longitude").first()
+        )
+        instance._position_changed = previous != (instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Airport)
+def update_airport_position(sender, instance, created, **kwargs):
+    if not created:
+        if not getattr(instance, "_position_changed", True):
+            # Renamed or moved to another city, routes and the index are unaffected
+            return
+        recompute_route_distances(
+            Route.objects.filter(Q(source=instance) | Q(destination=instance))
+        )
+    transaction.on_commit(lambda: nearby_index.saved(instance))
+
+
+@receiver(post_delete, sender=Airport)
+def remove_airport_position(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: nearby_index.deleted(pk))
+
+
+AUTOCOMPLETE_KINDS = {Airport: AIRPORT, City: CITY, Country: COUNTRY}
+
+
+@receiver(post_save)
+def index_name(sender, instance, **kwargs):
+    kind = AUTOCOMPLETE_KINDS.get(sender)
+    if kind is not None:
+        transaction.on_commit(lambda: autocomplete_index.saved(kind, instance))
+
+
+@receiver(post_delete)
+def unindex_name(sender, instance, **kwargs):
+    kind = AUTOCOMPLETE_KINDS.get(sender)
+    if kind is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: autocomplete_index.deleted(kind, pk))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, **kwargs):
+    if dependent_namespaces(sender):
+        transaction.on_commit(lambda: invalidate_model(sender))
+
+
+@receiver(m2m_changed)
+def invalidate_cached_relations(sender, instance, action, model, **kwargs):
+    if not action.startswith("post_"):
+        return
+    for changed in {type(instance), model}:
+        if dependent_namespaces(changed):
+            transaction.on_commit(lambda changed=changed: invalidate_model(changed))
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
@@ -0,0 +1,40 @@
+"""
+Jobs run by the background worker after an order is booked (see airport.jobs).
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from airport.models import Order, Ticket
+
+
+def send_order_confirmation(order_id):
+    order = (
+        Order.objects.select_related("user")
+        .prefetch_related(Prefetch(
+            "tickets",
+            queryset=Ticket.objects.order_by("id").select_related(
+                "flight__route__source", "flight__route__destination"
+            ),
+        ))
+        .filter(pk=order_id)
+        .first()
+    )
+    if order is None:
+        return
+
+    lines = [f"Thank you for your order #{order.pk}.", ""]
+    for ticket in order.tickets.all():
+        flight = ticket.flight
+        departure = timezone.localtime(flight.departure_time)
+        lines.append(
+            f"{flight.route.source.name} - {flight.route.destination.name}, "
+            f"departs {departure:%Y-%m-%d %H:%M}, row {ticket.row_number}, seat {ticket.seat_number}"
+        )
+    send_mail(
+        subject=f"Order #{order.pk} confirmed",
+        message="\n".join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[order.user.email],
+    )
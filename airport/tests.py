@@ -1,5 +1,50 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from io import BytesIO, StringIO
+from itertools import count
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from airport.events import SUBSCRIBER_QUEUE_SIZE, LocalBroker, broker, flight_channel
+from airport.booking import book_seats
+from airport.holds import SEAT_HOLDS_PER_USER, get_hold, held_seats
+from airport.itineraries import connection_index
+from airport.scheduling import ScheduleConflict, overlap_constraints
+from airport.jobs import RETRY_BASE_SECONDS, claim_jobs, enqueue, requeue_dead_jobs, run_batch
+from airport.seat_map import SeatMap, build_seat_map, get_seat_map, update_seat_map
+from airport.tasks import send_order_confirmation
+from airport.throttling import (
+    CacheStore,
+    ScopedSlidingWindowThrottle,
+    UserSlidingWindowThrottle,
+)
+from airport.views import AirportViewSet, FlightViewSet, OrderViewSet, RouteViewSet
 from airport.serializers import (
+    AirportSerializer,
+    OrderListSerializer,
     RouteSerializer,
     TicketSerializer,
     FlightSerializer,
@@ -15,13 +60,48 @@ from airport.models import (
     City,
     Country,
     Crew,
+    CrewAssignment,
     Ticket,
     Order,
+    IdempotencyKey,
+    Job,
+    DeadJob,
+    ThrottleCounter,
+    SeatHold,
+    HeldSeat,
 )
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+
+def sample_city(name="Kyiv"):
+    country, _ = Country.objects.get_or_create(name="Ukraine")
+    city, _ = City.objects.get_or_create(name=name, country=country)
+    return city
+
+
+def sample_airport(name, city=None, **params):
+    return Airport.objects.create(name=name, city=city or sample_city(), **params)
+
+
+def setUpModule():
+    # Count throttled requests in the cache, which the tests clear, so that
+    # the query counts asserted below only cover the endpoints themselves
+    throttle_store = override_settings(THROTTLE_STORE="airport.throttling.CacheStore")
+    throttle_store.enable()
+    unittest.addModuleCleanup(throttle_store.disable)
+    # Keep the per-request log lines out of the test output; without any
+    # handler the slow request warnings would still reach logging.lastResort
+    request_logger = logging.getLogger("airport.performance")
+    for request_log in (
+        mock.patch.object(request_logger, "handlers", [logging.NullHandler()]),
+        mock.patch.object(request_logger, "propagate", False),
+    ):
+        request_log.start()
+        unittest.addModuleCleanup(request_log.stop)
+
+
 class RouteSerializerTest(TestCase):
     def setUp(self):
         self.country = Country.objects.create(name="Ukraine")
@@ -200,3 +280,1933 @@ class OrderSerializerTest(TestCase):
             departure_time=timezone.now() + timedelta(days=1),
             arrival_time=timezone.now() + timedelta(days=1, hours=2)
         )
+
+
+class SeatMapTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="testuser@example.com", password="12345")
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        airport1 = Airport.objects.create(name="Boryspil", city=city)
+        airport2 = Airport.objects.create(name="Zhuliany", city=city)
+        route = Route.objects.create(source=airport1, destination=airport2, distance=300)
+        airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        airplane = Airplane.objects.create(
+            name="Boeing 737-800", rows=3, seats_in_rows=4, airplane_type=airplane_type
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=2),
+        )
+        self.order = Order.objects.create(user=self.user)
+        self.url = reverse("airport:flight-seats", args=[self.flight.pk])
+
+    def test_seat_map_bits(self):
+        seat_map = SeatMap(3, 4)
+        seat_map.set_taken(1, 1)
+        seat_map.set_taken(3, 4)
+        self.assertTrue(seat_map.is_taken(1, 1))
+        self.assertTrue(seat_map.is_taken(3, 4))
+        self.assertFalse(seat_map.is_taken(2, 2))
+        self.assertEqual(seat_map.taken_count, 2)
+        self.assertEqual(len(seat_map.bits), 2)
+        with self.assertRaises(ValueError):
+            seat_map.set_taken(4, 1)
+
+    def test_seat_map_endpoint(self):
+        Ticket.objects.create(flight=self.flight, row_number=2, seat_number=3, order=self.order)
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["rows"], 3)
+        self.assertEqual(res.data["seats_in_rows"], 4)
+        self.assertEqual(res.data["seats_taken"], 1)
+        self.assertEqual(res.data["seats_available"], 11)
+        self.assertTrue(res.data["seats"][1][2])
+        self.assertFalse(res.data["seats"][0][0])
+
+    def test_booking_and_cancellation_update_cached_map(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = Ticket.objects.create(
+                flight=self.flight, row_number=1, seat_number=1, order=self.order
+            )
+        # Only the flight and its live holds, the ticket table is not scanned again
+        with self.assertNumQueries(2):
+            res = self.client.get(self.url)
+        self.assertTrue(res.data["seats"][0][0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.delete()
+        with self.assertNumQueries(2):
+            res = self.client.get(self.url)
+        self.assertFalse(res.data["seats"][0][0])
+        self.assertEqual(res.data["seats_taken"], 0)
+
+    def test_concurrent_updates_keep_each_others_seats(self):
+        self.client.get(self.url)
+        barrier = threading.Barrier(4)
+
+        def book(row):
+            barrier.wait()
+            update_seat_map(self.flight.pk, [(row, seat) for seat in range(1, 5)])
+
+        # The tickets are committed before their updates run
+        for row in (1, 2, 3):
+            for seat in range(1, 5):
+                Ticket.objects.create(flight=self.flight, row_number=row, seat_number=seat, order=self.order)
+        threads = [threading.Thread(target=book, args=(row,)) for row in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(get_seat_map(self.flight).taken_count, 12)
+
+    def test_rebuild_racing_a_booking_is_discarded(self):
+        def build_then_book(flight):
+            seat_map = build_seat_map(flight)
+            with self.captureOnCommitCallbacks(execute=True):
+                Ticket.objects.create(flight=self.flight, row_number=1, seat_number=1, order=self.order)
+            return seat_map
+
+        with mock.patch("airport.seat_map.build_seat_map", side_effect=build_then_book):
+            self.assertEqual(get_seat_map(self.flight).taken_count, 0)
+        self.assertEqual(self.client.get(self.url).data["seats_taken"], 1)
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="testuser@example.com", password="12345")
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        airport1 = Airport.objects.create(name="Boryspil", city=city)
+        airport2 = Airport.objects.create(name="Zhuliany", city=city)
+        route = Route.objects.create(source=airport1, destination=airport2, distance=300)
+        airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        airplanes = [
+            Airplane.objects.create(
+                name=f"Boeing 737-800 #{index}", rows=30, seats_in_rows=6, airplane_type=airplane_type
+            )
+            for index in range(2)
+        ]
+        departure = timezone.now() + timedelta(days=1)
+        # Two flights share every departure time to exercise the tie-breaker
+        self.flights = [
+            Flight.objects.create(
+                route=route,
+                airplane=airplanes[index % 2],
+                departure_time=departure + timedelta(hours=3 * (index // 2)),
+                arrival_time=departure + timedelta(hours=3 * (index // 2) + 2),
+            )
+            for index in range(7)
+        ]
+        self.url = reverse("airport:flight-list")
+
+    def test_walk_forward_and_back(self):
+        seen = []
+        url = f"{self.url}?page_size=2"
+        pages = []
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data)
+            seen.extend(flight["id"] for flight in res.data["results"])
+            url = res.data["next"]
+
+        self.assertEqual(seen, [flight.id for flight in self.flights])
+        self.assertEqual(len(pages), 4)
+        self.assertIsNone(pages[0]["previous"])
+
+        res = self.client.get(pages[2]["previous"])
+        self.assertEqual(
+            [flight["id"] for flight in res.data["results"]],
+            [flight["id"] for flight in pages[1]["results"]],
+        )
+
+    def test_deep_page_does_not_use_offset(self):
+        res = self.client.get(f"{self.url}?page_size=3")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(res.data["next"])
+        self.assertFalse(any("OFFSET" in query["sql"].upper() for query in queries))
+
+    def test_invalid_cursor(self):
+        res = self.client.get(f"{self.url}?cursor=not-a-cursor")
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="testuser@example.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        airport1 = Airport.objects.create(name="Boryspil", city=city)
+        airport2 = Airport.objects.create(name="Zhuliany", city=city)
+        route = Route.objects.create(source=airport1, destination=airport2, distance=300)
+        airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        airplane = Airplane.objects.create(
+            name="Boeing 737-800", rows=30, seats_in_rows=6, airplane_type=airplane_type
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=2),
+        )
+        self.url = reverse("airport:order-list")
+
+    def _tickets(self, seats):
+        return [
+            {"flight": self.flight.pk, "row_number": row, "seat_number": seat}
+            for row, seat in seats
+        ]
+
+    def test_book_group_order(self):
+        seats = [(1, seat) for seat in range(1, 7)] + [(2, 1), (2, 2), (2, 3)]
+        res = self.client.post(self.url, {"tickets": self._tickets(seats)}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["tickets"]), 9)
+        self.assertEqual(Ticket.objects.filter(flight=self.flight).count(), 9)
+
+    def test_query_count_does_not_grow_with_seats(self):
+        with CaptureQueriesContext(connection) as single:
+            self.client.post(self.url, {"tickets": self._tickets([(1, 1)])}, format="json")
+        seats = [(3, seat) for seat in range(1, 7)] + [(4, 1), (4, 2), (4, 3)]
+        with CaptureQueriesContext(connection) as group:
+            self.client.post(self.url, {"tickets": self._tickets(seats)}, format="json")
+        self.assertEqual(len(single), len(group))
+
+    def test_conflict_lists_taken_seats(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(flight=self.flight, row_number=5, seat_number=3, order=order)
+        res = self.client.post(
+            self.url, {"tickets": self._tickets([(5, 2), (5, 3)])}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.data["seats"],
+            [{"flight": self.flight.pk, "row_number": 5, "seat_number": 3}],
+        )
+        self.assertEqual(Ticket.objects.filter(flight=self.flight).count(), 1)
+
+    def test_duplicate_seat_in_request(self):
+        res = self.client.post(
+            self.url, {"tickets": self._tickets([(5, 3), (5, 3)])}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_seat_out_of_range(self):
+        res = self.client.post(self.url, {"tickets": self._tickets([(31, 1)])}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], "Row number must be between 1 and 30.")
+
+    def test_unknown_flight(self):
+        tickets = [{"flight": self.flight.pk + 100, "row_number": 1, "seat_number": 1}]
+        res = self.client.post(self.url, {"tickets": tickets}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_booking_updates_seat_map(self):
+        seats_url = reverse("airport:flight-seats", args=[self.flight.pk])
+        self.client.get(seats_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {"tickets": self._tickets([(2, 2)])}, format="json")
+        res = self.client.get(seats_url)
+        self.assertTrue(res.data["seats"][1][1])
+
+
+class SeatHoldTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="testuser@example.com", password="12345")
+        self.other = User.objects.create_user(email="other@example.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        airport1 = Airport.objects.create(name="Boryspil", city=city)
+        airport2 = Airport.objects.create(name="Zhuliany", city=city)
+        route = Route.objects.create(source=airport1, destination=airport2, distance=300)
+        airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        airplane = Airplane.objects.create(
+            name="Boeing 737-800", rows=30, seats_in_rows=6, airplane_type=airplane_type
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=2),
+        )
+        self.holds_url = reverse("airport:flight-holds", args=[self.flight.pk])
+        self.orders_url = reverse("airport:order-list")
+
+    def _hold(self, seats, client=None):
+        payload = {"seats": [{"row_number": row, "seat_number": seat} for row, seat in seats]}
+        return (client or self.client).post(self.holds_url, payload, format="json")
+
+    def test_hold_and_convert_to_order(self):
+        res = self._hold([(3, 1), (3, 2)])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(held_seats(self.flight.pk), {(3, 1), (3, 2)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.client.post(self.orders_url, {"hold": res.data["id"]}, format="json")
+        self.assertEqual(order.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(order.data["tickets"]), 2)
+        self.assertEqual(held_seats(self.flight.pk), set())
+        self.assertIsNone(get_hold(res.data["id"]))
+
+    def test_held_seat_is_taken_for_others(self):
+        self._hold([(3, 1)])
+        other = APIClient()
+        other.force_authenticate(user=self.other)
+
+        res = self._hold([(3, 1)], client=other)
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        tickets = [{"flight": self.flight.pk, "row_number": 3, "seat_number": 1}]
+        res = other.post(self.orders_url, {"tickets": tickets}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        serializer = TicketSerializer(data=tickets[0])
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors["non_field_errors"][0],
+            "This seat is temporarily held on this flight.",
+        )
+
+    def test_hold_of_other_user_cannot_be_converted(self):
+        hold_id = self._hold([(3, 1)]).data["id"]
+        other = APIClient()
+        other.force_authenticate(user=self.other)
+        res = other.post(self.orders_url, {"hold": hold_id}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_holds_are_purged(self):
+        expired = self._hold([(3, 1)]).data["id"]
+        SeatHold.objects.filter(pk=expired).update(expires_at=timezone.now())
+        self.assertEqual(held_seats(self.flight.pk), set())
+        self.assertIsNone(get_hold(expired))
+
+        # Holding the seat again removes the expired hold of the flight
+        res = self._hold([(3, 1), (4, 1)])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(held_seats(self.flight.pk), {(3, 1), (4, 1)})
+        self.assertFalse(SeatHold.objects.filter(pk=expired).exists())
+
+        SeatHold.objects.update(expires_at=timezone.now())
+        out = StringIO()
+        call_command("purge_seat_holds", stdout=out)
+        self.assertIn("1 expired seat holds deleted", out.getvalue())
+        self.assertFalse(HeldSeat.objects.exists())
+
+    def test_holds_per_user_are_capped(self):
+        for row in range(1, SEAT_HOLDS_PER_USER + 1):
+            self.assertEqual(self._hold([(row, 1)]).status_code, status.HTTP_201_CREATED)
+        res = self._hold([(10, 1)])
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["detail"].code, "hold_limit_reached")
+
+        res = self._hold([(10, seat) for seat in range(1, 7)] + [(11, seat) for seat in range(1, 7)])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_hold_cannot_be_converted(self):
+        hold_id = self._hold([(3, 1)]).data["id"]
+        hold = get_hold(hold_id)
+        SeatHold.objects.filter(pk=hold_id).update(expires_at=timezone.now())
+        tickets = [{"flight_id": self.flight.pk, "row_number": 3, "seat_number": 1}]
+        with self.assertRaises(serializers.ValidationError):
+            book_seats(self.user, tickets, hold=hold)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_order_requires_tickets_or_hold(self):
+        res = self.client.post(self.orders_url, {}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ItinerarySearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        country = Country.objects.create(name="Ukraine")
+        kyiv = City.objects.create(name="Kyiv", country=country)
+        lviv = City.objects.create(name="Lviv", country=country)
+        odesa = City.objects.create(name="Odesa", country=country)
+        self.kbp = Airport.objects.create(name="Boryspil", city=kyiv)
+        self.lwo = Airport.objects.create(name="Lviv Danylo Halytskyi", city=lviv)
+        self.ods = Airport.objects.create(name="Odesa International", city=odesa)
+        self.airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        self.day = (timezone.now() + timedelta(days=2)).date()
+        self.midnight = timezone.datetime.combine(
+            self.day, timezone.datetime.min.time(), tzinfo=timezone.get_current_timezone()
+        )
+        self.first_leg = self._flight(self.kbp, self.lwo, 8, 10)
+        self.second_leg = self._flight(self.lwo, self.ods, 11, 13)
+        self._flight(self.lwo, self.ods, 10, 12)  # too short to connect
+        self.direct = self._flight(self.kbp, self.ods, 9, 12)
+        self.url = reverse("airport:itinerary-list")
+
+    def _flight(self, source, destination, departure_hour, arrival_hour):
+        route, _ = Route.objects.get_or_create(
+            source=source, destination=destination, defaults={"distance": 500}
+        )
+        # The flights overlap, every one gets its own airplane
+        airplane = Airplane.objects.create(
+            name=f"Boeing 737-800 {route.pk}/{departure_hour}",
+            rows=30,
+            seats_in_rows=6,
+            airplane_type=self.airplane_type,
+        )
+        return Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=self.midnight + timedelta(hours=departure_hour),
+            arrival_time=self.midnight + timedelta(hours=arrival_hour),
+        )
+
+    def test_search_ranks_by_duration(self):
+        res = self.client.get(self.url, {"from": "Kyiv", "to": self.ods.pk, "date": self.day})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [[leg["flight"] for leg in itinerary["legs"]] for itinerary in res.data],
+            [[self.direct.pk], [self.first_leg.pk, self.second_leg.pk]],
+        )
+        self.assertEqual(res.data[1]["duration_minutes"], 300)
+
+    def test_max_legs(self):
+        res = self.client.get(
+            self.url, {"from": "Boryspil", "to": "Odesa", "date": self.day, "max_legs": 1}
+        )
+        self.assertEqual(len(res.data), 1)
+
+    def test_search_stops_at_limit(self):
+        self.assertEqual(
+            [[leg.flight_id for leg in legs] for legs in
+             connection_index.search({self.kbp.pk}, {self.ods.pk}, self.day, limit=1)],
+            [[self.direct.pk]],
+        )
+
+    def test_unknown_place(self):
+        res = self.client.get(self.url, {"from": "Atlantis", "to": "Odesa", "date": self.day})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_is_patched_incrementally(self):
+        connection_index.search({self.kbp.pk}, {self.ods.pk}, self.day)
+        with self.captureOnCommitCallbacks(execute=True):
+            late = self._flight(self.lwo, self.ods, 15, 16)
+        with self.assertNumQueries(0):
+            itineraries = connection_index.search({self.kbp.pk}, {self.ods.pk}, self.day)
+        self.assertIn([self.first_leg.pk, late.pk], [
+            [leg.flight_id for leg in legs] for legs in itineraries
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            late.delete()
+        with self.assertNumQueries(0):
+            itineraries = connection_index.search({self.kbp.pk}, {self.ods.pk}, self.day)
+        self.assertEqual(len(itineraries), 2)
+
+
+class SeatCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="testuser@example.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        airport1 = Airport.objects.create(name="Boryspil", city=city)
+        airport2 = Airport.objects.create(name="Zhuliany", city=city)
+        self.route = Route.objects.create(source=airport1, destination=airport2, distance=300)
+        airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        self.airplane = Airplane.objects.create(
+            name="Boeing 737-800", rows=30, seats_in_rows=6, airplane_type=airplane_type
+        )
+        self.days = count(1)
+        self.flight = self._flight()
+
+    def _flight(self):
+        # One flight a day, the airplane cannot fly two at once
+        days = next(self.days)
+        return Flight.objects.create(
+            route=self.route,
+            airplane=self.airplane,
+            departure_time=timezone.now() + timedelta(days=days),
+            arrival_time=timezone.now() + timedelta(days=days, hours=2),
+        )
+
+    def test_counters_follow_bookings_and_cancellations(self):
+        self.assertEqual(self.flight.capacity, 180)
+        tickets = [
+            {"flight": self.flight.pk, "row_number": 1, "seat_number": seat}
+            for seat in range(1, 4)
+        ]
+        self.client.post(reverse("airport:order-list"), {"tickets": tickets}, format="json")
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 3)
+        self.assertEqual(self.flight.tickets_available, 177)
+
+        Ticket.objects.filter(flight=self.flight, seat_number=1).delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 2)
+
+        self.airplane.rows = 20
+        self.airplane.save()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.capacity, 120)
+
+    def test_list_shows_availability_without_extra_queries(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(flight=self.flight, row_number=1, seat_number=1, order=order)
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse("airport:flight-list"))
+        self.assertEqual(res.data["results"][0]["tickets_available"], 179)
+
+        for _ in range(5):
+            self._flight()
+        with self.assertNumQueries(2):
+            self.client.get(reverse("airport:flight-list"))
+
+    def test_reconcile_command(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(flight=self.flight, row_number=1, seat_number=1, order=order)
+        Flight.objects.filter(pk=self.flight.pk).update(seats_sold=42, capacity=0)
+        other = self._flight()
+
+        call_command("reconcile_seat_counters", chunk_size=1, stdout=StringIO())
+        self.flight.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.flight.capacity, self.flight.seats_sold), (180, 1))
+        self.assertEqual((other.capacity, other.seats_sold), (180, 0))
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.country = Country.objects.create(name="Ukraine")
+        self.city = City.objects.create(name="Kyiv", country=self.country)
+        self.airport1 = Airport.objects.create(name="Boryspil", city=self.city)
+        self.airport2 = Airport.objects.create(name="Zhuliany", city=self.city)
+        self.route = Route.objects.create(
+            source=self.airport1, destination=self.airport2, distance=300
+        )
+        self.routes_url = reverse("airport:route-list")
+        self.countries_url = reverse("airport:country-list")
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.client.get(self.routes_url)
+        with self.assertNumQueries(0):
+            res = self.client.get(self.routes_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["distance"], 300)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.routes_url, {"page_size": 5})
+        self.assertEqual(len(queries), 1)
+
+    def test_links_follow_the_requested_host(self):
+        Route.objects.create(source=self.airport2, destination=self.airport1, distance=300)
+        for host in ("api.example.com", "partner.example.com"):
+            res = self.client.get(self.routes_url, {"page_size": 1}, HTTP_HOST=host)
+            self.assertTrue(res.data["next"].startswith(f"http://{host}/"))
+        res = self.client.get(self.routes_url, {"page_size": 1}, HTTP_HOST=host, secure=True)
+        self.assertTrue(res.data["next"].startswith(f"https://{host}/"))
+
+    def test_route_change_invalidates_only_dependent_namespaces(self):
+        self.client.get(self.routes_url)
+        self.client.get(self.countries_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.route.distance = 450
+            self.route.save()
+
+        res = self.client.get(self.routes_url)
+        self.assertEqual(res.data["results"][0]["distance"], 450)
+        with self.assertNumQueries(0):
+            self.client.get(self.countries_url)
+
+    def test_city_change_invalidates_route_pages(self):
+        self.client.get(self.routes_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = "Kyiv City"
+            self.city.save()
+        res = self.client.get(self.routes_url)
+        self.assertEqual(res.data["results"][0]["source"]["city"], "Kyiv City")
+
+    def test_cache_stats(self):
+        self.client.get(self.countries_url)
+        self.client.get(self.countries_url)
+        staff = User.objects.create_user(
+            email="staff@example.com", password="12345", is_staff=True
+        )
+        self.client.force_authenticate(user=staff)
+        res = self.client.get(reverse("airport:cache-stats-list"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["country"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+        self.assertEqual(res.data["route"]["hits"], 0)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.staff = User.objects.create_user(
+            email="staff@example.com", password="12345", is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        airport1 = Airport.objects.create(name="Boryspil", city=city)
+        airport2 = Airport.objects.create(name="Zhuliany", city=city)
+        route = Route.objects.create(source=airport1, destination=airport2, distance=300)
+        airplane_type = AirplaneType.objects.create(name="Boeing 737")
+        airplane = Airplane.objects.create(
+            name="Boeing 737-800", rows=30, seats_in_rows=6, airplane_type=airplane_type
+        )
+        self.flights = [
+            Flight.objects.create(
+                route=route,
+                airplane=airplane,
+                departure_time=timezone.now() + timedelta(days=days),
+                arrival_time=timezone.now() + timedelta(days=days, hours=2),
+            )
+            for days in (1, 10)
+        ]
+        order = Order.objects.create(user=self.staff)
+        Ticket.objects.create(flight=self.flights[0], row_number=1, seat_number=1, order=order)
+
+    def _lines(self, response):
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_flights_ndjson_with_list_filters(self):
+        departure_before = (timezone.now() + timedelta(days=5)).strftime("%Y-%m-%d")
+        exported = REGISTRY.get_sample_value("airport_export_rows_total", {"export": "flights"}) or 0
+        res = self.client.get(
+            reverse("airport:flight-export"),
+            {"format": "ndjson", "departure_before": departure_before},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in self._lines(res)]
+        self.assertEqual([row["id"] for row in rows], [self.flights[0].pk])
+        self.assertEqual(
+            REGISTRY.get_sample_value("airport_export_rows_total", {"export": "flights"}) - exported, 1
+        )
+        self.assertEqual(rows[0]["airplane"], "Boeing 737-800")
+        self.assertEqual(rows[0]["seats_sold"], 1)
+
+    def test_tickets_and_orders_csv(self):
+        res = self.client.get(reverse("airport:ticket-export"), {"format": "csv"})
+        lines = self._lines(res)
+        self.assertEqual(lines[0], "id,order,user,flight,row_number,seat_number")
+        self.assertEqual(len(lines), 2)
+
+        res = self.client.get(reverse("airport:order-export"), {"format": "csv"})
+        self.assertIn("staff@example.com", self._lines(res)[1])
+
+    def test_format_from_accept_header(self):
+        url = reverse("airport:order-export")
+        for accept in ("application/json", "*/*", "application/x-ndjson"):
+            with self.subTest(accept=accept):
+                res = self.client.get(url, HTTP_ACCEPT=accept)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res["Content-Type"], "application/x-ndjson")
+                self.assertEqual(json.loads(self._lines(res)[0])["email"], "staff@example.com")
+        res = self.client.get(url, HTTP_ACCEPT="text/csv")
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT="text/html").status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_export_is_staff_only(self):
+        user = User.objects.create_user(email="user@example.com", password="12345")
+        self.client.force_authenticate(user=user)
+        for name in ("airport:flight-export", "airport:order-export", "airport:ticket-export"):
+            res = self.client.get(reverse(name))
+            self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ImportScheduleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def _import(self, *paths, **options):
+        out = StringIO()
+        call_command("import_schedule", *map(str, paths), stdout=out, **options)
+        return out.getvalue()
+
+    def test_json_and_csv_import(self):
+        schedule = self.tmp / "schedule.json"
+        schedule.write_text(json.dumps({
+            "airports": [
+                {"name": "Boryspil", "city": "Kyiv", "country": "Ukraine"},
+                {"name": "Chopin", "city": "Warsaw", "country": "Poland"},
+            ],
+            "airplane_types": [{"name": "Boeing"}],
+            "airplanes": [
+                {"name": "UR-1", "rows": 10, "seats_in_rows": 6, "airplane_type": "Boeing"},
+            ],
+            "routes": [{"source": "Boryspil", "destination": "Chopin", "distance": 700}],
+        }))
+        flights = self.tmp / "flights.csv"
+        flights.write_text(
+            "source,destination,airplane,departure_time,arrival_time\n"
+            "Boryspil,Chopin,UR-1,2030-01-01T10:00:00Z,2030-01-01T11:30:00Z\n"
+            "Boryspil,Chopin,UR-1,2030-01-02T10:00:00Z,2030-01-02T11:30:00Z\n"
+        )
+
+        output = self._import(flights, schedule)
+
+        self.assertIn("Import finished", output)
+        self.assertEqual(City.objects.count(), 2)
+        self.assertEqual(Route.objects.get().distance, 700)
+        self.assertEqual(Flight.objects.count(), 2)
+        self.assertTrue(all(flight.capacity == 60 for flight in Flight.objects.all()))
+
+    def test_upsert_updates_existing_rows(self):
+        schedule = self.tmp / "schedule.json"
+        data = {
+            "airports": [
+                {"name": "Boryspil", "city": "Kyiv", "country": "Ukraine"},
+                {"name": "Chopin", "city": "Warsaw", "country": "Poland"},
+            ],
+            "routes": [{"source": "Boryspil", "destination": "Chopin", "distance": 700}],
+        }
+        schedule.write_text(json.dumps(data))
+        self._import(schedule)
+
+        data["routes"][0]["distance"] = 690
+        schedule.write_text(json.dumps(data))
+        self._import(schedule)
+        self.assertEqual(Route.objects.get().distance, 700)
+
+        self._import(schedule, upsert=True)
+        self.assertEqual(Route.objects.get().distance, 690)
+        self.assertEqual(Airport.objects.count(), 2)
+
+    def test_upsert_resizes_flights_of_changed_airplanes(self):
+        schedule = self.tmp / "schedule.json"
+        data = {
+            "airports": [
+                {"name": "Boryspil", "city": "Kyiv", "country": "Ukraine"},
+                {"name": "Chopin", "city": "Warsaw", "country": "Poland"},
+            ],
+            "airplane_types": [{"name": "Boeing"}],
+            "airplanes": [
+                {"name": "UR-1", "rows": 10, "seats_in_rows": 6, "airplane_type": "Boeing"},
+            ],
+            "routes": [{"source": "Boryspil", "destination": "Chopin", "distance": 700}],
+            "flights": [{
+                "source": "Boryspil",
+                "destination": "Chopin",
+                "airplane": "UR-1",
+                "departure_time": "2030-01-01T10:00:00Z",
+                "arrival_time": "2030-01-01T11:30:00Z",
+            }],
+        }
+        schedule.write_text(json.dumps(data))
+        self._import(schedule)
+
+        data["airplanes"][0]["rows"] = 20
+        del data["flights"]
+        schedule.write_text(json.dumps(data))
+        self._import(schedule, upsert=True)
+        self.assertEqual(Flight.objects.get().capacity, 120)
+
+    def test_unknown_reference_fails(self):
+        routes = self.tmp / "routes.csv"
+        routes.write_text("source,destination,distance\nNowhere,Chopin,10\n")
+        with self.assertRaises(CommandError):
+            self._import(routes)
+
+
+class BenchCommandTest(TestCase):
+    def test_bench_reports_every_read_endpoint(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        output = tmp / "bench.json"
+        call_command(
+            "bench",
+            current_db=True,
+            countries=2,
+            airports=4,
+            routes=4,
+            flights=10,
+            orders=3,
+            requests=2,
+            warmup=0,
+            output=str(output),
+            stdout=StringIO(),
+        )
+
+        results = json.loads(output.read_text())
+        endpoints = results["endpoints"]
+        for name in ("airport:flight-list GET", "airport:order-list POST", "user:manage GET"):
+            self.assertIn(name, endpoints)
+        for stats in endpoints.values():
+            self.assertTrue(all(code.startswith("2") for code in stats["status"]), stats)
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertIn("airport:flight-list POST", results["meta"]["not_benchmarked"])
+
+
+# Maximum SQL queries per list endpoint, whatever the number of rows.
+# An N+1 in a serializer or a missing select_related breaks the budget.
+QUERY_BUDGETS = {
+    "airport:country-list": 1,
+    "airport:city-list": 1,
+    "airport:airport-list": 1,
+    "airport:airplane-type-list": 1,
+    "airport:airplane-list": 1,
+    "airport:crew-list": 1,
+    "airport:route-list": 1,
+    "airport:flight-list": 2,
+    "airport:order-list": 2,
+}
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, url_name, budget=None, **params):
+        """Request an endpoint with a cold cache and fail if it runs more queries than its budget."""
+        budget = QUERY_BUDGETS[url_name] if budget is None else budget
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse(url_name), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            f"{url_name} ran {len(queries)} queries, budget is {budget}:\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="budget@example.com", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.airplane_type = AirplaneType.objects.create(name="Boeing")
+        self.crew = Crew.objects.create(first_name="Ann", last_name="Pilot")
+
+    def _add_rows(self, count):
+        for _ in range(count):
+            index = Country.objects.count()
+            country = Country.objects.create(name=f"Country {index}")
+            source = Airport.objects.create(
+                name=f"Source {index}", city=City.objects.create(name=f"A{index}", country=country)
+            )
+            destination = Airport.objects.create(
+                name=f"Destination {index}", city=City.objects.create(name=f"B{index}", country=country)
+            )
+            route = Route.objects.create(source=source, destination=destination, distance=500)
+            airplane = Airplane.objects.create(
+                name=f"Plane {index}", rows=10, seats_in_rows=4, airplane_type=self.airplane_type
+            )
+            flight = Flight.objects.create(
+                route=route,
+                airplane=airplane,
+                departure_time=timezone.now() + timedelta(days=1 + index),
+                arrival_time=timezone.now() + timedelta(days=1 + index, hours=2),
+            )
+            flight.crew.add(self.crew)
+            order = Order.objects.create(user=self.user)
+            for seat in (1, 2):
+                Ticket.objects.create(order=order, flight=flight, row_number=1, seat_number=seat)
+
+    def test_list_endpoints_stay_within_budget(self):
+        for rows in (1, 5):
+            self._add_rows(rows)
+            for url_name in QUERY_BUDGETS:
+                with self.subTest(url_name=url_name, rows=Country.objects.count()):
+                    self.assertQueryBudget(url_name)
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_server_timing_header_and_log_line(self):
+        Country.objects.create(name="Ukraine")
+        self.client.force_authenticate(
+            user=User.objects.create_user(email="staff@example.com", is_staff=True)
+        )
+        with self.assertLogs("airport.performance", level="INFO") as logs:
+            res = self.client.get(reverse("airport:country-list"))
+
+        timing = dict(
+            metric.strip().split(";", 1) for metric in res["Server-Timing"].split(",")
+        )
+        self.assertEqual(set(timing), {"db", "serialize", "render", "total"})
+        self.assertIn('desc="1 queries"', timing["db"])
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["route"], "airport:country-list")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["queries"], 1)
+        self.assertGreater(record["serializer_ms"] + record["render_ms"], 0)
+
+    def test_server_timing_is_hidden_from_customers(self):
+        with self.assertLogs("airport.performance", level="INFO"):
+            res = self.client.get(reverse("airport:country-list"))
+        self.assertNotIn("Server-Timing", res)
+        with override_settings(DEBUG=True), self.assertLogs("airport.performance", level="INFO"):
+            res = self.client.get(reverse("airport:country-list"))
+        self.assertIn("Server-Timing", res)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="metrics@example.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        airplane = Airplane.objects.create(
+            name="A320",
+            rows=5,
+            seats_in_rows=4,
+            airplane_type=AirplaneType.objects.create(name="Airbus"),
+        )
+        city = City.objects.create(name="Kyiv", country=Country.objects.create(name="Ukraine"))
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=city),
+            destination=Airport.objects.create(name="Zhuliany", city=city),
+            distance=30,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+
+    def _sample(self, text, name, **labels):
+        selector = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        prefix = f"{name}{{{selector}}} " if labels else f"{name} "
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return 0.0
+
+    def _metrics(self):
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        return res.content.decode()
+
+    def test_booking_outcomes_and_request_latency(self):
+        before = self._metrics()
+        order_url = reverse("airport:order-list")
+        tickets = {"tickets": [{"flight": self.flight.pk, "row_number": 1, "seat_number": 1}]}
+        self.client.post(order_url, tickets, format="json")
+        self.client.post(order_url, tickets, format="json")
+        self.client.post(
+            order_url,
+            {"tickets": [{"flight": self.flight.pk, "row_number": 9, "seat_number": 1}]},
+            format="json",
+        )
+        after = self._metrics()
+
+        for outcome in ("success", "seat_conflict", "validation_error"):
+            self.assertEqual(
+                self._sample(after, "airport_bookings_total", outcome=outcome)
+                - self._sample(before, "airport_bookings_total", outcome=outcome),
+                1,
+            )
+        latency = dict(route="airport:order-list", method="POST", status="201")
+        self.assertEqual(
+            self._sample(after, "airport_http_request_duration_seconds_count", **latency)
+            - self._sample(before, "airport_http_request_duration_seconds_count", **latency),
+            1,
+        )
+        self.assertIn("airport_http_requests_in_flight", after)
+
+    def test_cache_hit_ratio(self):
+        url = reverse("airport:country-list")
+        self.client.get(url)
+        self.client.get(url)
+        text = self._metrics()
+        self.assertEqual(self._sample(text, "airport_api_cache_hit_ratio", namespace="country"), 0.5)
+
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(email="async@example.com", password="12345")
+        )
+        country = Country.objects.create(name="Ukraine")
+        kyiv = City.objects.create(name="Kyiv", country=country)
+        lviv = City.objects.create(name="Lviv", country=country)
+        self.route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=kyiv),
+            destination=Airport.objects.create(name="Lviv Danylo Halytskyi", city=lviv),
+            distance=470,
+        )
+        airplane = Airplane.objects.create(
+            name="A320",
+            rows=4,
+            seats_in_rows=4,
+            airplane_type=AirplaneType.objects.create(name="Airbus"),
+        )
+        crew = Crew.objects.create(first_name="Ann", last_name="Pilot")
+        self.flights = []
+        for days in (1, 2, 3):
+            flight = Flight.objects.create(
+                route=self.route,
+                airplane=airplane,
+                departure_time=timezone.now() + timedelta(days=days, microseconds=123),
+                arrival_time=timezone.now() + timedelta(days=days, hours=1),
+            )
+            flight.crew.add(crew)
+            self.flights.append(flight)
+        order = Order.objects.create(user=User.objects.create_user(email="other@example.com"))
+        Ticket.objects.create(order=order, flight=self.flights[0], row_number=2, seat_number=3)
+
+    def test_async_responses_match_sync_endpoints(self):
+        flight, airport = self.flights[0], self.route.source
+        cases = [
+            ("flight-list", {}, {"page_size": 2}),
+            ("flight-detail", {"pk": flight.pk}, {}),
+            ("flight-seats", {"pk": flight.pk}, {}),
+            ("airport-list", {}, {}),
+            ("airport-detail", {"pk": airport.pk}, {}),
+            ("route-list", {}, {}),
+            ("route-detail", {"pk": self.route.pk}, {}),
+        ]
+        for name, kwargs, params in cases:
+            with self.subTest(name=name):
+                sync = self.client.get(reverse(f"airport:{name}", kwargs=kwargs), params, format="json")
+                async_ = self.client.get(reverse(f"airport:async-{name}", kwargs=kwargs), params)
+                self.assertEqual(async_.status_code, status.HTTP_200_OK)
+                self.assertEqual(async_["Content-Type"], "application/json")
+                if name == "flight-list":
+                    # Pagination links point back at the endpoint that was called
+                    sync_data, async_data = sync.json(), async_.json()
+                    self.assertEqual(sync_data["results"], async_data["results"])
+                    self.assertIn("/async/flights/", async_data["next"])
+                else:
+                    self.assertEqual(sync.content, async_.content)
+
+    def test_cursor_pages_and_errors(self):
+        url = reverse("airport:async-flight-list")
+        first = self.client.get(url, {"page_size": 2}).json()
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([item["id"] for item in second["results"]], [self.flights[2].pk])
+
+        res = self.client.get(reverse("airport:async-flight-detail", kwargs={"pk": 999999}))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(res.json(), {"detail": "No Flight matches the given query."})
+        res = self.client.post(url)
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(DEBUG=True)
+    async def test_native_async_request(self):
+        response = await self.async_client.get(
+            reverse("airport:async-flight-seats", kwargs={"pk": self.flights[0].pk})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["seats_taken"], 1)
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+
+
+class LeanReaderParityTest(TestCase):
+    """The lean list readers must render exactly what the serializers render."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="lean@example.com", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(name="Ukraine")
+        kyiv = City.objects.create(name="Kyiv", country=country)
+        odesa = City.objects.create(name="Odesa", country=country)
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=kyiv),
+            destination=Airport.objects.create(name="Odesa International", city=odesa),
+            distance=440,
+        )
+        airplane = Airplane.objects.create(
+            name="E195", rows=2, seats_in_rows=2, airplane_type=AirplaneType.objects.create(name="Embraer")
+        )
+        second = Crew.objects.create(first_name="Bo", last_name="Second")
+        first = Crew.objects.create(first_name="Al", last_name="First")
+        departure = timezone.now() + timedelta(days=1)
+        flights = [
+            Flight.objects.create(
+                route=route,
+                airplane=airplane,
+                departure_time=departure + timedelta(hours=hours),
+                arrival_time=departure + timedelta(hours=hours + 1, microseconds=500),
+            )
+            for hours in (0, 2, 4)
+        ]
+        flights[0].crew.add(first, second)
+        flights[1].crew.add(second)
+        Flight.objects.filter(pk=flights[2].pk).update(seats_sold=10)
+
+        for flight, seats in ((flights[0], (2, 1)), (flights[1], (1,))):
+            order = Order.objects.create(user=self.user)
+            for seat in seats:
+                Ticket.objects.create(order=order, flight=flight, row_number=1, seat_number=seat)
+        Order.objects.create(user=self.user)
+
+    def test_list_endpoints_match_serializers(self):
+        cases = [
+            ("flight-list", FlightViewSet, FlightSerializer, FlightViewSet.queryset),
+            ("airport-list", AirportViewSet, AirportSerializer, AirportViewSet.queryset),
+            ("route-list", RouteViewSet, RouteSerializer, RouteViewSet.queryset),
+            (
+                "order-list",
+                OrderViewSet,
+                OrderListSerializer,
+                OrderViewSet(request=SimpleNamespace(user=self.user)).get_queryset(),
+            ),
+        ]
+        for url_name, viewset, serializer_class, queryset in cases:
+            with self.subTest(url_name=url_name):
+                ordering = viewset.pagination_class.ordering
+                objects = list(queryset.order_by(*ordering))
+                rows = list(viewset.lean_reader.get_queryset(queryset).order_by(*ordering))
+                self.assertEqual(
+                    JSONRenderer().render(viewset.lean_reader.to_representation(rows)),
+                    JSONRenderer().render(serializer_class(objects, many=True).data),
+                )
+
+                res = self.client.get(reverse(f"airport:{url_name}"))
+                self.assertEqual(
+                    res.json()["results"],
+                    json.loads(JSONRenderer().render(serializer_class(objects, many=True).data)),
+                )
+
+        flights = self.client.get(reverse("airport:flight-list")).json()["results"]
+        self.assertEqual(flights[0]["crew"], ["Bo Second", "Al First"])
+        self.assertEqual(flights[2]["tickets_available"], 0)
+
+
+class ResponseShapingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(email="shape@example.com", password="12345")
+        )
+        country = Country.objects.create(name="Ukraine")
+        self.route = Route.objects.create(
+            source=Airport.objects.create(
+                name="Boryspil", city=City.objects.create(name="Kyiv", country=country)
+            ),
+            destination=Airport.objects.create(
+                name="Lviv Danylo Halytskyi", city=City.objects.create(name="Lviv", country=country)
+            ),
+            distance=470,
+        )
+        airplane = Airplane.objects.create(
+            name="A320", rows=4, seats_in_rows=4, airplane_type=AirplaneType.objects.create(name="Airbus")
+        )
+        crew = Crew.objects.create(first_name="Ann", last_name="Pilot")
+        for days in (1, 2):
+            flight = Flight.objects.create(
+                route=self.route,
+                airplane=airplane,
+                departure_time=timezone.now() + timedelta(days=days),
+                arrival_time=timezone.now() + timedelta(days=days, hours=1),
+            )
+            flight.crew.add(crew)
+        self.flight = flight
+
+    def _get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+        return res.json(), len(queries)
+
+    def test_sparse_fields_skip_joins_and_prefetches(self):
+        data, queries = self._get(reverse("airport:flight-list"), fields="id,departure_time")
+        self.assertEqual(set(data["results"][0]), {"id", "departure_time"})
+        self.assertEqual(queries, 1)
+
+        data, queries = self._get(reverse("airport:flight-list"), fields="id,tickets_available", page_size=1)
+        self.assertEqual(data["results"][0]["tickets_available"], 16)
+        self.assertEqual(queries, 1)
+
+        page = self.client.get(data["next"]).json()
+        self.assertEqual(set(page["results"][0]), {"id", "tickets_available"})
+
+    def test_expand_nested_objects(self):
+        url = reverse("airport:flight-detail", kwargs={"pk": self.flight.pk})
+        data, queries = self._get(url, expand="route.source.city,airplane,crew")
+        self.assertEqual(
+            data["route"]["source"],
+            {"id": self.route.source_id, "name": "Boryspil",
+             "city": {"id": self.route.source.city_id, "name": "Kyiv", "country": "Ukraine"},
+             "latitude": None, "longitude": None},
+        )
+        self.assertEqual(data["route"]["destination"]["city"], "Lviv")
+        self.assertEqual(data["airplane"]["airplane_type"], "Airbus")
+        self.assertEqual(data["crew"], [{"id": data["crew"][0]["id"], "first_name": "Ann", "last_name": "Pilot"}])
+        self.assertEqual(queries, 2)
+
+        data, queries = self._get(url, fields="id,route.distance,route.source.name")
+        self.assertEqual(data, {"id": self.flight.pk, "route": {"source": {"name": "Boryspil"}, "distance": 470}})
+        self.assertEqual(queries, 1)
+
+        data, _ = self._get(reverse("airport:route-list"), fields="id,source.name")
+        self.assertEqual(data["results"], [{"id": self.route.pk, "source": {"name": "Boryspil"}}])
+
+    def test_full_shape_matches_default_response(self):
+        url = reverse("airport:flight-list")
+        fields = "id,route,airplane,departure_time,arrival_time,crew,tickets_available"
+        self.assertEqual(self._get(url)[0]["results"], self._get(url, fields=fields)[0]["results"])
+
+    def test_invalid_shape(self):
+        url = reverse("airport:flight-list")
+        for params, error in (
+            ({"fields": "id,bogus"}, {"fields": ["Unknown field 'bogus'."]}),
+            ({"fields": "crew_ids"}, {"fields": ["Unknown field 'crew_ids'."]}),
+            ({"expand": "route.nope"}, {"expand": ["Unknown field 'route.nope'."]}),
+            ({"expand": "departure_time"}, {"expand": ["Field 'departure_time' cannot be expanded."]}),
+        ):
+            with self.subTest(params=params):
+                res = self.client.get(url, params)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(res.json(), error)
+
+    def test_async_endpoints_accept_shape(self):
+        params = {"fields": "id,route", "expand": "route"}
+        sync = self.client.get(reverse("airport:flight-list"), params).json()
+        async_ = self.client.get(reverse("airport:async-flight-list"), params).json()
+        self.assertEqual(sync["results"], async_["results"])
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.kyiv = sample_city()
+        self.boryspil = sample_airport("Boryspil")
+        sample_airport("Kyiv International")
+        sample_airport("Lviv Danylo Halytskyi", sample_city("Lviv"))
+        Country.objects.create(name="Österreich")
+
+    def _search(self, q, **params):
+        res = self.client.get(reverse("airport:search-list"), {"q": q, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(item["type"], item["name"]) for item in res.json()["results"]]
+
+    def test_prefix_search_ranking(self):
+        res = self.client.get(reverse("airport:search-list"), {"q": "bory"})
+        self.assertEqual(
+            res.json()["results"],
+            [{"type": "airport", "id": self.boryspil.pk, "name": "Boryspil",
+              "city": "Kyiv", "country": "Ukraine"}],
+        )
+        self.assertEqual(
+            self._search("KYIV"),
+            [("city", "Kyiv"), ("airport", "Kyiv International")],
+        )
+        self.assertEqual(self._search("danylo h"), [("airport", "Lviv Danylo Halytskyi")])
+        self.assertEqual(self._search("oster"), [("country", "Österreich")])
+        self.assertEqual(self._search("ky", limit=1), [("airport", "Kyiv International")])
+
+    def test_index_follows_changes(self):
+        self._search("bory")
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.create(name="Zhuliany", city=self.kyiv)
+            self.boryspil.name = "Boryspil International"
+            self.boryspil.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._search("zhul"), [("airport", "Zhuliany")])
+            self.assertEqual(self._search("intern"), [("airport", "Boryspil International"),
+                                                      ("airport", "Kyiv International")])
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kyiv.delete()
+        self.assertEqual(self._search("bory"), [])
+
+    def test_database_fallback_and_errors(self):
+        self.assertEqual(self._search("spil"), [("airport", "Boryspil")])
+        res = self.client.get(reverse("airport:search-list"))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(reverse("airport:search-list"), {"q": "ky", "limit": 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GeoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        ukraine = Country.objects.create(name="Ukraine")
+        kyiv = City.objects.create(name="Kyiv", country=ukraine)
+        lviv = City.objects.create(name="Lviv", country=ukraine)
+        self.boryspil = Airport.objects.create(
+            name="Boryspil", city=kyiv, latitude=50.345, longitude=30.8947
+        )
+        self.zhuliany = Airport.objects.create(
+            name="Zhuliany", city=kyiv, latitude=50.4017, longitude=30.4497
+        )
+        self.lviv = Airport.objects.create(
+            name="Lviv", city=lviv, latitude=49.8125, longitude=23.9561
+        )
+        self.nowhere = Airport.objects.create(name="Nowhere", city=lviv)
+
+    def _nearby(self, **params):
+        return self.client.get(reverse("airport:airport-nearby"), params)
+
+    def test_nearby_airports(self):
+        res = self._nearby(lat=50.45, lon=30.52, radius_km=100)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.json()["results"]
+        self.assertEqual([item["name"] for item in results], ["Zhuliany", "Boryspil"])
+        self.assertEqual(results[0]["city"], "Kyiv")
+        self.assertLess(results[0]["distance_km"], results[1]["distance_km"])
+
+        res = self._nearby(lat=50.45, lon=30.52, radius_km=1000, limit=1)
+        self.assertEqual([item["name"] for item in res.json()["results"]], ["Zhuliany"])
+        res = self._nearby(lat=50.45, lon=30.52, radius_km=1000)
+        self.assertEqual(len(res.json()["results"]), 3)
+
+        self.assertEqual(self._nearby(lat=50.45).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._nearby(lat=91, lon=0).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nearby_follows_changes(self):
+        self._nearby(lat=49.8, lon=24.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nowhere.latitude, self.nowhere.longitude = 49.85, 24.05
+            self.nowhere.save()
+            self.lviv.delete()
+        res = self._nearby(lat=49.8, lon=24.0)
+        self.assertEqual([item["name"] for item in res.json()["results"]], ["Nowhere"])
+
+    def test_route_distance_from_coordinates(self):
+        route = Route.objects.create(source=self.boryspil, destination=self.lviv, distance=1)
+        self.assertEqual(route.distance, 498)
+
+        serializer = RouteSerializer(
+            data={"source_id": self.zhuliany.pk, "destination_id": self.lviv.pk}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer = RouteSerializer(
+            data={"source_id": self.nowhere.pk, "destination_id": self.lviv.pk}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("distance", serializer.errors)
+
+        self.lviv.latitude = 52.1657
+        self.lviv.longitude = 20.9671
+        self.lviv.save()
+        route.refresh_from_db()
+        self.assertEqual(route.distance, 719)
+
+    def test_position_queries(self):
+        with self.assertNumQueries(2):
+            Route.objects.create(source_id=self.boryspil.pk, destination_id=self.lviv.pk, distance=1)
+        # A rename neither reads the old position nor touches the routes
+        self.lviv.name = "Lviv Danylo Halytskyi"
+        with self.assertNumQueries(1):
+            self.lviv.save(update_fields=["name"])
+        with self.assertNumQueries(2):
+            self.lviv.save()
+
+    def test_recompute_command_and_import(self):
+        route = Route.objects.create(source=self.boryspil, destination=self.zhuliany, distance=1)
+        Route.objects.filter(pk=route.pk).update(distance=1)
+        Route.objects.create(source=self.nowhere, destination=self.lviv, distance=70)
+        out = StringIO()
+        call_command("recompute_route_distances", stdout=out)
+        self.assertIn("1 route distances", out.getvalue())
+        route.refresh_from_db()
+        self.assertEqual(route.distance, 32)
+
+        schedule = Path(tempfile.mkdtemp()) / "schedule.json"
+        self.addCleanup(shutil.rmtree, schedule.parent)
+        schedule.write_text(json.dumps({
+            "airports": [{"name": "Chopin", "city": "Warsaw", "country": "Poland",
+                          "latitude": 52.1657, "longitude": 20.9671}],
+            "routes": [{"source": "Boryspil", "destination": "Chopin"},
+                       {"source": "Nowhere", "destination": "Chopin", "distance": 650}],
+        }))
+        call_command("import_schedule", str(schedule), stdout=StringIO())
+        self.assertEqual(Route.objects.get(destination__name="Chopin", source=self.boryspil).distance, 719)
+        self.assertEqual(Route.objects.get(destination__name="Chopin", source=self.nowhere).distance, 650)
+
+
+class ScheduleConflictTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        self.route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=city),
+            destination=Airport.objects.create(name="Zhuliany", city=city),
+            distance=30,
+        )
+        airplane_type = AirplaneType.objects.create(name="Boeing")
+        self.airplane = Airplane.objects.create(name="UR-1", rows=10, seats_in_rows=6, airplane_type=airplane_type)
+        self.other_airplane = Airplane.objects.create(
+            name="UR-2", rows=10, seats_in_rows=6, airplane_type=airplane_type
+        )
+        self.pilot = Crew.objects.create(first_name="Ann", last_name="Pilot")
+        self.start = timezone.now() + timedelta(days=1)
+        self.flight = Flight.objects.create(
+            route=self.route,
+            airplane=self.airplane,
+            departure_time=self.start,
+            arrival_time=self.start + timedelta(hours=2),
+        )
+        self.flight.crew.add(self.pilot)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="staff@example.com", password="12345", is_staff=True)
+        )
+
+    def _create(self, airplane, crew, departure, hours=1):
+        return self.client.post(reverse("airport:flight-list"), {
+            "route": self.route.pk,
+            "airplane": airplane.name,
+            "departure_time": departure.isoformat(),
+            "arrival_time": (departure + timedelta(hours=hours)).isoformat(),
+            "crew_ids": [member.pk for member in crew],
+        })
+
+    def test_overlapping_assignments_conflict(self):
+        res = self._create(self.airplane, [], self.start + timedelta(hours=1))
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.data["conflicts"], [{"resource": "airplane", "id": self.airplane.pk, "flight": self.flight.pk}]
+        )
+
+        # Within the turnaround buffer after arrival, and ending inside the flight
+        res = self._create(self.other_airplane, [self.pilot], self.start + timedelta(hours=2, minutes=10))
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["conflicts"][0]["resource"], "crew")
+        res = self._create(self.other_airplane, [self.pilot], self.start - timedelta(hours=1))
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Flight.objects.count(), 1)
+
+    def test_free_slots_and_updates(self):
+        res = self._create(self.airplane, [self.pilot], self.start + timedelta(hours=3))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED, res.data)
+        res = self._create(self.other_airplane, [], self.start)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED, res.data)
+
+        url = reverse("airport:flight-detail", kwargs={"pk": self.flight.pk})
+        res = self.client.patch(url, {"arrival_time": (self.start + timedelta(hours=1)).isoformat()})
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.data)
+        res = self.client.patch(url, {"airplane": self.other_airplane.name})
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_crew_assignments_follow_flights(self):
+        def assignments():
+            return set(CrewAssignment.objects.values_list("crew_id", "flight_id", "departure_time", "available_at"))
+
+        copilot = Crew.objects.create(first_name="Bo", last_name="Copilot")
+        self.flight.crew.add(copilot)
+        available_at = self.start + timedelta(hours=2, minutes=30)
+        self.assertEqual(assignments(), {
+            (self.pilot.pk, self.flight.pk, self.start, available_at),
+            (copilot.pk, self.flight.pk, self.start, available_at),
+        })
+
+        self.flight.arrival_time = self.start + timedelta(hours=3)
+        self.flight.save(update_fields=["arrival_time"])
+        copilot.flight_set.remove(self.flight)
+        available_at = self.start + timedelta(hours=3, minutes=30)
+        self.assertEqual(assignments(), {(self.pilot.pk, self.flight.pk, self.start, available_at)})
+
+        self.flight.crew.clear()
+        self.assertEqual(assignments(), set())
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Exclusion constraints need PostgreSQL")
+    def test_database_refuses_double_booking(self):
+        # Saved directly, without check_assignments
+        def save(airplane, departure):
+            flight = Flight(
+                route=self.route,
+                airplane=airplane,
+                departure_time=departure,
+                arrival_time=departure + timedelta(hours=1),
+            )
+            flight.save()
+            return flight
+
+        within_turnaround = self.start + timedelta(hours=2, minutes=10)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            save(self.airplane, within_turnaround)
+        other = save(self.other_airplane, within_turnaround)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            other.crew.add(self.pilot)
+        save(self.airplane, self.start + timedelta(hours=2, minutes=30))
+
+        with self.assertRaises(ScheduleConflict), overlap_constraints(), transaction.atomic():
+            save(self.airplane, self.start - timedelta(minutes=30))
+
+
+class AirportBoardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        country = Country.objects.create(name="Ukraine")
+        kyiv = City.objects.create(name="Kyiv", country=country)
+        lviv = City.objects.create(name="Lviv", country=country)
+        self.boryspil = Airport.objects.create(name="Boryspil", city=kyiv)
+        lviv_airport = Airport.objects.create(name="Lviv", city=lviv)
+        outbound = Route.objects.create(source=self.boryspil, destination=lviv_airport, distance=470)
+        inbound = Route.objects.create(source=lviv_airport, destination=self.boryspil, distance=470)
+        airplane = Airplane.objects.create(
+            name="UR-1", rows=10, seats_in_rows=6,
+            airplane_type=AirplaneType.objects.create(name="Boeing"),
+        )
+        now = timezone.now()
+        self.later = Flight.objects.create(
+            route=outbound, airplane=airplane,
+            departure_time=now + timedelta(hours=5), arrival_time=now + timedelta(hours=6),
+        )
+        self.sooner = Flight.objects.create(
+            route=outbound, airplane=airplane,
+            departure_time=now + timedelta(hours=1), arrival_time=now + timedelta(hours=2),
+        )
+        self.inbound = Flight.objects.create(
+            route=inbound, airplane=airplane,
+            departure_time=now + timedelta(hours=3), arrival_time=now + timedelta(hours=4),
+        )
+        Flight.objects.create(
+            route=outbound, airplane=airplane,
+            departure_time=now + timedelta(days=2), arrival_time=now + timedelta(days=2, hours=1),
+        )
+
+    def _board(self, kind, pk=None, **params):
+        url = reverse(f"airport:airport-{kind}", kwargs={"pk": pk or self.boryspil.pk})
+        return self.client.get(url, params)
+
+    def test_departures_and_arrivals(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self._board("departures")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        results = res.json()["results"]
+        self.assertEqual([flight["id"] for flight in results], [self.sooner.pk, self.later.pk])
+        self.assertEqual(results[0]["destination"], "Lviv")
+        self.assertEqual(results[0]["city"], "Lviv")
+
+        res = self._board("arrivals")
+        self.assertEqual([(f["id"], f["source"]) for f in res.json()["results"]], [(self.inbound.pk, "Lviv")])
+
+        window = {"from": self.later.departure_time.isoformat(), "to": (timezone.now() + timedelta(days=2, hours=2)).isoformat()}
+        res = self._board("departures", **window)
+        self.assertEqual(len(res.json()["results"]), 2)
+
+    def test_board_cached_per_minute(self):
+        self._board("departures")
+        with CaptureQueriesContext(connection) as queries:
+            self._board("departures")
+        self.assertEqual(len(queries), 0)
+
+    def test_stale_board_served_during_refresh(self):
+        minute = timezone.now().replace(second=0, microsecond=0)
+        with mock.patch("airport.boards.timezone.now", return_value=minute - timedelta(minutes=1)):
+            stale = self._board("departures").json()
+        key = f"board:departures:{self.boryspil.pk}:now:now"
+        self.assertTrue(cache.add(f"{key}:refresh", 1))
+        with mock.patch("airport.boards.timezone.now", return_value=minute):
+            with CaptureQueriesContext(connection) as queries:
+                res = self._board("departures")
+        self.assertEqual(res.json(), stale)
+        self.assertEqual(len(queries), 0)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self._board("departures", pk=999999).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._board("arrivals", **{"from": "yesterday"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        res = self._board("departures", to=(timezone.now() + timedelta(days=5)).isoformat())
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AvailabilityStreamTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=city),
+            destination=Airport.objects.create(name="Zhuliany", city=city),
+            distance=30,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="UR-1", rows=4, seats_in_rows=4,
+                airplane_type=AirplaneType.objects.create(name="Boeing"),
+            ),
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+        self.order = Order.objects.create(user=User.objects.create_user(email="sse@example.com"))
+
+    def _book(self, row, seat):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Ticket.objects.create(order=self.order, flight=self.flight, row_number=row, seat_number=seat)
+
+    def _release(self, ticket):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.delete()
+
+    async def test_stream_pushes_seat_events(self):
+        url = reverse("airport:flight-availability-stream", kwargs={"pk": self.flight.pk})
+        response = await self.async_client.get(url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+
+        snapshot = (await anext(events)).decode()
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+        self.assertEqual(json.loads(snapshot.split("data: ")[1])["seats_taken"], 0)
+        self.assertEqual(broker.subscriber_count(flight_channel(self.flight.pk)), 1)
+
+        ticket = await sync_to_async(self._book)(2, 3)
+        taken = (await asyncio.wait_for(anext(events), 5)).decode()
+        self.assertTrue(taken.startswith("event: seat-taken\n"))
+        self.assertEqual(
+            json.loads(taken.split("data: ")[1])["seats"], [{"row_number": 2, "seat_number": 3}]
+        )
+        await sync_to_async(self._release)(ticket)
+        released = (await asyncio.wait_for(anext(events), 5)).decode()
+        self.assertTrue(released.startswith("event: seat-released\n"))
+
+        # A client disconnecting cancels the task serving the stream
+        waiting = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(broker.subscriber_count(flight_channel(self.flight.pk)), 0)
+
+    def test_not_streamed_under_wsgi(self):
+        url = reverse("airport:flight-availability-stream", kwargs={"pk": self.flight.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertEqual(broker.subscriber_count(flight_channel(self.flight.pk)), 0)
+
+    async def test_stream_ends_after_max_lifetime(self):
+        url = reverse("airport:flight-availability-stream", kwargs={"pk": self.flight.pk})
+        with mock.patch("airport.async_views.STREAM_MAX_SECONDS", 0.05):
+            response = await self.async_client.get(url)
+            events = [event async for event in response.streaming_content]
+        self.assertTrue(events[0].decode().startswith("event: snapshot\n"))
+        self.assertEqual(broker.subscriber_count(flight_channel(self.flight.pk)), 0)
+
+    async def test_missing_flight(self):
+        url = reverse("airport:flight-availability-stream", kwargs={"pk": 999999})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        local = LocalBroker()
+        subscription = local.subscribe("flight:1")
+        for row in range(SUBSCRIBER_QUEUE_SIZE + 1):
+            local.publish("flight:1", {"type": "seat-taken", "seats": [row]})
+        await asyncio.sleep(0)
+        self.assertEqual(await subscription.get(timeout=1), {"type": "seats-changed"})
+        self.assertIsNone(await subscription.get(timeout=0.01))
+        subscription.close()
+        self.assertEqual(local.subscriber_count("flight:1"), 0)
+
+
+class IdempotencyKeyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="retry@example.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=city),
+            destination=Airport.objects.create(name="Zhuliany", city=city),
+            distance=30,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="UR-1", rows=10, seats_in_rows=6,
+                airplane_type=AirplaneType.objects.create(name="Boeing"),
+            ),
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+        self.url = reverse("airport:order-list")
+
+    def _order(self, key, seat=1):
+        tickets = [{"flight": self.flight.pk, "row_number": 1, "seat_number": seat}]
+        return self.client.post(self.url, {"tickets": tickets}, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_original_response(self):
+        first = self._order("order-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as queries:
+            retry = self._order("order-1")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertFalse(any("airport_ticket" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(Order.objects.count(), 1)
+
+        self.assertEqual(self._order("order-1", seat=2).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(self._order("order-2", seat=2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._order("x" * 256).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_failed_request_is_not_stored(self):
+        self._order("first")
+        res = self._order("second")
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(IdempotencyKey.objects.filter(key="second").exists())
+
+    def test_expired_keys(self):
+        self._order("order-1")
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._order("order-1", seat=2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("1 expired", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+def failing_job(reason):
+    raise RuntimeError(reason)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="jobs@example.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        country = Country.objects.create(name="Ukraine")
+        city = City.objects.create(name="Kyiv", country=country)
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Boryspil", city=city),
+            destination=Airport.objects.create(name="Zhuliany", city=city),
+            distance=30,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="UR-1", rows=10, seats_in_rows=6,
+                airplane_type=AirplaneType.objects.create(name="Boeing"),
+            ),
+            departure_time=timezone.now() + timedelta(days=1),
+            arrival_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+
+    def _book(self, *seats):
+        tickets = [{"flight": self.flight.pk, "row_number": 1, "seat_number": seat} for seat in seats]
+        return self.client.post(reverse("airport:order-list"), {"tickets": tickets}, format="json")
+
+    def test_order_confirmation_runs_in_worker(self):
+        self.assertEqual(self._book(1, 2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._book(2).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        out = StringIO()
+        call_command("run_worker", once=True, stdout=out)
+        self.assertIn("1 of 1 jobs succeeded", out.getvalue())
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(mail.outbox[0].to, ["jobs@example.com"])
+        self.assertIn("Boryspil - Zhuliany", mail.outbox[0].body)
+        self.assertIn("row 1, seat 2", mail.outbox[0].body)
+
+    def test_order_confirmation_queries_do_not_grow_with_tickets(self):
+        self._book(1, 2, 3, 4)
+        order = Order.objects.get()
+        with self.assertNumQueries(2):
+            send_order_confirmation(order.pk)
+        self.assertEqual(mail.outbox[0].body.count("Boryspil - Zhuliany"), 4)
+
+    def test_claimed_jobs_are_leased(self):
+        job = enqueue(send_order_confirmation, order_id=0)
+        self.assertEqual(claim_jobs(), [job])
+        self.assertEqual(claim_jobs(), [])
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(claim_jobs()[0].attempts, 2)
+
+    def test_failed_jobs_back_off_then_die(self):
+        job = enqueue(failing_job, max_attempts=2, reason="boom")
+        with self.assertLogs("airport.jobs", "WARNING"):
+            self.assertEqual(run_batch(), (1, 0))
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS / 2 - 1))
+        self.assertIn("RuntimeError: boom", job.last_error)
+        self.assertEqual(run_batch(), (0, 0))
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("airport.jobs", "ERROR"):
+            self.assertEqual(run_batch(), (1, 0))
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.name, dead.payload, dead.attempts), ("airport.tests.failing_job", {"reason": "boom"}, 2))
+
+        self.assertEqual(requeue_dead_jobs(), 1)
+        self.assertEqual(Job.objects.get().attempts, 0)
+        self.assertFalse(DeadJob.objects.exists())
+
+
+def png_upload(name="plane.png", color="red", size=(800, 400)):
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class AirplaneImageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = self.settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create_user(email="staff@example.com", password="12345", is_staff=True)
+        )
+        airplane_type = AirplaneType.objects.create(name="Boeing")
+        self.first = Airplane.objects.create(name="UR-1", rows=10, seats_in_rows=6, airplane_type=airplane_type)
+        self.second = Airplane.objects.create(name="UR-2", rows=10, seats_in_rows=6, airplane_type=airplane_type)
+
+    def _upload(self, airplane, upload):
+        url = reverse("airport:airplane-upload-image", args=[airplane.pk])
+        return self.client.post(url, {"image": upload}, format="multipart")
+
+    def test_upload_is_stored_once_per_content(self):
+        response = self._upload(self.first, png_upload())
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["image_variants"], {})
+        self.assertEqual(self._upload(self.second, png_upload("copy.png")).status_code, status.HTTP_202_ACCEPTED)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.image.name, self.second.image.name)
+        self.assertTrue(self.first.image.name.endswith(f"{self.first.image_hash}.png"))
+        self.assertEqual(len(list(Path(self.media).rglob("*.png"))), 1)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_worker_encodes_variants(self):
+        self._upload(self.first, png_upload())
+        self.assertEqual(run_batch(), (1, 1))
+
+        self.first.refresh_from_db()
+        self.assertEqual(set(self.first.image_variants), {"thumb", "medium"})
+        with Image.open(Path(self.media) / self.first.image_variants["thumb"]["webp"]) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ("WEBP", (160, 80)))
+        with Image.open(Path(self.media) / self.first.image_variants["medium"]["jpeg"]) as medium:
+            self.assertEqual((medium.format, medium.size), ("JPEG", (640, 320)))
+
+        response = self.client.get(reverse("airport:airplane-detail", args=[self.first.pk]))
+        self.assertTrue(response.data["image_variants"]["thumb"]["webp"].startswith("http://testserver/"))
+
+        # Variants of content that was encoded already are reused without a job
+        response = self._upload(self.second, png_upload("copy.png"))
+        self.assertEqual(response.data["image_variants"], self.client.get(
+            reverse("airport:airplane-detail", args=[self.first.pk])
+        ).data["image_variants"])
+        self.assertFalse(Job.objects.exists())
+
+    def test_variants_use_the_storage_api(self):
+        # A storage without local paths, like the remote ones
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+        with self.settings(STORAGES=storages):
+            self._upload(self.first, png_upload())
+            self.assertEqual(run_batch(), (1, 1))
+            self.first.refresh_from_db()
+            with default_storage.open(self.first.image_variants["thumb"]["webp"]) as file, \
+                    Image.open(file) as thumb:
+                self.assertEqual((thumb.format, thumb.size), ("WEBP", (160, 80)))
+        self.assertFalse(any(Path(self.media).rglob("*.*")))
+
+    def test_invalid_upload_is_rejected(self):
+        upload = SimpleUploadedFile("plane.png", b"not an image", content_type="image/png")
+        response = self._upload(self.first, upload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(any(Path(self.media).rglob("*.*")))
+
+    def test_upload_requires_staff(self):
+        self.client.force_authenticate(user=User.objects.create_user(email="user@example.com", password="12345"))
+        self.assertEqual(self._upload(self.first, png_upload()).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SlidingWindowThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="throttle@example.com", password="12345")
+        self.request = SimpleNamespace(user=self.user)
+
+    def _throttle(self, now):
+        with mock.patch.object(UserSlidingWindowThrottle, "THROTTLE_RATES", {"user": "2/min"}):
+            throttle = UserSlidingWindowThrottle()
+        throttle.timer = lambda: now
+        return throttle
+
+    def test_previous_window_is_weighted(self):
+        for store in ("airport.throttling.CacheStore", "airport.throttling.DatabaseStore"):
+            cache.clear()
+            ThrottleCounter.objects.all().delete()
+            with self.subTest(store=store), override_settings(THROTTLE_STORE=store):
+                self.assertTrue(self._throttle(600).allow_request(self.request, None))
+                self.assertTrue(self._throttle(610).allow_request(self.request, None))
+                throttle = self._throttle(620)
+                self.assertFalse(throttle.allow_request(self.request, None))
+                self.assertEqual(throttle.wait(), 40)
+
+                # Halfway through the next window half of the previous count remains
+                self.assertTrue(self._throttle(690).allow_request(self.request, None))
+                throttle = self._throttle(691)
+                self.assertFalse(throttle.allow_request(self.request, None))
+                self.assertAlmostEqual(throttle.wait(), 29)
+
+    def test_cache_failure_falls_back_to_database(self):
+        with mock.patch("airport.throttling.cache.incr", side_effect=ConnectionError), \
+                mock.patch("airport.throttling.cache.decr", side_effect=ConnectionError), \
+                self.assertLogs("airport.throttling", "WARNING"):
+            for now in (600, 610):
+                throttle = self._throttle(now)
+                self.assertIsInstance(throttle.store, CacheStore)
+                self.assertTrue(throttle.allow_request(self.request, None))
+            # The rejected request is taken back from the database counter too
+            self.assertFalse(self._throttle(620).allow_request(self.request, None))
+        counter = ThrottleCounter.objects.get()
+        self.assertEqual((counter.window, counter.current), (10, 2))
+        self.assertIsNone(cache.get(f"{counter.key}:10"))
+
+        ThrottleCounter.objects.update(expires_at=timezone.now())
+        out = StringIO()
+        call_command("purge_throttle_counters", stdout=out)
+        self.assertIn("1 expired throttle counters deleted", out.getvalue())
+
+    def test_endpoint_scopes(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        rates = {"order_create": "1/min", "flight_list": "100/min"}
+        with mock.patch.object(ScopedSlidingWindowThrottle, "THROTTLE_RATES", rates):
+            self.assertEqual(client.post(reverse("airport:order-list"), {}, format="json").status_code, 400)
+            response = client.post(reverse("airport:order-list"), {}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertIn("Retry-After", response)
+            self.assertEqual(client.get(reverse("airport:flight-list")).status_code, status.HTTP_200_OK)
+            self.assertEqual(client.get(reverse("airport:order-list")).status_code, status.HTTP_200_OK)
@@ -0,0 +1,199 @@
+"""
+Request throttles sharing their counters between all app workers.
+
+DRF's throttles keep a list of request timestamps per client in the
+default cache and rewrite it on every request. With the local-memory
+cache each worker process counts on its own, so the real limit is the
+configured one times the number of workers.
+
+These throttles use a sliding window counter instead: one counter per
+client and fixed window, and the estimate
+
+    previous window count * share of the previous window still covered
+    + current window count
+
+A request costs one atomic increment of the current counter and one read
+of the previous one, which is no longer written. The counters live in
+the store named by the THROTTLE_STORE setting: CacheStore (the default
+cache, shared when it is Redis) or DatabaseStore (the ThrottleCounter
+table, one upsert per request). CacheStore falls back to the database
+while the cache is unavailable.
+
+Limits can be set per endpoint with a throttle_scope on the view, either
+a scope name or a mapping of view action to scope name, for example
+{"create": "order_create"}. The scopes' rates are taken from
+DEFAULT_THROTTLE_RATES, as for DRF's ScopedRateThrottle.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+from airport.models import ThrottleCounter
+
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseStore:
+    """Counters in the ThrottleCounter table, updated with one upsert per request."""
+
+    def hit(self, key, window, duration):
+        """Count a request in window, return (previous, current) window counts."""
+        expires = timezone.now() + timedelta(seconds=2 * duration)
+        table = connection.ops.quote_name(ThrottleCounter._meta.db_table)
+        key_, window_, previous, current, expires_at = (
+            connection.ops.quote_name(column)
+            for column in ("key", "window", "previous", "current", "expires_at")
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({key_}, {window_}, {previous}, {current}, {expires_at})
+                VALUES (%s, %s, 0, 1, %s)
+                ON CONFLICT ({key_}) DO UPDATE SET
+                    {previous} = CASE
+                        WHEN {table}.{window_} = EXCLUDED.{window_} THEN {table}.{previous}
+                        WHEN {table}.{window_} = EXCLUDED.{window_} - 1 THEN {table}.{current}
+                        ELSE 0
+                    END,
+                    {current} = CASE
+                        WHEN {table}.{window_} = EXCLUDED.{window_} THEN {table}.{current} + 1
+                        ELSE 1
+                    END,
+                    {window_} = EXCLUDED.{window_},
+                    {expires_at} = EXCLUDED.{expires_at}
+                RETURNING {previous}, {current}
+                """,
+                [key, window, connection.ops.adapt_datetimefield_value(expires)],
+            )
+            return cursor.fetchone()
+
+    def undo(self, key, window):
+        """Take back a request counted by hit()."""
+        ThrottleCounter.objects.filter(key=key, window=window, current__gt=0).update(
+            current=F("current") - 1
+        )
+
+
+class CacheStore:
+    """Counters in the default cache, one key per client and window."""
+
+    fallback = DatabaseStore()
+
+    def hit(self, key, window, duration):
+        current_key = f"{key}:{window}"
+        try:
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                # First request of the window, or a concurrent one created the key
+                current = 1 if cache.add(current_key, 1, 2 * duration) else cache.incr(current_key)
+            return cache.get(f"{key}:{window - 1}", 0), current
+        except Exception:
+            logger.warning("Throttle cache unavailable, counting in the database", exc_info=True)
+            return self.fallback.hit(key, window, duration)
+
+    def undo(self, key, window):
+        try:
+            cache.decr(f"{key}:{window}")
+        except ValueError:
+            pass
+        except Exception:
+            self.fallback.undo(key, window)
+
+
+def purge_expired_counters(chunk_size=1000):
+    """Delete expired database counters in chunks, return how many were deleted."""
+    deleted = 0
+    while True:
+        pks = list(
+            ThrottleCounter.objects.filter(expires_at__lte=timezone.now())
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not pks:
+            return deleted
+        deleted += ThrottleCounter.objects.filter(pk__in=pks).delete()[0]
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle counting requests in sliding windows of the throttle store."""
+
+    @cached_property
+    def store(self):
+        # Resolved on use rather than on import, so THROTTLE_STORE can be overridden
+        return import_string(getattr(settings, "THROTTLE_STORE", "airport.throttling.DatabaseStore"))()
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        window, self.offset = divmod(self.timer(), self.duration)
+        window = int(window)
+        self.previous, current = self.store.hit(self.key, window, self.duration)
+        self.estimate = self.previous * (1 - self.offset / self.duration) + current
+        if self.estimate <= self.num_requests:
+            return True
+        # Rejected requests do not use up the allowance
+        self.store.undo(self.key, window)
+        return False
+
+    def wait(self):
+        """Seconds until the estimate leaves room for one more request."""
+        remaining = self.duration - self.offset
+        if self.previous:
+            wait = (self.estimate - self.num_requests) * self.duration / self.previous
+            if wait <= remaining:
+                return wait
+        return remaining
+
+
+class AnonSlidingWindowThrottle(SlidingWindowThrottle, AnonRateThrottle):
+    """Limits anonymous users by IP address, rate of the "anon" scope."""
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle, UserRateThrottle):
+    """Limits users by id (anonymous ones by IP address), rate of the "user" scope."""
+
+
+class ScopedSlidingWindowThrottle(SlidingWindowThrottle):
+    """Limits the endpoints with a throttle_scope, per user or IP address."""
+
+    scope_attr = "throttle_scope"
+
+    def __init__(self):
+        # The scope and its rate depend on the view, they are set in allow_request()
+        pass
+
+    def get_view_scope(self, view):
+        scope = getattr(view, self.scope_attr, None)
+        if isinstance(scope, dict):
+            return scope.get(getattr(view, "action", None))
+        return scope
+
+    def allow_request(self, request, view):
+        self.scope = self.get_view_scope(view)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
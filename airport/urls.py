@@ -2,6 +2,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import routers
+
+from airport import async_views
 from airport.views import (
     CountryViewSet,
     CityViewSet,
@@ -12,6 +14,10 @@ from airport.views import (
     RouteViewSet,
     FlightViewSet,
     OrderViewSet,
+    TicketViewSet,
+    ItineraryViewSet,
+    SearchViewSet,
+    CacheStatsViewSet,
 )
 
 
@@ -25,9 +31,30 @@ router.register("crews", CrewViewSet, basename="crew")
 router.register("routes", RouteViewSet, basename="route")
 router.register("flights", FlightViewSet, basename="flight")
 router.register("orders", OrderViewSet, basename="order")
+router.register("tickets", TicketViewSet, basename="ticket")
+router.register("itineraries", ItineraryViewSet, basename="itinerary")
+router.register("search", SearchViewSet, basename="search")
+router.register("cache-stats", CacheStatsViewSet, basename="cache-stats")
+
+# Async read endpoints for ASGI deployments, same responses as their sync counterparts
+async_urlpatterns = [
+    path("flights/", async_views.flight_list, name="async-flight-list"),
+    path("flights/<int:pk>/", async_views.flight_detail, name="async-flight-detail"),
+    path("flights/<int:pk>/seats/", async_views.flight_seats, name="async-flight-seats"),
+    path("airports/", async_views.airport_list, name="async-airport-list"),
+    path("airports/<int:pk>/", async_views.airport_detail, name="async-airport-detail"),
+    path("routes/", async_views.route_list, name="async-route-list"),
+    path("routes/<int:pk>/", async_views.route_detail, name="async-route-detail"),
+]
 
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "flights/<int:pk>/availability/stream/",
+        async_views.flight_availability_stream,
+        name="flight-availability-stream",
+    ),
+    path("async/", include(async_urlpatterns)),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 app_name = "airport"
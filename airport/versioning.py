@@ -0,0 +1,43 @@
+"""
+Shared version counters for per-process in-memory indexes.
+
+Each worker keeps its own copy of an index together with the version it
+was built at. Writers bump the version in the shared cache, readers
+rebuild when their copy is behind. Counters start at a random value so
+that a flushed cache can never bring back a version an old copy was
+built at.
+"""
+import random
+
+from django.core.cache import cache
+
+
+def _key(name):
+    return f"index_version:{name}"
+
+
+def _initial():
+    return random.randint(1, 2 ** 31)
+
+
+def get_versions(*names):
+    keys = {_key(name): name for name in names}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial(), None)
+        found[key] = cache.get(key)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def get_version(name):
+    return get_versions(name)[name]
+
+
+def bump_version(name):
+    """Increment a version and return the new value."""
+    key = _key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial(), None)
+        return cache.incr(key)
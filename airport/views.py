@@ -1,10 +1,44 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework import viewsets, mixins
+from django.db.models import Prefetch, Q
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from airport.autocomplete import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, autocomplete_index
+from airport.boards import ARRIVALS, BOARD_HOURS, BOARD_MAX_HOURS, DEPARTURES, get_board
+from airport.booking import hold_seats
+from airport.caching import CachedResponseMixin, cache_stats
+from airport.exports import (
+    EXPORT_RENDERERS,
+    FLIGHT_EXPORT_FIELDS,
+    ORDER_EXPORT_FIELDS,
+    TICKET_EXPORT_FIELDS,
+    stream_export,
+)
+from airport.holds import held_seats
+from airport.idempotency import IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_KEY_TTL, IdempotentCreateMixin
+from airport.images import set_airplane_image
+from airport.itineraries import connection_index
+from airport.nearby import NEARBY_MAX_RADIUS_KM, NEARBY_RADIUS_KM, nearby_index
+from airport.pagination import FlightPagination, OrderPagination
 from airport.permissions import IsStaffUser, IsStaffOrOwner
+from airport.readers import (
+    AirportReader,
+    FlightReader,
+    LeanListMixin,
+    OrderReader,
+    RouteReader,
+)
+from airport.shaping import SHAPE_PARAMETERS, ShapedResponseMixin
+from airport.seat_map import get_seat_map
 
 
 from airport.models import (
@@ -17,6 +51,7 @@ from airport.models import (
     Route,
     Flight,
     Order,
+    Ticket,
 )
 from airport.serializers import (
     CountrySerializer,
@@ -28,16 +63,74 @@ from airport.serializers import (
     OrderSerializer,
     AirplaneTypeSerializer,
     AirplaneSerializer,
+    AirplaneImageSerializer,
     OrderListSerializer,
+    SeatHoldSerializer,
 )
 
 
+def int_param(params, name, default, low, high):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: "A valid integer is required."})
+    if not low <= value <= high:
+        raise ValidationError({name: f"Must be between {low} and {high}."})
+    return value
+
+
+def float_param(params, name, low, high, default=None):
+    value = params.get(name, default)
+    if value is None:
+        raise ValidationError({name: "This query parameter is required."})
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValidationError({name: "A valid number is required."})
+    if not low <= value <= high:
+        raise ValidationError({name: f"Must be between {low} and {high}."})
+    return value
+
+
+def datetime_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "A valid ISO 8601 datetime is required."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+BOARD_PARAMETERS = [
+    OpenApiParameter(
+        "from",
+        OpenApiTypes.DATETIME,
+        description="Start of the window (default: the current minute)",
+        required=False,
+    ),
+    OpenApiParameter(
+        "to",
+        OpenApiTypes.DATETIME,
+        description=f"End of the window (default: {BOARD_HOURS} hours after its start, "
+                    f"at most {BOARD_MAX_HOURS} hours after it)",
+        required=False,
+    ),
+]
+
+
 @extend_schema(
     tags=["Country"],
     description="Retrieve list of countries or a single country by ID. "
                 "Read-only access for all users; creation, update, deletion via admin panel only.",
 )
 class CountryViewSet(
+    CachedResponseMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
@@ -49,15 +142,22 @@ class CountryViewSet(
 
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
+    cache_namespace = "country"
     permission_classes = (AllowAny,)
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SHAPE_PARAMETERS),
+    retrieve=extend_schema(parameters=SHAPE_PARAMETERS),
+)
 @extend_schema(
     tags=["City"],
     description="Retrieve list of cities or a single city by ID. "
                 "Read-only access for all users; creation, update, deletion via admin panel only.",
 )
 class CityViewSet(
+    CachedResponseMixin,
+    ShapedResponseMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
@@ -69,15 +169,20 @@ class CityViewSet(
 
     queryset = City.objects.select_related("country").all()
     serializer_class = CitySerializer
+    cache_namespace = "city"
     permission_classes = (AllowAny,)
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SHAPE_PARAMETERS),
+    retrieve=extend_schema(parameters=SHAPE_PARAMETERS),
+)
 @extend_schema(
     tags=["Airport"],
     description="List and retrieve airports available for all users. "
                 "Create, update, and delete allowed only for staff users.",
 )
-class AirportViewSet(viewsets.ModelViewSet):
+class AirportViewSet(CachedResponseMixin, ShapedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """
     List and retrieve allowed for any user.
     Create, update, delete allowed only for staff users.
@@ -85,19 +190,97 @@ class AirportViewSet(viewsets.ModelViewSet):
 
     queryset = Airport.objects.select_related("city").all()
     serializer_class = AirportSerializer
+    lean_reader = AirportReader()
+    cache_namespace = "airport"
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "nearby", "departures", "arrivals"]:
             return [AllowAny()]
         return [IsStaffUser()]
 
+    @extend_schema(
+        description="Airports within a radius of a point, nearest first, "
+                    "with their great-circle distance in km.",
+        parameters=[
+            OpenApiParameter("lat", OpenApiTypes.FLOAT, description="Latitude (-90 to 90)", required=True),
+            OpenApiParameter("lon", OpenApiTypes.FLOAT, description="Longitude (-180 to 180)", required=True),
+            OpenApiParameter(
+                "radius_km",
+                OpenApiTypes.FLOAT,
+                description=f"Search radius in km (default {NEARBY_RADIUS_KM}, max {NEARBY_MAX_RADIUS_KM})",
+                required=False,
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description="Maximum number of airports (1-100, default 20)",
+                required=False,
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["get"])
+    def nearby(self, request):
+        params = request.query_params
+        lat = float_param(params, "lat", -90, 90)
+        lon = float_param(params, "lon", -180, 180)
+        radius_km = float_param(params, "radius_km", 0, NEARBY_MAX_RADIUS_KM, default=NEARBY_RADIUS_KM)
+        limit = int_param(params, "limit", 20, 1, 100)
+
+        found = nearby_index.nearby(lat, lon, radius_km, limit)
+        airports = self.queryset.in_bulk([pk for pk, _ in found])
+        return Response({"results": [
+            {**AirportSerializer(airports[pk]).data, "distance_km": round(distance, 1)}
+            for pk, distance in found
+            if pk in airports
+        ]})
+
+    def _board(self, kind):
+        params = self.request.query_params
+        start, end = datetime_param(params, "from"), datetime_param(params, "to")
+        if end is not None:
+            window = end - (start or timezone.now())
+            if window.total_seconds() <= 0:
+                raise ValidationError({"to": "Must be later than the start of the window."})
+            if window > timedelta(hours=BOARD_MAX_HOURS):
+                raise ValidationError({"to": f"The window cannot exceed {BOARD_MAX_HOURS} hours."})
+
+        try:
+            airport_id = int(self.kwargs["pk"])
+        except ValueError:
+            raise Http404
+        flights = get_board(airport_id, kind, start, end)
+        if flights is None:
+            raise Http404
+        return Response({"results": flights})
+
+    @extend_schema(
+        description="Flights leaving the airport in a time window, ordered by departure. "
+                    "Cached per minute.",
+        parameters=BOARD_PARAMETERS,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=True, methods=["get"])
+    def departures(self, request, pk=None):
+        return self._board(DEPARTURES)
+
+    @extend_schema(
+        description="Flights reaching the airport in a time window, ordered by arrival. "
+                    "Cached per minute.",
+        parameters=BOARD_PARAMETERS,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=True, methods=["get"])
+    def arrivals(self, request, pk=None):
+        return self._board(ARRIVALS)
+
 
 @extend_schema(
     tags=["AirplaneType"],
     description="List and retrieve airplane types for all users. "
                 "Create, update, and delete allowed only for staff users.",
 )
-class AirplaneTypeViewSet(viewsets.ModelViewSet):
+class AirplaneTypeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     List and retrieve allowed for any user.
     Create, update, delete allowed only for staff users.
@@ -105,6 +288,7 @@ class AirplaneTypeViewSet(viewsets.ModelViewSet):
 
     queryset = AirplaneType.objects.all()
     serializer_class = AirplaneTypeSerializer
+    cache_namespace = "airplane-type"
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -112,12 +296,16 @@ class AirplaneTypeViewSet(viewsets.ModelViewSet):
         return [IsStaffUser()]
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SHAPE_PARAMETERS),
+    retrieve=extend_schema(parameters=SHAPE_PARAMETERS),
+)
 @extend_schema(
     tags=["Airplane"],
     description="List and retrieve airplanes for all users. "
                 "Create, update, and delete allowed only for staff users.",
 )
-class AirplaneViewSet(viewsets.ModelViewSet):
+class AirplaneViewSet(CachedResponseMixin, ShapedResponseMixin, viewsets.ModelViewSet):
     """
     List and retrieve allowed for any user.
     Create, update, delete allowed only for staff users.
@@ -125,19 +313,38 @@ class AirplaneViewSet(viewsets.ModelViewSet):
 
     queryset = Airplane.objects.select_related("airplane_type").all()
     serializer_class = AirplaneSerializer
+    cache_namespace = "airplane"
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
             return [AllowAny()]
         return [IsStaffUser()]
 
+    @extend_schema(
+        request={"multipart/form-data": AirplaneImageSerializer},
+        responses={202: AirplaneSerializer},
+        description="Upload an airplane image (staff only). The original is stored right away, "
+                    "the thumb and medium WebP/JPEG variants appear in image_variants once "
+                    "a worker has encoded them.",
+    )
+    @action(detail=True, methods=["post"], url_path="upload-image", parser_classes=[MultiPartParser])
+    def upload_image(self, request, pk=None):
+        airplane = self.get_object()
+        serializer = AirplaneImageSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        set_airplane_image(airplane, serializer.validated_data["image"])
+        return Response(
+            AirplaneSerializer(airplane, context=self.get_serializer_context()).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
 
 @extend_schema(
     tags=["Crew"],
     description="List and retrieve crew members for all users. "
                 "Create, update, and delete allowed only for staff users.",
 )
-class CrewViewSet(viewsets.ModelViewSet):
+class CrewViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     List and retrieve allowed for any user.
     Create, update, delete allowed only for staff users.
@@ -145,6 +352,7 @@ class CrewViewSet(viewsets.ModelViewSet):
 
     queryset = Crew.objects.all()
     serializer_class = CrewSerializer
+    cache_namespace = "crew"
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -152,19 +360,25 @@ class CrewViewSet(viewsets.ModelViewSet):
         return [IsStaffUser()]
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SHAPE_PARAMETERS),
+    retrieve=extend_schema(parameters=SHAPE_PARAMETERS),
+)
 @extend_schema(
     tags=["Route"],
     description="List and retrieve routes for all users. "
                 "Create, update, and delete allowed only for staff users.",
 )
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(CachedResponseMixin, ShapedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """
     List and retrieve allowed for any user.
     Create, update, delete allowed only for staff users.
     """
 
-    queryset = Route.objects.select_related("source", "destination").all()
+    queryset = Route.objects.select_related("source__city", "destination__city").all()
     serializer_class = RouteSerializer
+    lean_reader = RouteReader()
+    cache_namespace = "route"
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -172,12 +386,74 @@ class RouteViewSet(viewsets.ModelViewSet):
         return [IsStaffUser()]
 
 
+EXPORT_FORMAT_PARAMETER = OpenApiParameter(
+    "format",
+    OpenApiTypes.STR,
+    enum=["ndjson", "csv"],
+    description="Export format (default ndjson). Without it the Accept header picks the format: "
+                "text/csv for CSV, NDJSON for application/x-ndjson, application/json and */*.",
+    required=False,
+)
+
+
+def filter_flights(queryset, params):
+    """Apply the flight list query parameter filters to a queryset."""
+    route_id = params.get("route")
+    airplane_id = params.get("airplane")
+    departure_after = params.get("departure_after")
+    departure_before = params.get("departure_before")
+
+    if route_id:
+        try:
+            route_id = int(route_id)
+            queryset = queryset.filter(route_id=route_id)
+        except ValueError:
+            pass
+
+    if airplane_id:
+        try:
+            airplane_id = int(airplane_id)
+            queryset = queryset.filter(airplane_id=airplane_id)
+        except ValueError:
+            pass
+
+    if departure_after:
+        try:
+            departure_after_date = datetime.strptime(departure_after, "%Y-%m-%d")
+            queryset = queryset.filter(departure_time__gte=departure_after_date)
+        except ValueError:
+            pass
+
+    if departure_before:
+        try:
+            departure_before_date = datetime.strptime(departure_before, "%Y-%m-%d")
+            queryset = queryset.filter(departure_time__lte=departure_before_date)
+        except ValueError:
+            pass
+
+    return queryset
+
+
+def seat_map_data(flight):
+    seat_map = get_seat_map(flight)
+    return {
+        "flight": flight.id,
+        "rows": seat_map.rows,
+        "seats_in_rows": seat_map.seats_in_rows,
+        "seats_taken": seat_map.taken_count,
+        "seats_available": seat_map.capacity - seat_map.taken_count,
+        "seats": seat_map.grid(),
+        "held": sorted(held_seats(flight.id)),
+    }
+
+
+@extend_schema_view(retrieve=extend_schema(parameters=SHAPE_PARAMETERS))
 @extend_schema(
     tags=["Flight"],
     description="List and retrieve flights for all users. "
                 "Create, update, and delete allowed only for staff users.",
 )
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(ShapedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """
     List and retrieve allowed for any user.
     Create, update, delete allowed only for staff users.
@@ -186,50 +462,24 @@ class FlightViewSet(viewsets.ModelViewSet):
     queryset = Flight.objects.all().select_related(
         "route",
         "airplane"
-    ).prefetch_related("crew")
+    ).prefetch_related(Prefetch("crew", queryset=Crew.objects.order_by("id")))
     serializer_class = FlightSerializer
+    pagination_class = FlightPagination
+    lean_reader = FlightReader()
+    throttle_scope = {"list": "flight_list"}
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "seats"]:
             return [AllowAny()]
+        if self.action == "holds":
+            return [IsAuthenticated()]
         return [IsStaffUser()]
 
     def get_queryset(self):
-        queryset = self.queryset
-        route_id = self.request.query_params.get("route")
-        airplane_id = self.request.query_params.get("airplane")
-        departure_after = self.request.query_params.get("departure_after")
-        departure_before = self.request.query_params.get("departure_before")
-
-        if route_id:
-            try:
-                route_id = int(route_id)
-                queryset = queryset.filter(route_id=route_id)
-            except ValueError:
-                pass
-
-        if airplane_id:
-            try:
-                airplane_id = int(airplane_id)
-                queryset = queryset.filter(airplane_id=airplane_id)
-            except ValueError:
-                pass
-
-        if departure_after:
-            try:
-                departure_after_date = datetime.strptime(departure_after, "%Y-%m-%d")
-                queryset = queryset.filter(departure_time__gte=departure_after_date)
-            except ValueError:
-                pass
-
-        if departure_before:
-            try:
-                departure_before_date = datetime.strptime(departure_before, "%Y-%m-%d")
-                queryset = queryset.filter(departure_time__lte=departure_before_date)
-            except ValueError:
-                pass
+        if self.action in ("seats", "holds"):
+            return Flight.objects.select_related("airplane")
 
-        return queryset
+        return filter_flights(self.queryset, self.request.query_params)
 
     @extend_schema(
         parameters=[
@@ -257,11 +507,52 @@ class FlightViewSet(viewsets.ModelViewSet):
                 description="Filter flights with departure time on or before the date (YYYY-MM-DD)",
                 required=False,
             ),
+            *SHAPE_PARAMETERS,
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        description="Seat map of the flight: a rows x seats_in_rows grid "
+                    "where true marks a taken seat, plus the [row, seat] pairs "
+                    "currently held.",
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=True, methods=["get"])
+    def seats(self, request, pk=None):
+        return Response(seat_map_data(self.get_object()))
+
+    @extend_schema(
+        description="Temporarily hold seats of the flight for the current user. "
+                    "The hold id can then be passed to order creation.",
+        request=SeatHoldSerializer,
+        responses={201: SeatHoldSerializer},
+    )
+    @action(detail=True, methods=["post"])
+    def holds(self, request, pk=None):
+        flight = self.get_object()
+        serializer = SeatHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        seats = [
+            (seat["row_number"], seat["seat_number"])
+            for seat in serializer.validated_data["seats"]
+        ]
+        hold = hold_seats(request.user, flight, seats, serializer.validated_data["minutes"])
+        return Response(SeatHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        description="Stream all flights matching the list filters as NDJSON or CSV. Staff only.",
+        parameters=[EXPORT_FORMAT_PARAMETER],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        queryset = filter_flights(Flight.objects.order_by("pk"), request.query_params)
+        return stream_export(
+            queryset, FLIGHT_EXPORT_FIELDS, request.accepted_renderer.format, "flights"
+        )
+
 
 @extend_schema(
     tags=["Order"],
@@ -271,7 +562,24 @@ class FlightViewSet(viewsets.ModelViewSet):
     request=OrderSerializer,
     responses={200: OrderListSerializer},
 )
+@extend_schema_view(
+    list=extend_schema(parameters=SHAPE_PARAMETERS),
+    create=extend_schema(parameters=[
+        OpenApiParameter(
+            IDEMPOTENCY_KEY_HEADER,
+            OpenApiTypes.STR,
+            location=OpenApiParameter.HEADER,
+            description="Client-chosen key; retrying with the same key and body replays the "
+                        f"original response for {IDEMPOTENCY_KEY_TTL.total_seconds() / 3600:g} hours "
+                        "instead of creating another order",
+            required=False,
+        ),
+    ]),
+)
 class OrderViewSet(
+    ShapedResponseMixin,
+    LeanListMixin,
+    IdempotentCreateMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     viewsets.GenericViewSet,
@@ -282,11 +590,235 @@ class OrderViewSet(
     """
 
     permission_classes = [IsAuthenticated, IsStaffOrOwner]
+    pagination_class = OrderPagination
+    lean_reader = OrderReader()
+    throttle_scope = {"create": "order_create"}
+
+    def get_permissions(self):
+        if self.action == "export":
+            return [IsStaffUser()]
+        return super().get_permissions()
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related("tickets__flight")
+        return Order.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch("tickets", queryset=Ticket.objects.select_related("flight").order_by("id"))
+        )
 
     def get_serializer_class(self):
         if self.action == "list":
             return OrderListSerializer
         return OrderSerializer
+
+    @extend_schema(
+        description="Stream all orders as NDJSON or CSV. Staff only.",
+        parameters=[
+            EXPORT_FORMAT_PARAMETER,
+            OpenApiParameter(
+                "created_after",
+                OpenApiTypes.DATE,
+                description="Only orders created on or after the date (YYYY-MM-DD)",
+                required=False,
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        queryset = Order.objects.order_by("pk")
+        created_after = request.query_params.get("created_after")
+        if created_after:
+            try:
+                queryset = queryset.filter(
+                    created_at__gte=datetime.strptime(created_after, "%Y-%m-%d")
+                )
+            except ValueError:
+                pass
+        return stream_export(
+            queryset, ORDER_EXPORT_FIELDS, request.accepted_renderer.format, "orders"
+        )
+
+
+@extend_schema(tags=["Ticket"])
+class TicketViewSet(viewsets.GenericViewSet):
+    """Ticket exports, accessible for staff users only."""
+
+    queryset = Ticket.objects.all()
+    permission_classes = (IsStaffUser,)
+
+    @extend_schema(
+        description="Stream all tickets as NDJSON or CSV, optionally for one flight. Staff only.",
+        parameters=[
+            EXPORT_FORMAT_PARAMETER,
+            OpenApiParameter(
+                "flight",
+                OpenApiTypes.INT,
+                description="Only tickets of the flight (ex. ?flight=7)",
+                required=False,
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        queryset = Ticket.objects.order_by("pk")
+        flight_id = request.query_params.get("flight")
+        if flight_id:
+            try:
+                queryset = queryset.filter(flight_id=int(flight_id))
+            except ValueError:
+                pass
+        return stream_export(
+            queryset, TICKET_EXPORT_FIELDS, request.accepted_renderer.format, "tickets"
+        )
+
+
+@extend_schema(
+    tags=["Itinerary"],
+    description="Search connecting flight sequences between two airports or cities, "
+                "ranked by total travel time.",
+    parameters=[
+        OpenApiParameter(
+            "from",
+            OpenApiTypes.STR,
+            description="Origin airport ID, airport name or city name",
+            required=True,
+        ),
+        OpenApiParameter(
+            "to",
+            OpenApiTypes.STR,
+            description="Destination airport ID, airport name or city name",
+            required=True,
+        ),
+        OpenApiParameter(
+            "date",
+            OpenApiTypes.DATE,
+            description="Departure date of the first leg (YYYY-MM-DD)",
+            required=True,
+        ),
+        OpenApiParameter(
+            "max_legs",
+            OpenApiTypes.INT,
+            description="Maximum number of flights (1-4, default 3)",
+            required=False,
+        ),
+        OpenApiParameter(
+            "limit",
+            OpenApiTypes.INT,
+            description="Maximum number of itineraries (1-100, default 20)",
+            required=False,
+        ),
+    ],
+    responses={200: OpenApiTypes.OBJECT},
+)
+class ItineraryViewSet(viewsets.ViewSet):
+    """
+    Accessible for all users. Served from the in-memory connection index,
+    the flight table is only read when a departure day is first loaded.
+    """
+
+    permission_classes = (AllowAny,)
+
+    @staticmethod
+    def _resolve_airports(param, value):
+        if not value:
+            raise ValidationError({param: "This query parameter is required."})
+        if value.isdigit():
+            airport_ids = set(Airport.objects.filter(pk=int(value)).values_list("id", flat=True))
+        else:
+            airport_ids = set(
+                Airport.objects.filter(
+                    Q(name__iexact=value) | Q(city__name__iexact=value)
+                ).values_list("id", flat=True)
+            )
+        if not airport_ids:
+            raise ValidationError({param: f"No airport or city matches '{value}'."})
+        return airport_ids
+
+    def list(self, request):
+        params = request.query_params
+        origin_ids = self._resolve_airports("from", params.get("from"))
+        destination_ids = self._resolve_airports("to", params.get("to"))
+        try:
+            day = datetime.strptime(params.get("date", ""), "%Y-%m-%d").date()
+        except ValueError:
+            raise ValidationError({"date": "Date has wrong format. Use YYYY-MM-DD."})
+        max_legs = int_param(params, "max_legs", 3, 1, 4)
+        limit = int_param(params, "limit", 20, 1, 100)
+
+        itineraries = connection_index.search(
+            origin_ids, destination_ids, day, max_legs=max_legs, limit=limit
+        )
+        return Response([
+            {
+                "departure_time": legs[0].departure_time,
+                "arrival_time": legs[-1].arrival_time,
+                "duration_minutes": int(
+                    (legs[-1].arrival_time - legs[0].departure_time).total_seconds() // 60
+                ),
+                "legs": [
+                    {
+                        "flight": leg.flight_id,
+                        "route": leg.route_id,
+                        "source": leg.source_id,
+                        "destination": leg.destination_id,
+                        "departure_time": leg.departure_time,
+                        "arrival_time": leg.arrival_time,
+                    }
+                    for leg in legs
+                ],
+            }
+            for legs in itineraries
+        ])
+
+
+@extend_schema(
+    tags=["Search"],
+    description="Type-ahead search of airports, cities and countries by name prefix "
+                "(any word of the name), best matches first.",
+    parameters=[
+        OpenApiParameter(
+            "q",
+            OpenApiTypes.STR,
+            description="Beginning of the name (ex. ?q=bory)",
+            required=True,
+        ),
+        OpenApiParameter(
+            "limit",
+            OpenApiTypes.INT,
+            description=f"Maximum number of results (1-{AUTOCOMPLETE_MAX_LIMIT}, "
+                        f"default {AUTOCOMPLETE_LIMIT})",
+            required=False,
+        ),
+    ],
+    responses={200: OpenApiTypes.OBJECT},
+)
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Accessible for all users. Served from the in-memory autocomplete
+    index, the database is only searched when no name matches the prefix.
+    """
+
+    permission_classes = (AllowAny,)
+
+    def list(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+        limit = int_param(
+            request.query_params, "limit", AUTOCOMPLETE_LIMIT, 1, AUTOCOMPLETE_MAX_LIMIT
+        )
+        return Response({"results": autocomplete_index.search(query, limit)})
+
+
+@extend_schema(
+    tags=["Cache"],
+    description="Hit/miss counters of the API response cache per namespace. Staff only.",
+    responses={200: OpenApiTypes.OBJECT},
+)
+class CacheStatsViewSet(viewsets.ViewSet):
+    """Accessible for staff users only."""
+
+    permission_classes = (IsStaffUser,)
+
+    def list(self, request):
+        return Response(cache_stats())
@@ -26,7 +26,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 # SECURITY WARNING: don"t run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "True").lower() in ("1", "true", "yes")
 
 ALLOWED_HOSTS = ["*"]
 
@@ -39,7 +39,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "debug_toolbar",
     "rest_framework",
     "drf_spectacular",
 
@@ -49,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "airport.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -56,10 +56,13 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
-
 ]
 
+# The debug toolbar is a development aid only, it never runs with DEBUG off
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -94,6 +97,46 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# A shared Redis cache is used when REDIS_URL is set, so that cached responses,
+# invalidation and hit/miss counters are common to all app workers.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+API_CACHE_TIMEOUT = int(os.getenv("API_CACHE_TIMEOUT", 300))
+
+# Seat availability events reach the streams of every worker through Redis
+# pub/sub when it is available, otherwise only those of the publishing process
+SEAT_EVENTS_BROKER = (
+    "airport.events.RedisBroker" if os.getenv("REDIS_URL") else "airport.events.LocalBroker"
+)
+SEAT_EVENTS_REDIS_URL = os.getenv("REDIS_URL")
+
+# Throttle counters must be shared by all workers: they are kept in Redis
+# when it is available, otherwise in the database
+THROTTLE_STORE = os.getenv(
+    "THROTTLE_STORE",
+    "airport.throttling.CacheStore" if os.getenv("REDIS_URL") else "airport.throttling.DatabaseStore",
+)
+
+# Order confirmations are sent by the background worker (manage.py run_worker)
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "orders@airport.local")
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -138,16 +181,32 @@ AUTH_USER_MODEL = "user.User"
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "airport.throttling.AnonSlidingWindowThrottle",
+        "airport.throttling.UserSlidingWindowThrottle",
+        "airport.throttling.ScopedSlidingWindowThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "10/day", "user": "30/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "10/day",
+        "user": "30/day",
+        # Per endpoint limits, see throttle_scope on the views
+        "order_create": os.getenv("THROTTLE_ORDER_CREATE_RATE", "10/min"),
+        "flight_list": os.getenv("THROTTLE_FLIGHT_LIST_RATE", "120/min"),
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
+    "DEFAULT_PAGINATION_CLASS": "airport.pagination.KeysetPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", 20)),
 
 }
 
+# Seconds a user's id, email and flags are cached by CachedJWTAuthentication.
+# Saving or deleting a user drops the entry in the shared cache, but changes
+# made without save(), such as QuerySet.update(), stay unseen for up to this
+# long. Off (0) without Redis: a worker's local cache would not be told about
+# changes made by the others and serve a stale user for the whole period.
+AUTH_USER_CACHE_SECONDS = int(os.getenv("AUTH_USER_CACHE_SECONDS", 60 if os.getenv("REDIS_URL") else 0))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=10000),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=100),
@@ -156,3 +215,30 @@ SIMPLE_JWT = {
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# The airport.performance logger writes one JSON line per request at INFO,
+# requests slower than PERFORMANCE_SLOW_REQUEST_MS are logged as warnings.
+# The other airport loggers only output warnings unless LOG_LEVEL is lowered.
+
+PERFORMANCE_SLOW_REQUEST_MS = int(os.getenv("PERFORMANCE_SLOW_REQUEST_MS", 500))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "airport": {
+            "handlers": ["console"],
+            "level": os.getenv("LOG_LEVEL", "WARNING"),
+        },
+        "airport.performance": {
+            "handlers": ["console"],
+            "level": os.getenv("PERFORMANCE_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
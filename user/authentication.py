@@ -0,0 +1,85 @@
+"""
+JWT authentication without a user query per request.
+
+JWTAuthentication loads the whole user row on every authenticated
+request, although the API only looks at the user's id and flags. Here
+those fields are kept in the default cache for AUTH_USER_CACHE_SECONDS
+and the request user is built from them, with the other fields deferred
+(reading one of them loads it from the database).
+
+The cached entry is dropped whenever the user is saved or deleted (see
+user.signals), so a changed or deactivated user is seen on the next
+request. Updates that skip save(), such as QuerySet.update(), are only
+seen once the entry expires.
+
+That only holds when all workers share the cache, so the user is loaded
+from the database on every request unless AUTH_USER_CACHE_SECONDS is set,
+which the settings only do with Redis.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+USER_CACHE_SECONDS = getattr(settings, "AUTH_USER_CACHE_SECONDS", 0)
+CACHED_USER_FIELDS = ("id", "email", "is_staff", "is_superuser", "is_active")
+
+
+def user_cache_key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication building the user from a cached copy of a few of its fields."""
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or not USER_CACHE_SECONDS:
+            # Revocation checks need the current password hash
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            values = (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values(*CACHED_USER_FIELDS)
+                .first()
+            )
+            if values is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, values, USER_CACHE_SECONDS)
+
+        # from_db() takes the values in model field order
+        fields = [
+            field.attname for field in self.user_model._meta.concrete_fields
+            if field.attname in values
+        ]
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, fields, [values[field] for field in fields])
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """
+    Documents CachedJWTAuthentication in the OpenAPI schema. It takes the
+    same bearer tokens as JWTAuthentication, which the user profile still
+    uses, but needs a scheme name of its own.
+    """
+
+    target_class = CachedJWTAuthentication
+    name = "cachedJwtAuth"
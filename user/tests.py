@@ -1,14 +1,36 @@
+import logging
+import unittest
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from user.authentication import user_cache_key
+
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token_obtain_pair")
 TOKEN_REFRESH_URL = reverse("user:token_refresh")
 TOKEN_VERIFY_URL = reverse("user:token_verify")
 MANAGE_USER_URL = reverse("user:manage")
+ORDER_LIST_URL = reverse("airport:order-list")
+
+
+def setUpModule():
+    # Keep the per-request log lines out of the test output; without any
+    # handler the slow request warnings would still reach logging.lastResort
+    request_logger = logging.getLogger("airport.performance")
+    for request_log in (
+        mock.patch.object(request_logger, "handlers", [logging.NullHandler()]),
+        mock.patch.object(request_logger, "propagate", False),
+    ):
+        request_log.start()
+        unittest.addModuleCleanup(request_log.stop)
 
 
 def create_user(**params):
@@ -112,3 +134,47 @@ class UserApiTests(TestCase):
         self.assertEqual(user.email, payload["email"])
         self.assertTrue(user.check_password(payload["password"]))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@mock.patch("user.authentication.USER_CACHE_SECONDS", 60)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        payload = {"email": "test@example.com", "password": "testpass123"}
+        self.user = create_user(**payload)
+        token = self.client.post(TOKEN_URL, payload).data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_user_is_not_queried_when_cached(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get(ORDER_LIST_URL).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get(ORDER_LIST_URL).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_user_is_queried_without_cache_period(self):
+        with mock.patch("user.authentication.USER_CACHE_SECONDS", 0):
+            with CaptureQueriesContext(connection) as first:
+                self.client.get(ORDER_LIST_URL)
+            with CaptureQueriesContext(connection) as second:
+                self.client.get(ORDER_LIST_URL)
+        self.assertEqual(len(second), len(first))
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+
+    def test_profile_update_invalidates_cached_user(self):
+        self.client.get(ORDER_LIST_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(MANAGE_USER_URL, {"email": "new@example.com"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+
+        self.client.get(ORDER_LIST_URL)
+        self.assertEqual(cache.get(user_cache_key(self.user.id))["email"], "new@example.com")
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(ORDER_LIST_URL).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(ORDER_LIST_URL).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -11,6 +11,7 @@ class CreateUserView(generics.CreateAPIView):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
+    # Loads the full user row, which the profile is read and updated from
     authentication_classes = (JWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 